@@ -2,6 +2,8 @@
 
 import numpy as _np
 import datetime as _datetime
+import os as _os
+import struct as _struct
 
 class Point():
     """A simple 2 dimensional point class.
@@ -320,6 +322,8 @@ class TimeStamps():
     def _is_time_ordered(timestamps):
         if len(timestamps) == 0:
             return True
+        if isinstance(timestamps, _np.ndarray):
+            return not _np.any(timestamps[:-1] > timestamps[1:])
         it = iter(timestamps)
         prev = next(it)
         for time in it  :
@@ -341,6 +345,76 @@ class TimeStamps():
         """
         return ( self.timestamps[0], self.timestamps[-1] )
 
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            return self.timestamps[index]
+        # Assume slice like object
+        new_times = self.timestamps[index]
+        if isinstance(index, slice) and (index.step is None or index.step > 0):
+            times = TimeStamps.__new__(TimeStamps)
+            times._timestamps = new_times
+            return times
+        return TimeStamps(_np.sort(new_times))
+
+    def time_window_indices(self, start_time=None, end_time=None, include_end=False):
+        """Find the events in a time window by binary search (as the
+        timestamps are sorted).
+
+        :param start_time: Only consider events at or after this time.  If
+          `None` then start with the first event.
+        :param end_time: Only consider events before this time.  If `None`
+          then continue to the last event.
+        :param include_end: If `True` then also include events which occur
+          exactly at `end_time`.
+
+        :return: Pair `(start, end)` such that the events in the window are
+          those with indices `start <= i < end`.
+        """
+        start, end = 0, len(self._timestamps)
+        if start_time is not None:
+            start = _np.searchsorted(self._timestamps, _np.datetime64(start_time), side="left")
+        if end_time is not None:
+            side = "right" if include_end else "left"
+            end = _np.searchsorted(self._timestamps, _np.datetime64(end_time), side=side)
+        return int(start), int(max(start, end))
+
+    def time_window(self, start_time=None, end_time=None, include_end=False):
+        """Return a new instance with just the events in a time window.  The
+        returned instance shares memory with this instance.
+
+        :param start_time: Only use events at or after this time.  If `None`
+          then start with the first event.
+        :param end_time: Only use events before this time.  If `None` then
+          continue to the last event.
+        :param include_end: If `True` then also include events which occur
+          exactly at `end_time`.
+        """
+        start, end = self.time_window_indices(start_time, end_time, include_end)
+        return self[start:end]
+
+    def time_slices(self, time_range, include_end=False):
+        """Iterate over a sequence of time windows, as :meth:`time_window`.
+        All the binary searches are performed at once.
+
+        :param time_range: An iterable of pairs `(start, end)`, for example an
+          instance of :class:`open_cp.scripted.preds.TimeRange`.
+        :param include_end: If `True` then also include events which occur
+          exactly at the end of each window.
+
+        :return: Generator yielding triples `(start, end, events)` where
+          `events` is an instance of this class.
+        """
+        windows = list(time_range)
+        if len(windows) == 0:
+            return
+        starts = _np.asarray([_np.datetime64(s) for s, _ in windows])
+        ends = _np.asarray([_np.datetime64(e) for _, e in windows])
+        first = _np.searchsorted(self._timestamps, starts, side="left")
+        last = _np.searchsorted(self._timestamps, ends,
+            side=("right" if include_end else "left"))
+        for (s, e), i, j in zip(windows, first, _np.maximum(first, last)):
+            yield s, e, self[int(i):int(j)]
+
     def time_deltas(self, time_unit = _np.timedelta64(1, "m")):
         """Returns a numpy array of floats, converted from the timestamps,
         starting from 0, and with the optional unit.
@@ -406,33 +480,39 @@ class TimedPoints(TimeStamps):
         """A one dimensional array representing the y coordinates of events."""
         return self.coords[1]
         
+    @staticmethod
+    def _view(timestamps, coords):
+        # Construct without copying, or checking, the (already valid) arrays,
+        # so that e.g. memory mapped data is not read into memory.
+        points = TimedPoints.__new__(TimedPoints)
+        points._timestamps = timestamps
+        points.coords = coords
+        return points
+
     def __getitem__(self, index):
         if isinstance(index, int):
             return [self.timestamps[index], *self.coords[:, index]]
         # Assume slice like object
         new_times = self.timestamps[index]
         new_coords = self.coords[:,index]
+        if isinstance(index, slice) and (index.step is None or index.step > 0):
+            return self._view(new_times, new_coords)
         if self._is_time_ordered(new_times):
             return TimedPoints(new_times, new_coords)
-        data = [(t,x,y) for t, (x,y) in zip(new_times, new_coords.T)]
-        data.sort(key = lambda triple : triple[0])
-        for i, (t,x,y) in enumerate(data):
-            new_times[i] = t
-            new_coords[0,i] = x
-            new_coords[1,i] = y
-        return TimedPoints(new_times, new_coords)
+        indices = _np.argsort(new_times, kind="stable")
+        return TimedPoints(new_times[indices], new_coords[:,indices])
 
     def events_before(self, cutoff_time=None):
         """Returns a new instance with just the events with timestamps before
-        (or equal to) the cutoff.
+        (or equal to) the cutoff.  The returned instance shares memory with
+        this instance.
 
         :param cutoff_time: End of the time period we're interested in.
           Default is `None` which means return all the data.
         """
         if cutoff_time is None:
             return self
-        mask = self.timestamps <= _np.datetime64(cutoff_time)
-        return TimedPoints(self.timestamps[mask], self.coords[:,mask])
+        return self.time_window(end_time=cutoff_time, include_end=True)
 
     @property
     def empty(self):
@@ -494,10 +574,111 @@ class TimedPoints(TimeStamps):
         :param bin_length: A timedelta-like object which is the length of each
           bin.
           
-        :return: New instance of :class:`TimedPoints`.
+        :return: New instance of :class:`TimedPoints`, sharing the
+          coordinates with this instance.
         """
         new_times = super().bin_timestamps(offset, bin_length).timestamps
-        return TimedPoints(new_times, self.coords)
+        return self._view(new_times, self.coords)
+
+
+_STORE_MAGIC = b"OPENCPTP"
+_STORE_VERSION = 1
+_STORE_HEADER = _struct.Struct("<8sIIq")
+_STORE_HEADER_FILE = "header"
+_STORE_TIMES_FILE = "timestamps"
+_STORE_COORDS_FILE = "coords"
+
+def _read_store_header(path):
+    with open(_os.path.join(path, _STORE_HEADER_FILE), "rb") as file:
+        magic, version, _, length = _STORE_HEADER.unpack(file.read(_STORE_HEADER.size))
+    if magic != _STORE_MAGIC:
+        raise ValueError("'{}' is not a store of TimedPoints".format(path))
+    if version != _STORE_VERSION:
+        raise ValueError("Unsupported store version {}".format(version))
+    return length
+
+def _write_store_header(path, length):
+    filename = _os.path.join(path, _STORE_HEADER_FILE)
+    with open(filename + ".tmp", "wb") as file:
+        file.write(_STORE_HEADER.pack(_STORE_MAGIC, _STORE_VERSION, 0, length))
+    _os.replace(filename + ".tmp", filename)
+
+def _store_columns(points):
+    times = _np.ascontiguousarray(points.timestamps.astype("datetime64[ms]"), dtype="<i8")
+    coords = _np.ascontiguousarray(points.coords.T, dtype="<f8")
+    return times, coords
+
+def save_timed_points(points, path):
+    """Save a :class:`TimedPoints` instance to a binary, columnar, store which
+    can be quickly reloaded with :func:`load_timed_points`, and extended with
+    :func:`append_timed_points`.
+
+    The store is a directory containing a small header (recording the number
+    of events), the timestamps as little-endian 64-bit integers (milliseconds
+    since the epoch) and the coordinates as little-endian 64-bit floats, in
+    `(x, y)` pairs.
+
+    :param points: The :class:`TimedPoints` instance to save.
+    :param path: The directory to save to; will be created if necessary, and
+      any existing store will be overwritten.
+    """
+    _os.makedirs(path, exist_ok=True)
+    times, coords = _store_columns(points)
+    times.tofile(_os.path.join(path, _STORE_TIMES_FILE))
+    coords.tofile(_os.path.join(path, _STORE_COORDS_FILE))
+    _write_store_header(path, len(times))
+
+def append_timed_points(path, points):
+    """Add events to the end of a store created by :func:`save_timed_points`
+    without rewriting the existing data.  The new events must not be earlier
+    than the last event already stored.  The header is only updated once the
+    new data has been written, so an interrupted append leaves the store in
+    its previous state.
+
+    :param path: The directory of the store.
+    :param points: The :class:`TimedPoints` instance to append.
+    """
+    length = _read_store_header(path)
+    if points.number_data_points == 0:
+        return
+    if length > 0:
+        last = load_timed_points(path, mmap=False, start=length - 1).timestamps[0]
+        if points.timestamps[0] < last:
+            raise ValueError("Appended events must not be earlier than the existing events")
+    times, coords = _store_columns(points)
+    for name, array, size in [(_STORE_TIMES_FILE, times, 8), (_STORE_COORDS_FILE, coords, 16)]:
+        with open(_os.path.join(path, name), "r+b") as file:
+            file.truncate(length * size)
+            file.seek(length * size)
+            array.tofile(file)
+    _write_store_header(path, length + len(times))
+
+def load_timed_points(path, mmap=True, start=0):
+    """Load a :class:`TimedPoints` instance from a store created by
+    :func:`save_timed_points`.
+
+    :param path: The directory of the store.
+    :param mmap: If `True` (the default) then the data is memory mapped
+      (read-only) and so only read from disk as needed.  Slicing, and methods
+      such as :meth:`TimedPoints.events_before`, do not copy the data.  If
+      `False` then the data is read into memory.
+    :param start: Optionally, skip this many events at the start of the store.
+
+    :return: A :class:`TimedPoints` instance.
+    """
+    length = _read_store_header(path) - start
+    if length <= 0:
+        return TimedPoints._view(_np.empty(0, dtype="datetime64[ms]"), _np.empty((2,0)))
+    times_file = _os.path.join(path, _STORE_TIMES_FILE)
+    coords_file = _os.path.join(path, _STORE_COORDS_FILE)
+    if mmap:
+        times = _np.memmap(times_file, dtype="<i8", mode="r", offset=start * 8, shape=(length,))
+        coords = _np.memmap(coords_file, dtype="<f8", mode="r", offset=start * 16, shape=(length, 2))
+    else:
+        times = _np.fromfile(times_file, dtype="<i8", count=length, offset=start * 8)
+        coords = _np.fromfile(coords_file, dtype="<f8", count=length * 2,
+            offset=start * 16).reshape((length, 2))
+    return TimedPoints._view(times.view("<M8[ms]"), coords.T)
 
 
 try:
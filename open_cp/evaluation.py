@@ -8,6 +8,8 @@ Contains routines and classes to help with evaluation of predictions.
 import numpy as _np
 import scipy.special as _special
 import collections as _collections
+import weakref as _weakref
+import scipy.sparse as _sparse
 import datetime as datetime
 import logging as _logging
 from . import naive as _naive
@@ -110,19 +112,64 @@ def hit_counts(grid_pred, timed_points, percentage_coverage):
     """
     if len(timed_points.xcoords) == 0:
         return {cov : (0,0) for cov in percentage_coverage}
-    risk = grid_pred.intensity_matrix
-    out = dict()
-    for coverage in percentage_coverage:
-        covered = top_slice(risk, coverage / 100)
-        
-        gx, gy = grid_pred.grid_coord(timed_points.xcoords, timed_points.ycoords)
-        gx, gy = gx.astype(_np.int), gy.astype(_np.int)
-        mask = (gx < 0) | (gx >= covered.shape[1]) | (gy < 0) | (gy >= covered.shape[0])
-        gx, gy = gx[~mask], gy[~mask]
-        count = _np.sum(covered[(gy,gx)])
+    percentage_coverage = list(percentage_coverage)
+    counts, total = hit_count_curve(grid_pred, timed_points, percentage_coverage)
+    return {coverage : (count, total) for coverage, count
+            in zip(percentage_coverage, counts)}
+
+def _coverage_ordering(risk):
+    """Order the valid cells of the (possibly masked) one-dimensional array
+    `risk` from highest to lowest, breaking ties in the same way as
+    :func:`top_slice`: of equal cells, those later in the natural ordering
+    come first.  So the first `n` entries are the cells selected by
+    :func:`top_slice` for a coverage of `n` cells.
+
+    :return: Array of indices into `risk`.
+    """
+    risk = _np.ma.asarray(risk)
+    valid = _np.nonzero(~_np.ma.getmaskarray(risk))[0]
+    order = _np.argsort(_np.asarray(risk.data)[valid], kind="stable")
+    return valid[order[::-1]]
 
-        out[coverage] = (count, len(timed_points.xcoords))
-    return out
+def _cell_counts(grid_pred, timed_points, shape):
+    """Count the events in each grid cell, ignoring events outside the grid.
+
+    :return: Flat array of counts.
+    """
+    gx, gy = grid_pred.grid_coord(timed_points.xcoords, timed_points.ycoords)
+    gx, gy = gx.astype(_np.int), gy.astype(_np.int)
+    mask = (gx < 0) | (gx >= shape[1]) | (gy < 0) | (gy >= shape[0])
+    gx, gy = gx[~mask], gy[~mask]
+    return _np.bincount(gy * shape[1] + gx, minlength=shape[0] * shape[1])
+
+def hit_count_curve(grid_pred, timed_points, percentage_coverage):
+    """As :func:`hit_counts` but computes all coverage levels at once: the
+    risk is sorted a single time, and the events are binned into grid cells
+    a single time, giving the number of captured events for every possible
+    number of cells covered.  Ties are broken in the same way as
+    :func:`top_slice`.  Suitable for evaluating many coverage levels.
+
+    :param grid_pred: An instance of :class:`GridPrediction` to give a
+      prediction.
+    :param timed_points: An instance of :class:`TimedPoints` from which to look
+      at the :attr:`coords`.
+    :param percentage_coverage: An iterable of percentage coverages to test.
+
+    :return: Pair `(counts, total)` where `counts` is an array, of the same
+      length as `percentage_coverage`, of the number of events captured at
+      each coverage level, and `total` is the total number of events.
+    """
+    risk = _np.ma.asarray(grid_pred.intensity_matrix)
+    ordering = _coverage_ordering(risk.ravel())
+    counts = _cell_counts(grid_pred, timed_points, risk.shape)
+    captured = _np.zeros(len(ordering) + 1, dtype=_np.int)
+    captured[1:] = _np.cumsum(counts[ordering])
+
+    N = len(ordering)
+    fractions = _np.asarray(list(percentage_coverage), dtype=_np.float) / 100
+    n = _np.floor(N * fractions).astype(_np.int)
+    n = _np.clip(n, 0, N)
+    return captured[n], len(timed_points.xcoords)
 
 def maximum_hit_rate(grid, timed_points, percentage_coverage):
     """For the given collection of points, and given percentage coverages,
@@ -158,8 +205,8 @@ def _inverse_hit_rates_setup(grid_pred, timed_points):
 
     # Assigns mask from `risk` if there is one    
     u = _np.zeros_like(risk)
-    for x, y in zip(gx, gy):
-        u[y,x] += 1
+    u += _np.bincount(gy * risk.shape[1] + gx,
+        minlength=risk.shape[0] * risk.shape[1]).reshape(risk.shape)
     
     return risk, u    
 
@@ -278,8 +325,8 @@ def _brier_setup(grid_pred, timed_points):
 
     # Assigns mask from `risk` if there is one    
     u = _np.zeros_like(risk)
-    for x, y in zip(gx, gy):
-        u[y,x] += 1
+    u += _np.bincount(gy * risk.shape[1] + gx,
+        minlength=risk.shape[0] * risk.shape[1]).reshape(risk.shape)
     u = u / _np.sum(u)
     
     return risk, u    
@@ -608,6 +655,150 @@ def ranking_score(grid_pred, timed_points):
     ranking = convert_to_precentiles(grid_pred.intensity_matrix)
     return ranking[gy,gx]
 
+def bin_timed_points(grid, timed_points, time_edges):
+    """Count the events falling in each grid cell, for each time interval, to
+    form the "event count cube" used by :func:`batch_scores`.
+
+    :param grid: Instance of :class:`BoundedGrid` (such as a prediction).
+    :param timed_points: An instance of :class:`TimedPoints`.  All the points
+      should fall inside the grid.  Raises `ValueError` is not.
+    :param time_edges: Increasing array of `T+1` timestamps; interval `i` is
+      from `time_edges[i]` (inclusive) to `time_edges[i+1]` (exclusive).
+      Events outside all the intervals are ignored.
+
+    :return: Integer array of shape `(T, grid.yextent, grid.xextent)`.
+    """
+    time_edges = _np.asarray(time_edges).astype("datetime64[ms]")
+    shape = (len(time_edges) - 1, grid.yextent, grid.xextent)
+    if shape[0] < 0:
+        raise ValueError("Need at least one time edge")
+    gx, gy = grid.grid_coord(timed_points.xcoords, timed_points.ycoords)
+    gx, gy = _np.asarray(gx).astype(_np.int), _np.asarray(gy).astype(_np.int)
+    gt = _np.searchsorted(time_edges, timed_points.timestamps, side="right") - 1
+    in_time = (gt >= 0) & (gt < shape[0])
+    gx, gy, gt = gx[in_time], gy[in_time], gt[in_time]
+    if _np.any((gx < 0) | (gx >= shape[2]) | (gy < 0) | (gy >= shape[1])):
+        raise ValueError("All points need to be inside the grid.")
+    index = (gt * shape[1] + gy) * shape[2] + gx
+    return _np.bincount(index, minlength=int(_np.prod(shape))).reshape(shape)
+
+#: The metrics computed by :func:`batch_scores`, in order.
+BATCH_METRICS = ("likelihood", "brier_score", "brier_skill", "kl_score",
+    "poisson_crps_score", "ranking_score", "bayesian_dirichlet_prior",
+    "bayesian_predictive")
+
+def _batch_poisson_crps(means, counts, chunk=10000):
+    """Vectorised :func:`poisson_crps`, summed over the cells."""
+    if len(means) == 0:
+        return 0.0
+    max_mean = _np.max(means)
+    length = int(max(100, _np.max(counts) + 1, max_mean + 10 * _np.sqrt(max_mean) + 10))
+    while _special.pdtr(length - 1, max_mean) < 1 - 1e-5:
+        length *= 2
+    score = 0.0
+    for start in range(0, len(means), chunk):
+        mu, n = means[start:start+chunk], counts[start:start+chunk]
+        # Cumulative distribution function, computed as `poisson_crps` does
+        ratios = _np.empty((len(mu), length))
+        ratios[:,0] = _np.exp(-mu)
+        ratios[:,1:] = mu[:,None] / _np.arange(1, length)[None,:]
+        F = _np.cumsum(_np.cumprod(ratios, axis=1), axis=1)
+        lower = _np.cumsum(F**2, axis=1)
+        upper = _np.cumsum(((1 - F)**2)[:,::-1], axis=1)[:,::-1]
+        rows = _np.arange(len(mu))
+        below = _np.where(n > 0, lower[rows, _np.maximum(n - 1, 0)], 0)
+        score += _np.sum(below + upper[rows, n])
+    return score
+
+def _batch_slice_scores(risk, valid, counts, cell_area, minimum, bias, lower_bound):
+    """Compute all of :attr:`BATCH_METRICS` for one prediction.
+
+    :param risk: Flat array of the (unmasked) intensity.
+    :param valid: Flat boolean array, `True` for cells not masked.
+    :param counts: Flat integer array of event counts.
+    """
+    total = _np.sum(counts)
+    out = dict.fromkeys(BATCH_METRICS, _np.nan)
+    if total == 0:
+        out["likelihood"] = 0.0
+        return out
+    occupied = counts > 0
+    p = risk[occupied]
+    p = _np.where(p <= 0, minimum, p)
+    out["likelihood"] = _np.sum(counts[occupied] * _np.log(p)) / total
+
+    u = counts / total
+    r, uu = risk[valid], u[valid]
+    out["brier_score"] = _np.mean((uu - r)**2) / cell_area
+    out["brier_skill"] = 2 * _np.sum(uu * r) / _np.sum(uu * uu + r * r)
+    kl = _kl_log_func(uu, r) + _kl_log_func(1 - uu, 1 - r)
+    out["kl_score"] = kl / (_np.sum(valid) * cell_area)
+
+    out["poisson_crps_score"] = _batch_poisson_crps(r * total, counts[valid])
+
+    ordered = _np.sort(r)
+    ranking = _np.searchsorted(ordered, risk[occupied], side="right") / len(ordered)
+    out["ranking_score"] = _np.sum(counts[occupied] * ranking) / total
+
+    alpha = _np.where(r <= 0, lower_bound, r)
+    alpha = alpha / _np.sum(alpha) * bias
+    c = counts[valid]
+    m = c > 0
+    score = _special.gammaln(bias + total) - _special.gammaln(bias)
+    score -= _np.sum(_special.gammaln(alpha[m] + c[m]) - _special.gammaln(alpha[m]))
+    score += _np.sum(_special.digamma(alpha[m] + c[m]) * c[m])
+    score -= total * _special.digamma(bias + total)
+    out["bayesian_dirichlet_prior"] = score
+    w = (alpha + c) / (bias + total)
+    out["bayesian_predictive"] = _np.sum(w * (_np.log(w) + _np.log(bias) - _np.log(alpha)))
+    return out
+
+def batch_scores(intensities, counts, cell_area=1, minimum=1e-9, bias=10,
+        lower_bound=1e-10):
+    """Score a whole stack of grid predictions against binned events in one
+    call.  For each time index `t`, computes the same values as
+    :func:`likelihood`, :func:`brier_score`, :func:`kl_score`,
+    :func:`poisson_crps_score`, :func:`bayesian_dirichlet_prior` and
+    :func:`bayesian_predictive` would for the prediction `intensities[t]` and
+    the events counted in `counts[t]`.  For :func:`ranking_score`, which gives
+    one value per event, we report the mean.  The events are only binned
+    once (see :func:`bin_timed_points`), and every metric is computed from
+    the counts, without looping over events.
+
+    :param intensities: Array, possibly masked, of shape `(T, Y, X)`, giving
+      a normalised prediction for each time index.
+    :param counts: Integer array of shape `(T, Y, X)` of the number of
+      events in each cell.  No events should be in a masked cell; raises
+      `ValueError` if not.
+    :param cell_area: The area of one grid cell, `xsize * ysize`.
+    :param minimum: As for :func:`likelihood`.
+    :param bias: As for :func:`bayesian_dirichlet_prior`.
+    :param lower_bound: As for :func:`bayesian_dirichlet_prior`.
+
+    :return: A numpy "structured array" of length `T`, a table with a column
+      "index" giving the time index, and one column for each name in
+      :attr:`BATCH_METRICS`.  When there are no events, the likelihood is 0
+      (as :func:`likelihood`) and all other scores are `nan`.
+    """
+    intensities = _np.ma.asarray(intensities)
+    counts = _np.asarray(counts).astype(_np.int64)
+    if intensities.ndim != 3 or counts.shape != intensities.shape:
+        raise ValueError("Need intensities and counts of the same shape (T, Y, X)")
+    mask = _np.ma.getmaskarray(intensities)
+    if _np.any(counts[mask] > 0):
+        raise ValueError("All points need to be inside the non-masked area of the grid.")
+    risk = _np.asarray(intensities.data, dtype=_np.float)
+
+    dtype = [("index", _np.int64)] + [(name, _np.float64) for name in BATCH_METRICS]
+    table = _np.empty(intensities.shape[0], dtype=dtype)
+    for t in range(intensities.shape[0]):
+        out = _batch_slice_scores(risk[t].ravel(), ~mask[t].ravel(),
+            counts[t].ravel(), cell_area, minimum, bias, lower_bound)
+        table[t]["index"] = t
+        for name in BATCH_METRICS:
+            table[t][name] = out[name]
+    return table
+
 def _to_kernel_for_kde(pred, tps, grid):
     points = _np.asarray([tps.xcoords, tps.ycoords])
     if tps.number_data_points <= 2:
@@ -672,6 +863,135 @@ def score_kde_fixed_bandwidth(pred, tps, grid, bandwidth):
 # Network stuff
 #############################################################################
 
+class GraphGridOverlap():
+    """Describes how the edges of a network meet the cells of a grid, found
+    (for all edges at once) by :func:`geometry.intersect_lines_grid`.  Use
+    :func:`graph_grid_overlap` to construct, which will cache the result.
+
+    :param graph: An instance of :class:`network.PlanarGraph`
+    :param grid: An instance of :class:`data.Grid` or same interface.
+    """
+    def __init__(self, graph, grid):
+        quads = graph.as_quads().reshape((-1, 4))
+        (self._edges, self._gx, self._gy, self._t1,
+            self._t2) = _geometry.intersect_lines_grid(quads[:,:2], quads[:,2:], grid)
+        self._number_edges = graph.number_edges
+        self._matrices = dict()
+
+    @property
+    def edges(self):
+        """Array of edge indices.  The part of edge `edges[i]` from `t1[i]`
+        to `t2[i]` (where 0 is the first vertex of the edge, and 1 the
+        second) lies in the grid cell `(gx[i], gy[i])`.  Ordered by edge, and
+        then along each edge."""
+        return self._edges
+
+    @property
+    def gx(self):
+        """Array of x coordinates of grid cells."""
+        return self._gx
+
+    @property
+    def gy(self):
+        """Array of y coordinates of grid cells."""
+        return self._gy
+
+    @property
+    def t1(self):
+        """Array of the start of each part of an edge."""
+        return self._t1
+
+    @property
+    def t2(self):
+        """Array of the end of each part of an edge."""
+        return self._t2
+
+    # Relative tolerance used by :meth:`most` to decide ties
+    _tie_tolerance = 1e-9
+
+    def most(self):
+        """For each edge, find the grid cell which contains the largest
+        fraction of the edge (the first along the edge, in case of a tie).
+        Fractions within a small relative tolerance of the largest are
+        treated as tied, as e.g. two crossings of whole grid cells have the
+        same length, up to rounding error.
+
+        :return: Pair `(gx, gy)` of arrays, of length the number of edges.
+        """
+        lengths = self._t2 - self._t1
+        if len(lengths) == 0:
+            return self._gx, self._gy
+        starts = _np.flatnonzero(_np.append(True, self._edges[1:] != self._edges[:-1]))
+        largest = _np.maximum.reduceat(lengths, starts)
+        counts = _np.diff(_np.append(starts, len(lengths)))
+        tied = _np.flatnonzero(lengths >= _np.repeat(largest, counts) * (1 - self._tie_tolerance))
+        _, first = _np.unique(self._edges[tied], return_index=True)
+        index = tied[first]
+        return self._gx[index], self._gy[index]
+
+    def matrix(self, xextent, yextent):
+        """A sparse matrix giving, for each edge, the fraction of that edge
+        in each grid cell.  Parts of edges outside the grid are ignored.
+
+        :param xextent: The width of the grid.
+        :param yextent: The height of the grid.
+
+        :return: Instance of :class:`scipy.sparse.csr_matrix` of shape
+          `(number_edges, xextent * yextent)` where column `gy * xextent + gx`
+          corresponds to the grid cell `(gx, gy)`.
+        """
+        key = (xextent, yextent)
+        if key not in self._matrices:
+            mask = ((self._gx >= 0) & (self._gy >= 0) & (self._gx < xextent)
+                & (self._gy < yextent))
+            cells = self._gy[mask] * xextent + self._gx[mask]
+            self._matrices[key] = _sparse.csr_matrix(
+                (self._t2[mask] - self._t1[mask], (self._edges[mask], cells)),
+                shape=(self._number_edges, xextent * yextent))
+        return self._matrices[key]
+
+
+_graph_grid_overlaps = _weakref.WeakKeyDictionary()
+
+def graph_grid_overlap(graph, grid):
+    """Construct, or return a cached, instance of :class:`GraphGridOverlap`.
+    The cache is keyed by the graph, and the size and offset of the grid.
+
+    :param graph: An instance of :class:`network.PlanarGraph`
+    :param grid: An instance of :class:`data.Grid` or same interface.
+    """
+    overlaps = _graph_grid_overlaps.setdefault(graph, dict())
+    key = (grid.xsize, grid.ysize, grid.xoffset, grid.yoffset)
+    if key not in overlaps:
+        overlaps[key] = GraphGridOverlap(graph, grid)
+    return overlaps[key]
+
+def _cell_risks(grid_pred, gx, gy):
+    """Find the risk, and if the cell is valid, for each of the grid cells
+    `(gx[i], gy[i])`.  Cells in the extent of the prediction are looked up in
+    the intensity matrix; we only call :meth:`grid_risk` and
+    :meth:`is_valid` for (each distinct) cell outside the extent.
+
+    :return: Pair `(risks, valid)` of arrays.
+    """
+    risks = _np.zeros(len(gx))
+    valid = _np.ones(len(gx), dtype=_np.bool)
+    if grid_pred.xextent > 0 and grid_pred.yextent > 0:
+        matrix = grid_pred.intensity_matrix
+        inside = (gx >= 0) & (gy >= 0) & (gx < grid_pred.xextent) & (gy < grid_pred.yextent)
+        risks[inside] = _np.ma.getdata(matrix)[gy[inside], gx[inside]]
+        valid[inside] = ~_np.ma.getmaskarray(matrix)[gy[inside], gx[inside]]
+    else:
+        inside = _np.zeros(len(gx), dtype=_np.bool)
+    if not _np.all(inside):
+        outside = _np.stack([gx[~inside], gy[~inside]], axis=1)
+        cells, inverse = _np.unique(outside, axis=0, return_inverse=True)
+        cell_risks = [grid_pred.grid_risk(x, y) for x, y in cells.tolist()]
+        cell_valid = [grid_pred.is_valid(x, y) for x, y in cells.tolist()]
+        risks[~inside] = _np.asarray(cell_risks, dtype=_np.float64)[inverse.ravel()]
+        valid[~inside] = _np.asarray(cell_valid, dtype=_np.bool)[inverse.ravel()]
+    return risks, valid
+
 def grid_risk_coverage_to_graph(grid_pred, graph, percentage_coverage, intersection_cutoff=None):
     """Find the given coverage for the grid prediction, and then intersect with
     the graph.
@@ -686,26 +1006,18 @@ def grid_risk_coverage_to_graph(grid_pred, graph, percentage_coverage, intersect
     
     :return: A new graph with only those edges which intersect.
     """
+    covered = top_slice(grid_pred.intensity_matrix, percentage_coverage / 100)
+    matrix = graph_grid_overlap(graph, grid_pred).matrix(covered.shape[1], covered.shape[0])
+    if intersection_cutoff is not None:
+        matrix = matrix.copy()
+        matrix.data = (matrix.data >= intersection_cutoff).astype(_np.float64)
+    included = (matrix @ _np.asarray(covered, dtype=_np.float64).ravel()) > 0
     builder = _network.PlanarGraphBuilder()
     builder.vertices.update(graph.vertices)
-    covered = top_slice(grid_pred.intensity_matrix, percentage_coverage / 100)
-    for gy in range(covered.shape[0]):
-        for gx in range(covered.shape[1]):
-            if covered[gy][gx]:
-                _add_intersections(grid_pred.bounding_box_of_cell(gx, gy),
-                                   graph, builder, intersection_cutoff)
+    builder.edges.extend(graph.edges[i] for i in _np.nonzero(included)[0])
     builder.remove_unused_vertices()
     return builder.build()
 
-def _add_intersections(bbox, graph, builder, intersection_cutoff):
-    bbox = (*bbox.min, *bbox.max)
-    for edge in graph.edges:
-        start, end = graph.vertices[edge[0]], graph.vertices[edge[1]]
-        tt = _geometry.intersect_line_box(start, end, bbox)
-        if tt is not None:
-            if intersection_cutoff is None or tt[1] - tt[0] >= intersection_cutoff:
-                builder.edges.append(edge)
-
 def grid_risk_to_graph(grid_pred, graph, strategy="most"):
     """Transfer the grid_prediction to a graph risk prediction.  For each grid
     cell, assigns the risk in the cell to each edge of the network which
@@ -737,38 +1049,37 @@ def grid_risk_to_graph(grid_pred, graph, strategy="most"):
         raise ValueError()
         
 def _grid_risk_to_graph_subdivide(grid_pred, graph):
-    risks = []
-    lookup = dict()
+    overlap = graph_grid_overlap(graph, grid_pred)
+    edges = overlap.edges
+    risks, _ = _cell_risks(grid_pred, overlap.gx, overlap.gy)
+    # Each part of an edge, apart from the last, ends at a new vertex
+    last = _np.ones(len(edges), dtype=_np.bool)
+    last[:-1] = edges[1:] != edges[:-1]
+    first = _np.ones(len(edges), dtype=_np.bool)
+    first[1:] = last[:-1]
     builder = _network.PlanarGraphBuilder()
     builder.vertices.update(graph.vertices)
-    for edge_index, edge in enumerate(graph.edges):
-        line = (graph.vertices[edge[0]], graph.vertices[edge[1]])
-        segments, intervals = _geometry.full_intersect_line_grid(line, grid_pred)
-        
-        start_key = edge[0]
-        for i in range(len(segments) - 1):
-            key = builder.add_vertex(*segments[i][1])
-            lookup[ len(builder.edges) ] = edge_index
-            builder.add_edge(start_key, key)
-            start_key = key
-            gx, gy, _, _ = intervals[i]
-            risks.append(grid_pred.grid_risk(gx, gy))
-        lookup[ len(builder.edges) ] = edge_index
-        builder.add_edge(start_key, edge[1])
-        gx, gy, _, _ = intervals[-1]
-        risks.append(grid_pred.grid_risk(gx, gy))
-            
-    return builder.build(), lookup, _np.asarray(risks)
+    next_key = max(builder.vertices.keys()) + 1 if len(builder.vertices) > 0 else 0
+    new_keys = _np.cumsum(~last) - 1 + next_key
+    quads = graph.as_quads().reshape((-1, 4))[edges[~last]]
+    t = overlap.t2[~last]
+    xcs = quads[:,0] * (1 - t) + quads[:,2] * t
+    ycs = quads[:,1] * (1 - t) + quads[:,3] * t
+    builder.vertices.update(zip(new_keys[~last].tolist(), zip(xcs.tolist(), ycs.tolist())))
+
+    graph_edges = graph.edges
+    start_keys = [graph_edges[e][0] if f else k for e, f, k in
+        zip(edges.tolist(), first.tolist(), _np.roll(new_keys, 1).tolist())]
+    end_keys = [graph_edges[e][1] if l else k for e, l, k in
+        zip(edges.tolist(), last.tolist(), new_keys.tolist())]
+    builder.edges.extend(zip(start_keys, end_keys))
+    lookup = dict(enumerate(edges.tolist()))
+    return builder.build(), lookup, risks
         
 def _grid_risk_to_graph_most(grid_pred, graph):
-    risks = _np.empty(len(graph.edges))
-    for i, edge in enumerate(graph.edges):
-        line = (graph.vertices[edge[0]], graph.vertices[edge[1]])
-        gx, gy = _geometry.intersect_line_grid_most(line, grid_pred)
-        if grid_pred.is_valid(gx, gy):
-            risks[i] = grid_pred.grid_risk(gx, gy)
-        else:
-            risks[i] = 0
+    gx, gy = graph_grid_overlap(graph, grid_pred).most()
+    risks, valid = _cell_risks(grid_pred, gx, gy)
+    risks[~valid] = 0
     return risks
 
 def network_coverage(graph, risks, fraction):
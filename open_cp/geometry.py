@@ -68,16 +68,120 @@ def _contains_csv(path):
     csvs = [x for x in os.listdir(path) if x.endswith(".csv")]
     return len(csvs) > 1
 
-def grid_intersection(geometry, grid):
-    """Find the collection of grid cells which intersect with the geometry.
-    Here "intersect" means "intersects with non-zero area", so grid cells just
-    touching the geometry will not be returned.
-
-    :param geometry: Geometry object to intersect with.
-    :param grid: Instance of :class:`Grid` describing the grid.
-
-    :return: List of pairs (x,y) of grid cells which intersect.
+def _polygon_rings(geometry):
+    """Extract the rings of a `Polygon` or `MultiPolygon`, each as an array of
+    shape `(N,2)`.  Returns `None` for other geometry types."""
+    if geometry.geom_type == "Polygon":
+        polygons = [geometry]
+    elif geometry.geom_type == "MultiPolygon":
+        polygons = list(geometry.geoms)
+    else:
+        return None
+    rings = []
+    for polygon in polygons:
+        if polygon.is_empty:
+            continue
+        rings.append(_np.asarray(polygon.exterior.coords)[:,:2])
+        rings.extend(_np.asarray(ring.coords)[:,:2] for ring in polygon.interiors)
+    return rings
+
+def _ring_edges(rings):
+    """Return the start and end points, as arrays of shape `(M,2)`, of all the
+    edges of the rings."""
+    starts = _np.concatenate([ring[:-1] for ring in rings])
+    ends = _np.concatenate([ring[1:] for ring in rings])
+    return starts, ends
+
+def _scanline_fill(starts, ends, xo, yo, xsize, ysize, width, height):
+    """Scanline fill, using the even-odd rule, testing the centre of each grid
+    cell.
+
+    :return: Boolean array of shape `(height, width)`, `True` if the centre of
+      that cell is inside the polygon.  Not reliable for cells whose centre is
+      on the boundary.
+    """
+    # Work in units of grid cells, with cell centres at integer coordinates
+    x0, x1 = (starts[:,0] - xo) / xsize - 0.5, (ends[:,0] - xo) / xsize - 0.5
+    y0, y1 = (starts[:,1] - yo) / ysize - 0.5, (ends[:,1] - yo) / ysize - 0.5
+    ylow, yhigh = _np.minimum(y0, y1), _np.maximum(y0, y1)
+    # Edge crosses row `r` if ylow <= r < yhigh
+    first = _np.clip(_np.ceil(ylow), 0, height).astype(_np.int64)
+    last = _np.clip(_np.ceil(yhigh), 0, height).astype(_np.int64)
+    number = last - first
+    edge = _np.repeat(_np.arange(len(first)), number)
+    rows = _np.arange(len(edge)) - _np.repeat(_np.cumsum(number) - number, number)
+    rows += first[edge]
+    t = (rows - y0[edge]) / (y1[edge] - y0[edge])
+    xs = x0[edge] + t * (x1[edge] - x0[edge])
+    # Crossing at `xs` toggles the parity of every cell centre to the right
+    columns = _np.clip(_np.ceil(xs), 0, width).astype(_np.int64)
+    toggles = _np.bincount(rows * (width + 1) + columns, minlength=height * (width + 1))
+    parity = _np.cumsum(toggles.reshape((height, width + 1)), axis=1)[:, :width]
+    return (parity % 2) == 1
+
+def _boundary_cells(starts, ends, xo, yo, xsize, ysize, width, height):
+    """Find all grid cells which the boundary might meet, including cells
+    which the boundary only touches.  Each edge is split into pieces no
+    longer than half a grid cell, and we take all cells meeting the
+    (slightly enlarged) bounding box of each piece.
+
+    :return: Boolean array of shape `(height, width)`.
     """
+    x0, x1 = (starts[:,0] - xo) / xsize, (ends[:,0] - xo) / xsize
+    y0, y1 = (starts[:,1] - yo) / ysize, (ends[:,1] - yo) / ysize
+    pieces = _np.maximum(1, _np.ceil(2 * _np.maximum(_np.abs(x1 - x0), _np.abs(y1 - y0)))).astype(_np.int64)
+    edge = _np.repeat(_np.arange(len(pieces)), pieces)
+    index = _np.arange(len(edge)) - _np.repeat(_np.cumsum(pieces) - pieces, pieces)
+    t0, t1 = index / pieces[edge], (index + 1) / pieces[edge]
+    px0 = x0[edge] + t0 * (x1[edge] - x0[edge])
+    px1 = x0[edge] + t1 * (x1[edge] - x0[edge])
+    py0 = y0[edge] + t0 * (y1[edge] - y0[edge])
+    py1 = y0[edge] + t1 * (y1[edge] - y0[edge])
+    eps = 1e-7
+    xmin = _np.floor(_np.minimum(px0, px1) - eps).astype(_np.int64)
+    xmax = _np.floor(_np.maximum(px0, px1) + eps).astype(_np.int64)
+    ymin = _np.floor(_np.minimum(py0, py1) - eps).astype(_np.int64)
+    ymax = _np.floor(_np.maximum(py0, py1) + eps).astype(_np.int64)
+    cells = _np.zeros((height, width), dtype=_np.bool)
+    for dx in range(3):
+        for dy in range(3):
+            gx, gy = xmin + dx, ymin + dy
+            m = ((gx <= xmax) & (gy <= ymax) & (gx >= 0) & (gx < width)
+                & (gy >= 0) & (gy < height))
+            cells[gy[m], gx[m]] = True
+    return cells
+
+def _cell_polygon(xo, yo, xsize, ysize, x, y):
+    xx, yy = xo + x * xsize, yo + y * ysize
+    return _geometry.Polygon([[xx, yy], [xx + xsize, yy],
+                [xx + xsize, yy + ysize], [xx, yy + ysize]])
+
+def _rasterise(geometry, xo, yo, xsize, ysize, width, height, exact_test):
+    """Find the grid cells which meet the geometry by rasterising: cells
+    whose centre is inside the polygon, found by a scanline fill, meet the
+    geometry.  Cells which the boundary of the geometry may meet are then
+    checked exactly by calling `exact_test` with a `shapely` polygon of the
+    cell.  All other cells are either entirely inside or outside the
+    geometry.
+
+    :return: Boolean array of shape `(height, width)`, or `None` if the
+      geometry is not a polygon or multi-polygon.
+    """
+    rings = _polygon_rings(geometry)
+    if rings is None:
+        return None
+    if len(rings) == 0:
+        return _np.zeros((height, width), dtype=_np.bool)
+    starts, ends = _ring_edges(rings)
+    meets = _scanline_fill(starts, ends, xo, yo, xsize, ysize, width, height)
+    boundary = _boundary_cells(starts, ends, xo, yo, xsize, ysize, width, height)
+    for y, x in zip(*_np.nonzero(boundary)):
+        meets[y, x] = exact_test(_cell_polygon(xo, yo, xsize, ysize, x, y))
+    return meets
+
+def _grid_intersection_slow(geometry, grid):
+    """Direct implementation of :func:`grid_intersection`, which tests every
+    cell in the bounding box.  Used for non-polygon geometry."""
     minx, miny, maxx, maxy = geometry.bounds
     xstart = int(_np.floor((minx - grid.xoffset) / grid.xsize))
     xend = int(_np.floor((maxx - grid.xoffset) / grid.xsize))
@@ -96,6 +200,38 @@ def grid_intersection(geometry, grid):
                 intersections.append((x, y))
     return intersections
 
+def grid_intersection(geometry, grid):
+    """Find the collection of grid cells which intersect with the geometry.
+    Here "intersect" means "intersects with non-zero area", so grid cells just
+    touching the geometry will not be returned.
+
+    For polygons, uses a scanline fill, only computing intersection areas for
+    the cells which meet the boundary of the polygon.
+
+    :param geometry: Geometry object to intersect with.
+    :param grid: Instance of :class:`Grid` describing the grid.
+
+    :return: List of pairs (x,y) of grid cells which intersect.
+    """
+    minx, miny, maxx, maxy = geometry.bounds
+    xstart = int(_np.floor((minx - grid.xoffset) / grid.xsize))
+    xend = int(_np.floor((maxx - grid.xoffset) / grid.xsize))
+    ystart = int(_np.floor((miny - grid.yoffset) / grid.ysize))
+    yend = int(_np.floor((maxy - grid.yoffset) / grid.ysize))
+
+    def has_area(poly):
+        poly = poly.intersection(geometry)
+        return not poly.is_empty and poly.area > 0
+
+    xo = grid.xoffset + xstart * grid.xsize
+    yo = grid.yoffset + ystart * grid.ysize
+    meets = _rasterise(geometry, xo, yo, grid.xsize, grid.ysize,
+        xend - xstart + 1, yend - ystart + 1, has_area)
+    if meets is None:
+        return _grid_intersection_slow(geometry, grid)
+    ys, xs = _np.nonzero(meets)
+    return [(int(x) + xstart, int(y) + ystart) for x, y in zip(xs, ys)]
+
 def mask_grid_by_intersection(geometry, grid):
     """Generate a :class:`MaskedGrid` by intersecting the grid with the
     geometry.  The returned grid may have a different x/y offset, so that it
@@ -103,6 +239,9 @@ def mask_grid_by_intersection(geometry, grid):
     the "relative offset" will be unchanged (so that the difference between the
     x offsets will be a multiple of the grid width, and the same for y).
 
+    For polygons, uses a scanline fill, and only tests exactly those cells
+    which meet the boundary of the polygon.
+
     :param geometry: Geometry object to intersect with.
     :param grid: The :class:`Grid` instance describing the grid.
     """
@@ -114,25 +253,26 @@ def mask_grid_by_intersection(geometry, grid):
     width = xend - xstart + 1
     height = yend - ystart + 1
 
-    mask = _np.empty((height, width), dtype=_np.bool)
     xo = grid.xoffset + xstart * grid.xsize
     yo = grid.yoffset + ystart * grid.ysize
     import shapely.prepared
     geo = shapely.prepared.prep(geometry)
+    meets = _rasterise(geometry, xo, yo, grid.xsize, grid.ysize, width,
+        height, geo.intersects)
+    if meets is not None:
+        return _data.MaskedGrid(grid.xsize, grid.ysize, xo, yo, ~meets)
+
+    mask = _np.empty((height, width), dtype=_np.bool)
     for y in range(height):
-        yy = yo + y * grid.ysize
-        polys = [_geometry.Polygon([[xo + x * grid.xsize, yy],
-                    [xo + x * grid.xsize + grid.xsize, yy],
-                    [xo + x * grid.xsize + grid.xsize, yy + grid.ysize],
-                    [xo + x * grid.xsize, yy + grid.ysize]])
-                for x in range(width)]
+        polys = [_cell_polygon(xo, yo, grid.xsize, grid.ysize, x, y) for x in range(width)]
         mask[y] = _np.asarray([not geo.intersects(poly) for poly in polys])
     
     return _data.MaskedGrid(grid.xsize, grid.ysize, xo, yo, mask)
 
 def mask_grid_by_points_intersection(timed_points, grid, bbox=False):
     """Generate a :class:`MaskedGrid` by intersecting the grid with collection
-    of points.
+    of points.  A point on the boundary of grid cells counts as being in all
+    of those cells.
 
     :param timed_points: Instance of :class:`TimedPoints` (or other object with
       `xcoords` and `ycoords` attributes).
@@ -156,16 +296,20 @@ def mask_grid_by_points_intersection(timed_points, grid, bbox=False):
     xo = grid.xoffset + xstart * grid.xsize
     yo = grid.yoffset + ystart * grid.ysize
     if not bbox:
-        def intersect(xx, yy):
-            mask = ( (xcs >= xx) & (ycs >= yy)
-                & (xcs <= (xx+grid.xsize)) & (ycs <= (yy+grid.ysize)) )
-            return _np.any(mask)
-        for y in range(height):
-            yy = yo + y * grid.ysize
-            for x in range(width):
-                xx = xo + x * grid.xsize
-                if not intersect(xx, yy):
-                    mask[y][x] = True
+        counts = _np.zeros(height * width, dtype=_np.int64)
+        gx = _np.floor((xcs - xo) / grid.xsize).astype(_np.int64)
+        gy = _np.floor((ycs - yo) / grid.ysize).astype(_np.int64)
+        # Check the cell, and its neighbours, using closed cells
+        for dx in (-1, 0, 1):
+            x = gx + dx
+            xx = xo + x * grid.xsize
+            xin = (xcs >= xx) & (xcs <= (xx+grid.xsize)) & (x >= 0) & (x < width)
+            for dy in (-1, 0, 1):
+                y = gy + dy
+                yy = yo + y * grid.ysize
+                m = xin & (ycs >= yy) & (ycs <= (yy+grid.ysize)) & (y >= 0) & (y < height)
+                counts += _np.bincount(y[m] * width + x[m], minlength=height * width)
+        mask = (counts == 0).reshape((height, width))
     
     return _data.MaskedGrid(grid.xsize, grid.ysize, xo, yo, mask)
 
@@ -411,7 +555,55 @@ def full_intersect_line_grid(line, grid):
         search = (start[0]*(1-t2) + end[0]*t2, start[1]*(1-t2) + end[1]*t2)
     
     return segments, intervals
-    
+
+def _grid_line_crossings(a0, a1):
+    """For each pair `a0[i], a1[i]`, find each integer `k` strictly between
+    them, and the parameter `t` with `a0[i] * (1-t) + a1[i] * t == k`.
+
+    :return: `(index, t)` arrays.
+    """
+    first = _np.floor(_np.minimum(a0, a1)).astype(_np.int64) + 1
+    number = _np.maximum(0, _np.ceil(_np.maximum(a0, a1)).astype(_np.int64) - first)
+    index = _np.repeat(_np.arange(len(a0)), number)
+    k = _np.arange(len(index)) - _np.repeat(_np.cumsum(number) - number, number)
+    k += first[index]
+    return index, (k - a0[index]) / (a1[index] - a0[index])
+
+def intersect_lines_grid(starts, ends, grid):
+    """Intersect many line segments with a grid, as
+    :func:`full_intersect_line_grid`, using array operations.  Each line is
+    traversed from cell to cell (in the manner of a "DDA" line drawing
+    algorithm): we find where the line crosses the vertical and horizontal
+    lines of the grid, and then each piece of the line between consecutive
+    crossings lies in a single grid cell.
+
+    :param starts: Array of shape `(N,2)` of the start points of the lines.
+    :param ends: Array of shape `(N,2)` of the end points of the lines.
+    :param grid: Instance of :class:`data.Grid` or same interface.
+
+    :return: `(lines, gx, gy, t1, t2)` arrays, telling that the part of line
+      `lines[i]` from (line coordinates) `t1[i]` to `t2[i]` is in grid cell
+      `(gx[i], gy[i])`.  Ordered by line, and then along each line.
+    """
+    starts = _np.asarray(starts, dtype=_np.float64).reshape((-1, 2))
+    ends = _np.asarray(ends, dtype=_np.float64).reshape((-1, 2))
+    u0, u1 = (starts[:,0] - grid.xoffset) / grid.xsize, (ends[:,0] - grid.xoffset) / grid.xsize
+    v0, v1 = (starts[:,1] - grid.yoffset) / grid.ysize, (ends[:,1] - grid.yoffset) / grid.ysize
+    xlines, xts = _grid_line_crossings(u0, u1)
+    ylines, yts = _grid_line_crossings(v0, v1)
+    number = len(starts)
+    lines = _np.concatenate([_np.arange(number), _np.arange(number), xlines, ylines])
+    ts = _np.concatenate([_np.zeros(number), _np.ones(number), xts, yts])
+    order = _np.lexsort((ts, lines))
+    lines, ts = lines[order], ts[order]
+    # Ignore tiny pieces from passing (almost) exactly through a corner
+    keep = (lines[1:] == lines[:-1]) & (ts[1:] - ts[:-1] > 1e-12)
+    lines, t1, t2 = lines[:-1][keep], ts[:-1][keep], ts[1:][keep]
+    t = (t1 + t2) / 2
+    gx = _np.floor(u0[lines] + (u1[lines] - u0[lines]) * t).astype(_np.int64)
+    gy = _np.floor(v0[lines] + (v1[lines] - v0[lines]) * t).astype(_np.int64)
+    return lines, gx, gy, t1, t2
+
 
 try:
     import rtree as _rtree
@@ -101,17 +101,35 @@ class GaussianBaseProvider(KernelProvider):
 class GaussianFixedBandwidthProvider(KernelProvider):
     """Use the :class:`kernels.GaussianBase` to estimate a kernel.
     Has a fixed bandwidth (and identity covariance matrix).
+
+    :param bandwidth: The bandwidth to use.
+    :param tolerance: Optionally, the tolerance to set on the kernel, see
+      :attr:`kernels.GaussianBase.tolerance`
     """
-    def __init__(self, bandwidth):
+    def __init__(self, bandwidth, tolerance=None):
         self._h = bandwidth
+        self._tolerance = tolerance
+
+    @property
+    def bandwidth(self):
+        """The fixed bandwidth."""
+        return self._h
+
+    @property
+    def tolerance(self):
+        """The tolerance set on each kernel, or `None`."""
+        return self._tolerance
     
     def __call__(self, data):
         ker = _kernels.GaussianBase(data)
         ker.bandwidth = self._h
         ker.covariance_matrix = _np.eye(ker.dimension)
+        ker.tolerance = self._tolerance
         return ker
 
     def __repr__(self):
+        if self._tolerance is not None:
+            return "GaussianFixedBandwidthProvider(bandwidth={}, tolerance={})".format(self._h, self._tolerance)
         return "GaussianFixedBandwidthProvider(bandwidth={})".format(self._h)
 
     @property
@@ -121,9 +139,15 @@ class GaussianFixedBandwidthProvider(KernelProvider):
 
 class GaussianNearestNeighbourProvider(KernelProvider):
     """Use the :class:`kernels.GaussianNearestNeighbour` to estimate
-    a kernel."""
-    def __init__(self, k):
+    a kernel.
+
+    :param k: The nearest neighbour to look at.
+    :param tolerance: Optionally, the tolerance to set on the kernel, see
+      :attr:`kernels.GaussianBase.tolerance`
+    """
+    def __init__(self, k, tolerance=None):
         self._k = k
+        self._tolerance = tolerance
         
     @property
     def k(self):
@@ -135,9 +159,13 @@ class GaussianNearestNeighbourProvider(KernelProvider):
         self._k = v
 
     def __call__(self, data):
-        return _kernels.GaussianNearestNeighbour(data, self._k)
+        ker = _kernels.GaussianNearestNeighbour(data, self._k)
+        ker.tolerance = self._tolerance
+        return ker
 
     def __repr__(self):
+        if self._tolerance is not None:
+            return "GaussianNearestNeighbourProvider(k={}, tolerance={})".format(self._k, self._tolerance)
         return "GaussianNearestNeighbourProvider(k={})".format(self._k)
 
     @property
@@ -212,15 +240,11 @@ class KDE(_predictors.DataTrainer):
         self._space_kernel = v
         
     def _kernel(self, start_time=None, end_time=None):
-        data = self.data
-        if start_time is not None:
-            start_time = _np.datetime64(start_time)
-            data = data[data.timestamps >= start_time]
-        if end_time is not None:
-            end_time = _np.datetime64(end_time)
-            data = data[data.timestamps < end_time]
+        data = self.data.time_window(start_time, end_time)
         if end_time is None:
             end_time = data.timestamps[-1]
+        else:
+            end_time = _np.datetime64(end_time)
 
         kernel = self.space_kernel(data.coords)
         time_deltas = (end_time - data.timestamps) / self.time_unit
@@ -256,3 +280,172 @@ class KDE(_predictors.DataTrainer):
         kernel = self._kernel(start_time, end_time)
         return _predictors.grid_prediction_from_kernel(kernel, self.region,
                                 self.grid, samples)
+
+
+class KDEIncremental():
+    """Makes a sequence of predictions with :class:`KDE` over a sliding window
+    of time, keeping a running (weighted) total of the kernel in each grid
+    cell.  Only configurations which can be updated exactly are supported:
+
+      - The space kernel must be a :class:`GaussianFixedBandwidthProvider`, so
+        that the kernel around each event does not depend on the other events.
+      - The time kernel must be a :class:`ConstantTimeKernel` or an
+        :class:`ExponentialTimeKernel`, so that moving the end time forward
+        multiplies every event's weight by the same factor.
+      - The grid is sampled on a regular sub-grid (a negative number of
+        `samples`, see :class:`ContinuousPrediction`).
+
+    Moving the window forward then costs `O(cells)` to rescale the totals,
+    plus, for each event which enters or leaves the window, the number of
+    grid cells it affects: all cells, or only those within the cut-off radius
+    if the provider has a :attr:`GaussianFixedBandwidthProvider.tolerance`.
+
+    Each call to :meth:`predict` gives the same prediction as calling
+    `predictor.predict` with the same arguments and `samples`, up to floating
+    point rounding.  If the window moves backwards, or the settings of the
+    predictor change, the totals are recomputed from scratch.
+
+    :param predictor: Instance of :class:`KDE` with the kernels and data
+      already set.
+    :param samples: The (negative) number of samples to use in each grid cell;
+      default is -5 which means a 5x5 sub-grid.
+    """
+    def __init__(self, predictor, samples=-5):
+        if samples is None or samples >= 0:
+            raise ValueError("Only supports a regular sub-grid of samples, so `samples` should be negative.")
+        self._predictor = predictor
+        self._samples = samples
+        self.reset()
+
+    @property
+    def predictor(self):
+        """The :class:`KDE` instance we use."""
+        return self._predictor
+
+    def reset(self):
+        """Forget the running totals, so the next prediction is computed from
+        scratch."""
+        self._state = None
+
+    # Maximum number of (event, sample point) pairs to evaluate at once
+    _max_pairs = 1000000
+
+    def _check_kernels(self):
+        p = self._predictor
+        if not isinstance(p.space_kernel, GaussianFixedBandwidthProvider):
+            raise ValueError("Space kernel must be a GaussianFixedBandwidthProvider, not {}".format(p.space_kernel))
+        if not isinstance(p.time_kernel, (ConstantTimeKernel, ExponentialTimeKernel)):
+            raise ValueError("Time kernel must be constant or exponential, not {}".format(p.time_kernel))
+
+    def _key(self):
+        p = self._predictor
+        return ((p.data, p.space_kernel, p.time_kernel, p.region),
+            (p.grid, p.time_unit, p.space_kernel.bandwidth, p.space_kernel.tolerance,
+             getattr(p.time_kernel, "scale", None)))
+
+    def _time_weights(self, timestamps, end_time):
+        p = self._predictor
+        return p.time_kernel((end_time - timestamps) / p.time_unit)
+
+    def _rescale_factor(self, old_end, new_end):
+        p = self._predictor
+        if isinstance(p.time_kernel, ConstantTimeKernel):
+            return 1.0
+        return _np.exp(-((new_end - old_end) / p.time_unit) / p.time_kernel.scale)
+
+    def _add(self, matrix, indices, end_time, sign):
+        """Add `sign` times the weighted, cell averaged, kernel centred at each
+        of the events `indices` to `matrix`."""
+        if len(indices) == 0:
+            return
+        p = self._predictor
+        height, width = matrix.shape
+        coords = p.data.coords[:, indices]
+        weights = self._time_weights(p.data.timestamps[indices], end_time)
+        h = p.space_kernel.bandwidth
+        band_2sq = 2 * h * h
+
+        s = -self._samples
+        pat = (_np.arange(s) * 2 + 1) / (s + s)
+        xx, yy = [a.ravel() for a in _np.meshgrid(pat, pat)]
+
+        if p.space_kernel.tolerance is None:
+            radius = None
+            gy, gx = [a.ravel() for a in _np.indices((height, width))]
+            offsets = None
+        else:
+            radius = abs(h) * _np.sqrt(-2 * _np.log(p.space_kernel.tolerance))
+            r = int(_np.ceil(radius / p.grid)) + 1
+            dx, dy = [a.ravel() for a in _np.meshgrid(_np.arange(-r, r+1), _np.arange(-r, r+1))]
+            ex = _np.floor((coords[0] - p.region.xmin) / p.grid).astype(_np.int64)
+            ey = _np.floor((coords[1] - p.region.ymin) / p.grid).astype(_np.int64)
+            offsets = (dx, dy)
+
+        cells_per_event = len(gx) if offsets is None else len(offsets[0])
+        chunk = max(1, self._max_pairs // (cells_per_event * len(xx)))
+        for start in range(0, len(indices), chunk):
+            end = start + chunk
+            if offsets is None:
+                rows = _np.repeat(_np.arange(start, min(end, len(indices))), len(gx))
+                cx = _np.tile(gx, min(end, len(indices)) - start)
+                cy = _np.tile(gy, min(end, len(indices)) - start)
+            else:
+                tx = ex[start:end,None] + offsets[0][None,:]
+                ty = ey[start:end,None] + offsets[1][None,:]
+                inside = (tx >= 0) & (tx < width) & (ty >= 0) & (ty < height)
+                rows, cols = _np.nonzero(inside)
+                cx, cy = tx[rows, cols], ty[rows, cols]
+                rows = rows + start
+            px = (cx[:,None] + xx[None,:]) * p.grid + p.region.xmin
+            py = (cy[:,None] + yy[None,:]) * p.grid + p.region.ymin
+            dsq = (coords[0, rows][:,None] - px)**2 + (coords[1, rows][:,None] - py)**2
+            values = _np.exp(-dsq / band_2sq)
+            if radius is not None:
+                values[dsq > radius * radius] = 0
+            values = _np.mean(values, axis=1) * weights[rows]
+            matrix += sign * _np.bincount(cy * width + cx, weights=values,
+                minlength=matrix.size).reshape(matrix.shape)
+
+    def predict(self, start_time, end_time):
+        """Calculate a grid based prediction.
+
+        :param start_time: Only use data after (and including) this time.  If
+          `None` then use from the start of the data.
+        :param end_time: Only use data before this time, and treat this as the
+          time point to calculate the time kernel relative to.  Unlike
+          :meth:`KDE.predict`, must be given.
+
+        :return: An instance of :class:`GridPredictionArray`
+        """
+        if end_time is None:
+            raise ValueError("Must specify an end time")
+        self._check_kernels()
+        p = self._predictor
+        end_time = _np.datetime64(end_time)
+        timestamps = p.data.timestamps
+        lo = 0
+        if start_time is not None:
+            lo = _np.searchsorted(timestamps, _np.datetime64(start_time), side="left")
+        hi = max(lo, _np.searchsorted(timestamps, end_time, side="left"))
+        if hi == lo:
+            raise ValueError("No events in the time window")
+
+        objects, values = self._key()
+        state = self._state
+        if (state is None or any(a is not b for a, b in zip(state[0], objects))
+                or state[1] != values or lo < state[2] or hi < state[3]
+                or end_time < state[4]):
+            width, height = p.region.grid_size(p.grid)
+            state = [objects, values, lo, lo, end_time, _np.zeros((height, width))]
+            self._state = state
+        _, _, old_lo, old_hi, old_end, matrix = state
+
+        matrix *= self._rescale_factor(old_end, end_time)
+        self._add(matrix, _np.arange(old_lo, min(lo, old_hi)), end_time, -1)
+        self._add(matrix, _np.arange(max(lo, old_hi), hi), end_time, 1)
+        state[2:5] = lo, hi, end_time
+
+        h = p.space_kernel.bandwidth
+        norm = _np.sum(self._time_weights(timestamps[lo:hi], end_time)) * h * h * 2 * _np.pi
+        return _predictors.GridPredictionArray(p.grid, p.grid, matrix / norm,
+            p.region.xmin, p.region.ymin)
@@ -38,6 +38,7 @@ import numpy as _np
 import abc as _abc
 import logging as _logging
 import scipy.linalg as _linalg
+import scipy.spatial as _spatial
 
 _logger = _logging.getLogger(__name__)
 
@@ -415,12 +416,18 @@ class GaussianBase():
         self._data = data
         self._weights = None
         self._sqrt_det = 1
+        self._tolerance = None
+        self._trees = None
 
         self.bandwidth = "scott"
         self.covariance_matrix = None
         self.weights = None
         self.set_scale(1.0)
-        
+
+    # Maximum number of (data point, evaluation point) pairs to work with at
+    # once.
+    _max_pairs = 1000000
+
     def __call__(self, pts):
         pts = _np.asarray(pts)
         if len(pts.shape) == 1 and self.dimension > 1:
@@ -429,19 +436,29 @@ class GaussianBase():
             pts = _np.atleast_2d(pts)
         if pts.shape[0] != self.dimension:
             raise ValueError("Data is {} dimensional but asked to evaluate on {} dimensional data".format(self.dimension, pts.shape[0]))
-        out = self._fast_call(pts)
-        if out is None:
-            out = _np.asarray([self(pt)[0] for pt in pts.T])
+        if self.tolerance is not None and self._whiten is not None:
+            return self._tree_call(pts)
+        chunk = max(1, self._max_pairs // self.num_points)
+        out = _np.empty(pts.shape[1])
+        for start in range(0, pts.shape[1], chunk):
+            out[start : start + chunk] = self._fast_call(pts[:, start : start + chunk])
         return out
 
-    def _too_large(self, pts):
-        return pts.shape[1] > 1 and self.data.shape[0] * self.data.shape[1] * pts.shape[1] > 100000
+    def _quadratic_form(self, pts):
+        """`(x_i-x)^T S^{-1} (x_i-x)` for each data point `x_i` and each point
+        `x` in `pts`, as an array of shape `(N, M)`."""
+        if self._whiten is None:
+            x = self.data[:,:,None] - pts[:,None,:]
+            return _np.sum(x * _np.sum(self._cov_matrix_inv[:,:,None,None] * x[:,None,:,:], axis=0), axis=0)
+        pts = _np.dot(self._whiten, pts)
+        out = _np.zeros((self.num_points, pts.shape[1]))
+        for data_row, pts_row in zip(self._white_data, pts):
+            x = data_row[:,None] - pts_row[None,:]
+            out += x * x
+        return out
 
     def _fast_call(self, pts):
-        if self._too_large(pts):
-            return None
-        x = self.data[:,:,None] - pts[:,None,:]
-        x = _np.sum(x * _np.sum(self._cov_matrix_inv[:,:,None,None] * x[:,None,:,:], axis=0), axis=0)
+        x = self._quadratic_form(pts)
         if len(self._bandwidth_2sq.shape) == 0:
             x = _np.exp(-x / self._bandwidth_2sq)
         else:
@@ -451,6 +468,74 @@ class GaussianBase():
             x = x * self.weights[:,None]
         return _np.sum(x, axis=0) / self._norm * self.scale
 
+    def _bandwidth_groups(self):
+        """Split the data points into groups whose bandwidths differ by at
+        most a factor of 2, so that each group can use a tight search
+        radius."""
+        if len(self._bandwidth.shape) == 0:
+            return [_np.arange(self.num_points)]
+        band = _np.abs(self._bandwidth)
+        levels = _np.floor(_np.log2(_np.maximum(band, 1e-300)))
+        return [_np.nonzero(levels == level)[0] for level in _np.unique(levels)]
+
+    def _get_trees(self):
+        if self._trees is None:
+            cutoff = _np.sqrt(-2 * _np.log(self.tolerance))
+            self._trees = []
+            for indices in self._bandwidth_groups():
+                if len(self._bandwidth.shape) == 0:
+                    radius = abs(self._bandwidth) * cutoff
+                else:
+                    radius = _np.max(_np.abs(self._bandwidth[indices])) * cutoff
+                tree = _spatial.cKDTree(self._white_data[:, indices].T)
+                self._trees.append((tree, indices, radius))
+        return self._trees
+
+    def _tree_call(self, pts):
+        wpts = _np.dot(self._whiten, pts)
+        out = _np.zeros(pts.shape[1])
+        chunk = max(1, self._max_pairs // max(1, self.num_points))
+        chunk = max(chunk, 1000)
+        for start in range(0, pts.shape[1], chunk):
+            ptree = _spatial.cKDTree(wpts[:, start : start + chunk].T)
+            for tree, indices, radius in self._get_trees():
+                pairs = ptree.sparse_distance_matrix(tree, radius, output_type="ndarray")
+                if len(pairs) == 0:
+                    continue
+                data_index = indices[pairs["j"]]
+                x = pairs["v"] ** 2
+                if len(self._bandwidth_2sq.shape) == 0:
+                    x = _np.exp(-x / self._bandwidth_2sq)
+                else:
+                    x = _np.exp(-x / self._bandwidth_2sq[data_index])
+                    x = x / self._bandwidth_to_dim[data_index]
+                if self.weights is not None:
+                    x = x * self.weights[data_index]
+                out[start : start + ptree.n] += _np.bincount(pairs["i"], weights=x, minlength=ptree.n)
+        return out / self._norm * self.scale
+
+    @property
+    def tolerance(self):
+        """Set to `None` (the default) to evaluate the kernel exactly.
+        Otherwise a number `0 < tolerance < 1`, and then the kernel is
+        evaluated using a k-d tree, ignoring the contribution from any data
+        point whose Gaussian has fallen below `tolerance` times its peak
+        value.  For a point `x` the absolute error is then at most
+        `tolerance * scale * sum_i w_i h_i^{-n} / norm`, i.e. `tolerance`
+        times the largest value the kernel could possibly take (the value if
+        every data point were at `x`).  Typically the relative error is much
+        smaller.  Requires the covariance matrix to be positive definite;
+        otherwise the kernel is evaluated exactly.
+        """
+        return self._tolerance
+
+    @tolerance.setter
+    def tolerance(self, v):
+        if v is not None and not 0 < v < 1:
+            raise ValueError("Tolerance should be between 0 and 1")
+        self._tolerance = v
+        self._trees = None
+
     def _update_norm(self):
         if self.weights is not None:
             norm = self._weight_sum
@@ -510,6 +595,7 @@ class GaussianBase():
         self._bandwidth = band
         self._bandwidth_to_dim = band ** self.dimension
         self._bandwidth_2sq = 2 * band * band
+        self._trees = None
         self._update_norm()
 
     @property
@@ -531,6 +617,13 @@ class GaussianBase():
             raise ValueError("Must be the same dimension as the data")
         self._cov_matrix = S
         self._cov_matrix_inv = _linalg.inv(S)
+        # `S^{-1} = L L^T` so that `x^T S^{-1} x = |L^T x|^2`.
+        try:
+            self._whiten = _linalg.cholesky(self._cov_matrix_inv, lower=True).T
+            self._white_data = _np.dot(self._whiten, self._data)
+        except _linalg.LinAlgError:
+            self._whiten = None
+        self._trees = None
         d = _linalg.det(self._cov_matrix)
         if d < 0:
             raise ValueError("Matrix {} has negative determinant!".format(self._cov_matrix))
@@ -599,6 +692,7 @@ def marginalise_gaussian_kernel(kernel, axis=0):
     new_kernel.weights = kernel.weights
     new_kernel.bandwidth = kernel.bandwidth
     new_kernel.scale = kernel.scale
+    new_kernel.tolerance = kernel.tolerance
     return new_kernel
 
 
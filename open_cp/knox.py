@@ -23,8 +23,19 @@ Implements a monte carlo algorithm to compute knox statistics and p-values.
 """
 
 from . import predictors as _predictors
+from . import pool as _pool
 import numpy as _np
-import scipy.spatial.distance as _distance
+import scipy.spatial as _spatial
+
+def _pair_indices(numpts, start, end):
+    """Indices `(i, j)`, with `i<j` and `start <= i < end`, in the order of
+    the compressed distance matrix."""
+    rows = _np.arange(start, end)
+    counts = numpts - 1 - rows
+    i = _np.repeat(rows, counts)
+    offsets = _np.cumsum(counts) - counts
+    j = i + 1 + _np.arange(len(i)) - _np.repeat(offsets, counts)
+    return i, j
 
 def distances(points, start=None, end=None):
     """Computes the distances between pairs of points.  In simple operation,
@@ -50,18 +61,58 @@ def distances(points, start=None, end=None):
     :param end: Optionally, only look at a slice `[start:end]` for the `i`
       entries (as above).
     """
-    if start is not None or end is not None:
-        raise NotImplementedError()
+    points = _np.asarray(points)
     if len(points.shape) == 1:
         points = points[:,None]
     numpts = points.shape[0]
-    out = _np.empty(numpts * (numpts - 1) // 2)
-    index = 0
-    for i in range(numpts - 1):
-        out[index : index + numpts - i - 1] = _np.sqrt(_np.sum((points[i+1:] - points[i,:])**2, axis=1))
-        index += numpts - i - 1
+    start, end, _ = slice(start, end).indices(numpts)
+    if end <= start:
+        return _np.empty(0)
+    i, j = _pair_indices(numpts, start, end)
+    return _np.sqrt(_np.sum((points[j] - points[i])**2, axis=1))
+
+
+# Set in each worker process by `_init_worker`, so that the pairs of points
+# are only sent once to each worker.
+_worker_state = None
+
+def _init_worker(*args):
+    global _worker_state
+    _worker_state = args
+
+def _batch_statistics(times, pairs_i, pairs_j, space_members, time_bins, perms):
+    """Compute the statistics for each permutation of `times` in `perms`.
+
+    :return: Array of shape `(B, S, T)` for `B` permutations, `S` space bins
+      and `T` time bins.
+    """
+    permuted = times[perms]
+    time_distances = _np.abs(permuted[:, pairs_j] - permuted[:, pairs_i])
+    out = _np.empty((perms.shape[0], space_members.shape[1], len(time_bins)))
+    for t, (start, end) in enumerate(time_bins):
+        in_bin = ((time_distances >= start) & (time_distances <= end)).astype(_np.float64)
+        out[:, :, t] = _np.dot(in_bin, space_members)
     return out
 
+def _random_permutations(seed, size, numpts):
+    state = _np.random.RandomState(seed)
+    return _np.asarray([state.permutation(numpts) for _ in range(size)], dtype=_np.int64)
+
+
+class _KnoxTask(_pool.Task):
+    def __init__(self, key, seed, size):
+        super().__init__(key)
+        self._seed = seed
+        self._size = size
+
+    def run(self, times, pairs_i, pairs_j, space_members, time_bins):
+        perms = _random_permutations(self._seed, self._size, len(times))
+        return _batch_statistics(times, pairs_i, pairs_j, space_members, time_bins, perms)
+
+    def __call__(self):
+        return self.run(*_worker_state)
+
+
 class Knox(_predictors.DataTrainer):
     """Computes the knox statistic and monte carlo dervied p-value.
     See the doc-strings on the attributes for more details.
@@ -125,47 +176,104 @@ class Knox(_predictors.DataTrainer):
             (_np.timedelta64(int(s*scale),"ms"),_np.timedelta64(int(e*scale),"ms"))
             for s, e in bins ]
     
-    def _stat(self, distances, time_distances):
-        cells = _np.empty((len(self.space_bins), len(self.time_bins)))
-        for j, time_bin in enumerate(self.time_bins):
-            start = time_bin[0] / _np.timedelta64(1, "ms")
-            end = time_bin[1] / _np.timedelta64(1, "ms")
-            for i, space_bin in enumerate(self.space_bins):
-                cells[i][j] = _np.sum( (distances >= space_bin[0]) & (distances <= space_bin[1])
-                        & (time_distances >= start) & (time_distances <= end) )
-        return cells
-
-    def calculate(self, iterations=999):
+    # Number of points to search for close pairs at once
+    _chunk_size = 5000
+    # Rough memory budget, in bytes, for each batch of permutations
+    _batch_bytes = 2**27
+
+    def _time_bins_ms(self):
+        return [(s / _np.timedelta64(1, "ms"), e / _np.timedelta64(1, "ms"))
+            for s, e in self.time_bins]
+
+    def _close_pairs(self, points):
+        """Find all pairs of points which lie in at least one space bin.  Uses
+        a k-d tree, processing `_chunk_size` points at a time, so that memory
+        usage is proportional to the number of close pairs, and not to the
+        square of the number of points.
+
+        :return: `(pairs_i, pairs_j, space_members)` where `pairs_i < pairs_j`
+          and `space_members` is an array of shape `(P, S)` which is 1 if pair
+          `p` is in space bin `s` and 0 otherwise.
+        """
+        max_distance = max(smax for _, smax in self.space_bins)
+        tree = _spatial.cKDTree(points)
+        pairs_i, pairs_j, members = [], [], []
+        for start in range(0, points.shape[0], self._chunk_size):
+            chunk = points[start : start + self._chunk_size]
+            close = _spatial.cKDTree(chunk).sparse_distance_matrix(tree,
+                max_distance, output_type="ndarray")
+            i, j = close["i"].astype(_np.int64) + start, close["j"].astype(_np.int64)
+            i, j = i[i < j], j[i < j]
+            dists = _np.sqrt(_np.sum((points[j] - points[i])**2, axis=1))
+            in_bins = _np.asarray([(dists >= smin) & (dists <= smax)
+                for smin, smax in self.space_bins]).reshape(len(self.space_bins), len(i)).T
+            mask = _np.any(in_bins, axis=1)
+            pairs_i.append(i[mask])
+            pairs_j.append(j[mask])
+            members.append(in_bins[mask])
+        pairs_i = _np.concatenate(pairs_i)
+        pairs_j = _np.concatenate(pairs_j)
+        members = _np.concatenate(members).astype(_np.float64)
+        order = _np.lexsort((pairs_j, pairs_i))
+        return pairs_i[order], pairs_j[order], members[order]
+
+    def _batch_size(self, numpts, numpairs):
+        per_permutation = 8 * (numpts + 3 * numpairs)
+        return max(1, self._batch_bytes // max(1, per_permutation))
+
+    def calculate(self, iterations=999, processes=1):
         """Calculates the knox statistic for each cell, and the monte carlo
         derived p-value.  For each space bin and time bin, we create a cell
         and perform the calculation for that cell with that space/time cutoff.
 
+        The pairs of points which fall into some space bin are found once (in
+        chunks, to bound memory usage), and then the permutations of the
+        timestamps are processed in batches.
+
         :param iterations: The number of iterations to perform when estimating
           the p-value.
+        :param processes: The number of processes to use for the monte carlo
+          iterations.  If 1 (the default) then run in this process; if `None`
+          then use one process per CPU.
         
         :return: An instance of :class:`Result`.
             An array whose `[i,j]` entry corresponds to space bin [i] and
           time bin [j].  Each entry is a pair `(statistic, p-value)`.
         """
         points = self.data.coords.T
-        dists = _distance.pdist(points)
         times = (self.data.timestamps - self.data.timestamps[0]) / _np.timedelta64(1, "ms")
-        time_distances = distances(times)
-        
-        stats = self._stat(dists, time_distances)
-        monte_carlo_cells = []
-        for _ in range(iterations):
-            _np.random.shuffle(times)
-            time_distances = distances(times)
-            monte_carlo_cells.append(self._stat(dists, time_distances))
-        
-        pvalues = _np.empty(stats.shape)
+        pairs_i, pairs_j, space_members = self._close_pairs(points)
+        time_bins = self._time_bins_ms()
+        worker_state = (times, pairs_i, pairs_j, space_members, time_bins)
+
+        identity = _np.arange(len(times))[None, :]
+        stats = _batch_statistics(*worker_state, identity)[0]
+
+        batch_size = self._batch_size(len(times), len(pairs_i))
+        tasks = []
+        for key, offset in enumerate(range(0, iterations, batch_size)):
+            size = min(batch_size, iterations - offset)
+            tasks.append(_KnoxTask(key, _np.random.randint(2**31), size))
+
+        if processes == 1:
+            batches = [task.run(*worker_state) for task in tasks]
+        else:
+            results = dict()
+            with _pool.PoolExecutor(processes, _init_worker, worker_state) as executor:
+                futures = [executor.submit(task) for task in tasks]
+                for key, result in _pool.yield_task_results(futures):
+                    results[key] = result
+            batches = [results[task.key] for task in tasks]
+        if len(batches) > 0:
+            monte_carlo = _np.concatenate(batches)
+        else:
+            monte_carlo = _np.empty((0,) + stats.shape)
+
+        pvalues = _np.sum(stats[None, :, :] <= monte_carlo, axis=0) / (1 + iterations)
         all_statistics = _np.empty(stats.shape, dtype=_np.object)
         for i in range(stats.shape[0]):
             for j in range(stats.shape[1]):
-                all_statistics[i][j] = _np.asarray([c[i][j] for c in monte_carlo_cells])
-                pvalues[i][j] = ( _np.sum( stats[i][j] <= all_statistics[i][j] )
-                        / (1 + iterations) )
+                all_statistics[i][j] = monte_carlo[:, i, j]
         return Result(stats, pvalues, all_statistics, self.space_bins, self.time_bins)
     
 class Result():
@@ -10,6 +10,7 @@ presented in the plane is vital.
 """
 
 import numpy as _np
+import math as _math
 import scipy.spatial as _spatial
 from . import data as _data
 import logging as _logging
@@ -18,6 +19,7 @@ import io as _io
 import base64 as _base64
 import json as _json
 import collections as _collections
+import heapq as _heapq
 
 _logger = _logging.getLogger(__name__)
 
@@ -98,8 +100,9 @@ class PlanarGraphGeoBuilder():
 
 
 class PlanarGraphNodeOneShot():
-    """Like :class:`PlanarGraphNodeBuilder` but much faster, at the cost of
-    needing all possible nodes to be set in the constructor.
+    """Like :class:`PlanarGraphNodeBuilder` but needing all possible nodes to
+    be set in the constructor.  Nodes are merged greedily, in the order
+    given: each node not yet merged absorbs all those within the tolerance.
     
     :param nodes: An iterable of pairs `(x,y)` of coordinates.  (Also allowed
       is `(x,y,z)` but the `z` will be ignored.)
@@ -107,23 +110,28 @@ class PlanarGraphNodeOneShot():
     """
     def __init__(self, nodes, tolerance = 0.1):
         self._edges = []
-        #all_nodes = list(set(((x,y) for x,y in points)))
         all_nodes = [(x,y) for (x,y,*z) in nodes]
-        tree = _spatial.cKDTree(all_nodes)
-        
+        # Repeated points are always merged, so only consider each once, in
+        # the order in which they first appear.
+        unique, first = _np.unique(_np.asarray(all_nodes, dtype=_np.float64).reshape((-1, 2)),
+            axis=0, return_index=True)
+        order = _np.argsort(first)
+        unique = unique[order]
+        tree = _spatial.cKDTree(unique)
+        neighbours = tree.query_ball_point(unique, tolerance)
+
         self._nodes = []
-        allnodes_to_nodes_lookup = dict()
-        
-        for i, pt in enumerate(all_nodes):
-            if i in allnodes_to_nodes_lookup:
+        lookup = _np.full(len(unique), -1, dtype=_np.int64)
+        for i, pt in enumerate(unique.tolist()):
+            if lookup[i] > -1:
                 continue
             index = len(self._nodes)
-            self._nodes.append(pt)
-            for x in tree.query_ball_point(pt, tolerance):
-                if x not in allnodes_to_nodes_lookup:
-                    allnodes_to_nodes_lookup[x] = index
-                    
-        self._lookup = {pt:allnodes_to_nodes_lookup[i] for i, pt in enumerate(all_nodes)}
+            self._nodes.append(tuple(pt))
+            near = _np.asarray(neighbours[i], dtype=_np.int64)
+            near = near[lookup[near] == -1]
+            lookup[near] = index
+
+        self._lookup = dict(zip(map(tuple, unique.tolist()), lookup.tolist()))
 
     def _add_node(self, x, y):
         return self._lookup[(x,y)]
@@ -161,15 +169,7 @@ class PlanarGraphNodeOneShot():
 
     def remove_duplicate_edges(self):
         """A neccessary evil.  Also removes loops."""
-        edges = set()
-        index = 0
-        while index < len(self._edges):
-            edge = frozenset(self._edges[index])
-            if edge in edges or len(edge)==1:
-                del self._edges[index]
-            else:
-                edges.add(edge)
-                index += 1
+        self._edges = _remove_duplicate_edges(self._edges)
         
     def build(self):
         vertices = [ (key, x, y) for key, (x,y) in enumerate(self._nodes) ]
@@ -184,8 +184,10 @@ class PlanarGraphNodeBuilder():
     if an over-pass and an under-pass share a node, there will be a "path" from
     one to the other in the generated graph.
 
-    This class is slow when the graph is large.  See
-    :class`:PlanarGraphNodeOneShot` as well.
+    Nodes are found using a "hashed grid" with cells the size of the
+    tolerance, so each node is merged in (close to) constant time, and paths
+    can be added one at a time, without knowing all the nodes in advance.
+    See also :class:`PlanarGraphNodeOneShot`.
     
     These (weaker) assumptions are suitable for the US TIGER/Lines data, for
     example.
@@ -194,6 +196,7 @@ class PlanarGraphNodeBuilder():
         self._nodes = []
         self._edges = []
         self._tolerance = 0.1
+        self._grid = dict()
         
     @property
     def tolerance(self):
@@ -204,6 +207,9 @@ class PlanarGraphNodeBuilder():
     @tolerance.setter
     def tolerance(self, v):
         self._tolerance = v
+        self._grid = dict()
+        for index, (x, y) in enumerate(self._nodes):
+            self._grid.setdefault(self._cell(x, y), []).append(index)
     
     @property
     def coord_nodes(self):
@@ -214,18 +220,33 @@ class PlanarGraphNodeBuilder():
     def edges(self):
         """A list of unordered edges `(key1, key2)`."""
         return self._edges
+
+    def _cell(self, x, y):
+        if self._tolerance <= 0:
+            return (x, y)
+        return (_math.floor(x / self._tolerance), _math.floor(y / self._tolerance))
     
     def _add_node(self, x, y):
-        if len(self._nodes) == 0:
-            self._nodes.append((x, y))
-            return 0
-        n = _np.asarray(self._nodes).T
-        distsq = (n[0] - x)**2 + (n[1] - y)**2
-        index = _np.argmin(distsq)
-        if distsq[index] < self._tolerance * self._tolerance:
-            return index
+        cell = self._cell(x, y)
+        if self._tolerance > 0:
+            # Any node within the tolerance is in one of the neighbouring
+            # cells; choose the closest (and then the first added).
+            best, best_distsq = -1, self._tolerance * self._tolerance
+            cx, cy = cell
+            for nx in (cx - 1, cx, cx + 1):
+                for ny in (cy - 1, cy, cy + 1):
+                    for index in self._grid.get((nx, ny), ()):
+                        px, py = self._nodes[index]
+                        distsq = (px - x)**2 + (py - y)**2
+                        if distsq < best_distsq or (distsq == best_distsq
+                                and best > -1 and index < best):
+                            best, best_distsq = index, distsq
+            if best > -1:
+                return best
         self._nodes.append((x, y))
-        return len(self._nodes) - 1
+        index = len(self._nodes) - 1
+        self._grid.setdefault(cell, []).append(index)
+        return index
         
     def add_path(self, path):
         """Add a new "path" to the graph.  A "path" has a start and end node,
@@ -236,22 +257,40 @@ class PlanarGraphNodeBuilder():
           format.
         """
         path = list(path)
-        for i in range(len(path) - 1):
-            x1,y1,*z = path[i]
-            x2,y2,*z = path[i + 1]
-            self.add_edge(x1, y1, x2, y2)
+        if len(path) < 2:
+            return
+        keys = [self._add_node(x, y) for (x,y,*z) in path]
+        self._edges.extend(zip(keys[:-1], keys[1:]))
 
     def add_edge(self, x1, y1, x2, y2):
         """Add an edge from `(x1, y1)` to `(x2, y2)`."""
         key1 = self._add_node(x1, y1)
         key2 = self._add_node(x2, y2)
         self._edges.append((key1, key2))
+
+    def remove_duplicate_edges(self):
+        """Remove repeated edges (in either orientation), keeping the first,
+        and edges from a node to itself."""
+        self._edges = _remove_duplicate_edges(self._edges)
     
     def build(self):
         vertices = [ (key, x, y) for key, (x,y) in enumerate(self._nodes) ]
         return PlanarGraph(vertices, self.edges)
 
 
+def _remove_duplicate_edges(edges):
+    """Remove loops and repeated edges from a list of edges `(key1, key2)`,
+    where the keys are integers, keeping the first copy of each edge."""
+    if len(edges) == 0:
+        return []
+    array = _np.asarray(edges, dtype=_np.int64).reshape((-1, 2))
+    pairs = _np.sort(array, axis=1)
+    _, first = _np.unique(pairs, axis=0, return_index=True)
+    first = _np.sort(first)
+    first = first[pairs[first,0] != pairs[first,1]]
+    return [(k1, k2) for k1, k2 in array[first].tolist()]
+
+
 class PlanarGraphBuilder():
     """General purpose builder class.  Can be constructed from a
     :class:`PlanarGraph` instance; is designed for mutating a
@@ -380,6 +419,25 @@ class GraphBuilder():
         return Graph(self.vertices, self.edges, self.lengths)
 
 
+def _is_integer_keys(keys):
+    return all(isinstance(k, (int, _np.integer)) for k in keys)
+
+def _sorted_keys(keys):
+    """Sort a list of vertex keys, if possible.
+
+    :return: `(sorted_keys, order)` where `order` is an array of indices into
+      `keys`.
+    """
+    if len(keys) > 0 and _is_integer_keys(keys):
+        order = _np.argsort(_np.asarray(keys), kind="stable")
+    else:
+        try:
+            order = _np.asarray(sorted(range(len(keys)), key=keys.__getitem__), dtype=_np.int64)
+        except TypeError:
+            order = _np.arange(len(keys))
+    return [keys[i] for i in order.tolist()], order
+
+
 class Graph():
     """A simple graph abstract class.
     
@@ -399,66 +457,155 @@ class Graph():
     :param edges: An iterable of (unordered) pairs `(key1, key2)`.
     """
     def __init__(self, vertices, edges, lengths=None):
-        self._vertices = set()
-        for key in vertices:
-            if key in self._vertices:
-                raise ValueError("Keys of vertices should be unique; but {} is repeated".format(key))
-            self._vertices.add(key)
-        self._edges = list()
-        edges_set = set()
-        for key1, key2 in edges:
-            if key1 == key2:
-                raise ValueError("Cannot have an edge from vertex {} to itself".format(key1))
-            e = frozenset((key1, key2))
-            if e in edges_set:
-                raise ValueError("Trying to add a 2nd edge from {} to {}".format(key1, key2))
-            edges_set.add(e)
-            self._edges.append((key1, key2))
+        self._init_vertices(list(vertices))
+        self._init_edges(edges)
         if lengths is None:
             self._lengths = None
         else:
             self._lengths = _np.asarray(lengths)
-            if len(self._lengths) != len(self._edges):
+            if len(self._lengths) != len(self._edge_ends):
                 raise ValueError("Should be as many lengths as edges.")
-        self._precompute()
-    
-    def _precompute(self):
-        self._neighbours = {k:set() for k in self._vertices}
-        for key1, key2 in self.edges:
-            self._neighbours[key1].add(key2)
-            self._neighbours[key2].add(key1)
-        for k in list(self._neighbours.keys()):
-            self._neighbours[k] = list(self._neighbours[k])
-            self._neighbours[k].sort()
-    
-        self._neighbourhood_edges = dict()
-        for index, edge in enumerate(self.edges):
-            for key in edge:
-                if key not in self._neighbourhood_edges:
-                    self._neighbourhood_edges[key] = []
-                self._neighbourhood_edges[key].append(index)
-        for k in list(self._neighbourhood_edges.keys()):
-            self._neighbourhood_edges[k].sort()
-            
-        self._edges_inverse = dict()
-        for index, edge in enumerate(self._edges):
-            self._edges_inverse[edge] = (index, 1)
-            e = (edge[1], edge[0])
-            self._edges_inverse[e] = (index, -1)
+        self._precompute_adjacency()
+
+    def _init_vertices(self, keys):
+        # Integer indices for vertices: the keys, sorted if possible.
+        self._vertex_keys, _ = _sorted_keys(keys)
+        self._vertex_index = {k:i for i, k in enumerate(self._vertex_keys)}
+        if len(self._vertex_index) != len(keys):
+            seen = set()
+            for key in keys:
+                if key in seen:
+                    raise ValueError("Keys of vertices should be unique; but {} is repeated".format(key))
+                seen.add(key)
+        self._vertex_key_array = None
+        if _is_integer_keys(self._vertex_keys):
+            self._vertex_key_array = _np.asarray(self._vertex_keys, dtype=_np.int64)
+
+    def _vertex_indices(self, keys):
+        """Convert an iterable of vertex keys to an array of vertex indices.
+        Raises `KeyError` if a key is not a vertex."""
+        if self._vertex_key_array is not None:
+            array = _np.asarray(keys)
+            if array.ndim == 1 and array.dtype.kind in "iu":
+                indices = _np.searchsorted(self._vertex_key_array, array)
+                indices[indices == len(self._vertex_key_array)] = 0
+                found = self._vertex_key_array[indices] == array if len(self._vertex_key_array) > 0 else array != array
+                if not _np.all(found):
+                    raise KeyError(array[~found][0])
+                return indices.astype(_np.int64)
+        return _np.asarray([self._vertex_index[k] for k in keys], dtype=_np.int64)
+
+    def _init_edges(self, edges):
+        if isinstance(edges, _np.ndarray) and edges.ndim == 2:
+            ends = self._vertex_indices(edges.ravel()).reshape((-1, 2))
+        else:
+            edges = list(edges)
+            ends = self._vertex_indices([k for e in edges for k in e]).reshape((-1, 2))
+        loops = _np.nonzero(ends[:,0] == ends[:,1])[0]
+        codes = self._edge_codes(ends[:,0], ends[:,1])
+        order = _np.argsort(codes, kind="stable")
+        repeats = order[1:][codes[order[1:]] == codes[order[:-1]]]
+        if len(loops) > 0 and (len(repeats) == 0 or loops[0] < repeats.min()):
+            key = self._vertex_keys[ends[loops[0],0]]
+            raise ValueError("Cannot have an edge from vertex {} to itself".format(key))
+        if len(repeats) > 0:
+            key1, key2 = (self._vertex_keys[i] for i in ends[repeats.min()])
+            raise ValueError("Trying to add a 2nd edge from {} to {}".format(key1, key2))
+        self._edge_ends = ends
+        self._edge_code_order = order
+        self._sorted_edge_codes = codes[order]
+
+    def _edge_codes(self, v1, v2):
+        """Encode the unordered pairs of vertex indices as integers."""
+        n = len(self._vertex_keys)
+        return _np.minimum(v1, v2).astype(_np.int64) * n + _np.maximum(v1, v2)
+
+    def _precompute_adjacency(self):
+        # Array based adjacency list, in "compressed sparse row" format, with
+        # neighbours sorted by index.  Also the edges incident to each vertex,
+        # sorted by edge index.
+        ends = self._edge_ends
+        edge_indices = _np.arange(len(ends))
+        starts = _np.concatenate((ends[:,0], ends[:,1]))
+        targets = _np.concatenate((ends[:,1], ends[:,0]))
+        both_edges = _np.concatenate((edge_indices, edge_indices))
+        order = _np.lexsort((targets, starts))
+        self._adjacency_indptr = _np.searchsorted(starts[order],
+            _np.arange(len(self._vertex_keys) + 1))
+        self._adjacency_vertices = targets[order]
+        self._adjacency_edges = both_edges[order]
+        self._vertex_degrees = _np.diff(self._adjacency_indptr)
+        order = _np.lexsort((both_edges, starts))
+        self._incident_edges = both_edges[order]
+        self._incident_vertices = targets[order]
+
+    def _edge_lengths(self):
+        """Array of lengths, or if we have no lengths, all ones.  Cached."""
+        if not hasattr(self, "_edge_lengths_cache"):
+            if self._lengths is None:
+                self._edge_lengths_cache = _np.ones(len(self._edge_ends))
+            else:
+                self._edge_lengths_cache = _np.asarray(self._lengths, dtype=_np.float64)
+        return self._edge_lengths_cache
+
+    def _adjacency_lists(self):
+        """Python lists, for fast scalar access, of the adjacency list:
+        `(indptr, neighbours, edges, lengths, factors)` where `lengths` are
+        the lengths of the edges in the adjacency list, and `factors` are
+        `max(1, degree - 1)` for each vertex.  Cached, as the graph is
+        immutable."""
+        if not hasattr(self, "_adjacency_lists_cache"):
+            self._adjacency_lists_cache = (self._adjacency_indptr.tolist(),
+                self._adjacency_vertices.tolist(), self._adjacency_edges.tolist(),
+                self._edge_lengths()[self._adjacency_edges].tolist(),
+                _np.maximum(1, self._vertex_degrees - 1).tolist())
+        return self._adjacency_lists_cache
+
+    def _edge_keys(self, edges):
+        """The keys of the vertices of the edges.
+
+        :param edges: Array of edge indices.
+
+        :return: Pair `(start_keys, end_keys)` of arrays.
+        """
+        ends = self._edge_ends[_np.asarray(edges, dtype=_np.int64)]
+        if self._vertex_key_array is not None:
+            return self._vertex_key_array[ends[:,0]], self._vertex_key_array[ends[:,1]]
+        keys = self._vertex_keys
+        return (_np.asarray([keys[v] for v in ends[:,0].tolist()]),
+                _np.asarray([keys[v] for v in ends[:,1].tolist()]))
+
+    def _incidence_lists(self):
+        """Python lists, for fast scalar access, of the edges incident to each
+        vertex: `(indptr, edges, vertices, degrees, lengths)` where each row
+        of `edges` is sorted by edge index, `vertices` gives the other vertex
+        of each edge, and `lengths` is the list of edge lengths, or `None`.
+        Cached, as the graph is immutable."""
+        if not hasattr(self, "_incidence_lists_cache"):
+            self._incidence_lists_cache = (self._adjacency_indptr.tolist(),
+                self._incident_edges.tolist(), self._incident_vertices.tolist(),
+                self._vertex_degrees.tolist(),
+                None if self._lengths is None else self._lengths.tolist())
+        return self._incidence_lists_cache
     
     @property
     def vertices(self):
         """A set (do not mutate!) of `key`s."""
-        return self._vertices
+        if not hasattr(self, "_vertices_cache"):
+            self._vertices_cache = set(self._vertex_keys)
+        return self._vertices_cache
 
     @property
     def edges(self):
         """A list of unordered edges `(key1, key2)`."""
-        return self._edges
+        if not hasattr(self, "_edges_cache"):
+            keys = self._vertex_keys
+            self._edges_cache = [(keys[a], keys[b]) for a, b in self._edge_ends.tolist()]
+        return self._edges_cache
     
     @property
     def number_edges(self):
-        return len(self._edges)
+        return len(self._edge_ends)
 
     def length(self, edge_index):
         """If we have lengths, the length of this edge."""
@@ -479,20 +626,57 @@ class Graph():
           `order==1` if `self.edges[index] == (key1, key2)` while
           `order==-1` if `self.edges[index] == (key2, key1)`.
         """
-        return self._edges_inverse[(key1, key2)]
+        try:
+            v1, v2 = self._vertex_index[key1], self._vertex_index[key2]
+        except KeyError:
+            raise KeyError((key1, key2))
+        n = len(self._vertex_keys)
+        code = min(v1, v2) * n + max(v1, v2)
+        position = int(self._sorted_edge_codes.searchsorted(code))
+        if v1 == v2 or position == len(self._sorted_edge_codes) or self._sorted_edge_codes[position] != code:
+            raise KeyError((key1, key2))
+        index = int(self._edge_code_order[position])
+        return index, (1 if self._edge_ends[index, 0] == v1 else -1)
+
+    def find_edges(self, keys1, keys2):
+        """Vectorised version of :meth:`find_edge`.  Raises `KeyError` if any
+        pair of vertices is not an edge.
+
+        :param keys1: Iterable of keys of the start vertices.
+        :param keys2: Iterable of keys of the end vertices.
+
+        :return: `(indices, orders)` arrays, as for :meth:`find_edge`.
+        """
+        v1, v2 = self._vertex_indices(keys1), self._vertex_indices(keys2)
+        codes = self._edge_codes(v1, v2)
+        positions = _np.searchsorted(self._sorted_edge_codes, codes)
+        positions[positions == len(self._sorted_edge_codes)] = 0
+        found = ((v1 != v2) & (self._sorted_edge_codes[positions] == codes)
+            if len(self._sorted_edge_codes) > 0 else _np.zeros(len(codes), dtype=bool))
+        if not _np.all(found):
+            i = _np.nonzero(~found)[0][0]
+            raise KeyError((self._vertex_keys[v1[i]], self._vertex_keys[v2[i]]))
+        indices = self._edge_code_order[positions]
+        orders = _np.where(self._edge_ends[indices, 0] == v1, 1, -1)
+        return indices, orders
 
     def neighbours(self, vertex_key):
         """A list of all the neighbours of the given vertex"""
-        return self._neighbours[vertex_key]
+        indptr, neighbours, _, _, _ = self._adjacency_lists()
+        v = self._vertex_index[vertex_key]
+        keys = self._vertex_keys
+        return [keys[u] for u in neighbours[indptr[v]:indptr[v+1]]]
     
     def neighbourhood_edges(self, vertex_key):
         """A list of all the edges (as indicies into `self.edges`) incident
         with the given vertex."""
-        return self._neighbourhood_edges[vertex_key]
+        indptr, edges, _, _, _ = self._incidence_lists()
+        v = self._vertex_index[vertex_key]
+        return edges[indptr[v]:indptr[v+1]]
 
     def degree(self, vertex_key):
         """The degree (number of neighbours) of the vertex."""
-        return len(self.neighbourhood_edges(vertex_key))
+        return self._incidence_lists()[3][self._vertex_index[vertex_key]]
     
     def paths_between(self, key_start, key_end, max_length=None):
         """Iterable yielding all paths which start and end at the given
@@ -615,41 +799,38 @@ class Graph():
         We will never yield a path where `total_degree > max_degree`.
         """
         yield (None, 0, 0, 1)
-        
+
+        # Work with vertex indices, and the array based incidence lists
+        indptr, incident_edges, incident_vertices, degrees, lengths = self._incidence_lists()
+        start = self._vertex_index[start_key]
+        avoid = self._vertex_index.get(initial_avoid_key)
         todo = []
-        for i in self.neighbourhood_edges(start_key):
-            k1, k2 = self.edges[i]
-            if k2 == start_key:
-                k1, k2 = k2, k1
-            if k2 == initial_avoid_key:
+        for k in range(indptr[start], indptr[start+1]):
+            if incident_vertices[k] == avoid:
                 continue
-            todo.append((start_key, i, 0, 1, {start_key}))
+            todo.append((start, k, 0, 1, {start}))
         
         while len(todo) > 0:
-            old_vertex, edge_index, old_length, total_degree, vertices_in_path = todo.pop()
-            k1, k2 = self.edges[edge_index]
-            if k2 == old_vertex:
-                k1, k2 = k2, k1
-            new_vertex = k2
-            new_length = old_length + self.length(edge_index)
-            fact = self.degree(old_vertex) - 1
+            old_vertex, k, old_length, total_degree, vertices_in_path = todo.pop()
+            edge_index, new_vertex = incident_edges[k], incident_vertices[k]
+            if lengths is None:
+                raise ValueError("No lengths.")
+            new_length = old_length + lengths[edge_index]
+            fact = degrees[old_vertex] - 1
             new_total_degree = total_degree
             if fact > 0:
                 new_total_degree *= fact
-            new_vertices_in_path = set(vertices_in_path)
-            new_vertices_in_path.add(new_vertex)
             if new_total_degree > max_degree:
                 continue
             yield edge_index, old_length, new_length, new_total_degree
             if new_length >= max_length:
                 continue
-            for i in self.neighbourhood_edges(new_vertex):
-                k1, k2 = self.edges[i]
-                if k2 == new_vertex:
-                    k1, k2 = k2, k1
-                if k2 in new_vertices_in_path:
+            new_vertices_in_path = set(vertices_in_path)
+            new_vertices_in_path.add(new_vertex)
+            for kk in range(indptr[new_vertex], indptr[new_vertex+1]):
+                if incident_vertices[kk] in new_vertices_in_path:
                     continue
-                todo.append((new_vertex, i, new_length, new_total_degree, new_vertices_in_path))
+                todo.append((new_vertex, kk, new_length, new_total_degree, new_vertices_in_path))
             
     def partition_by_segments(self):
         """A "segment" is a maximal path `(k1,k2,...,kn)` where the degree of
@@ -665,7 +846,7 @@ class Graph():
         
         :return: Yields segments
         """
-        edges = set(self._edges)
+        edges = set(self.edges)
         def remove(a, b):
             edges.discard((a,b))
             edges.discard((b,a))
@@ -710,13 +891,15 @@ class PlanarGraph(Graph):
     :param edges: An iterable of (unordered) pairs `(key1, key2)`.
     """
     def __init__(self, vertices, edges):
-        verts = dict()
+        keys, xcs, ycs = [], [], []
         for key, x, y in vertices:
-            if key in verts:
-                raise ValueError("Keys of vertices should be unique; but {} is repeated".format(key))
-            verts[key] = (x,y)
-        super().__init__(verts.keys(), edges)
-        self._vertices = verts
+            keys.append(key)
+            xcs.append(x)
+            ycs.append(y)
+        keys, order = _sorted_keys(keys)
+        super().__init__(keys, edges)
+        self._xcoords = _np.asarray(xcs, dtype=_np.float64)[order]
+        self._ycoords = _np.asarray(ycs, dtype=_np.float64)[order]
         quads = self.as_quads().T
         if len(quads) == 0:
             self._lengths = _np.asarray([])
@@ -732,8 +915,9 @@ class PlanarGraph(Graph):
 
         :return: A new instance of :class:`PlanarGraph`.
         """
-        vertices = [(k, *projector(*pt)) for k, pt in self._vertices.items()]
-        return PlanarGraph(vertices, list(self._edges))
+        vertices = [(k, *projector(x, y)) for k, x, y in
+            zip(self._vertex_keys, self._xcoords.tolist(), self._ycoords.tolist())]
+        return PlanarGraph(vertices, self._edge_array())
 
     def dump_bytes(self):
         """Write data to a `bytes` object.  The vertices are saved using the
@@ -780,62 +964,51 @@ class PlanarGraph(Graph):
         with _io.BytesIO(b) as file:
             return _np.load(file)
     
+    def _edge_array(self):
+        """The edges as an array of keys, if possible, otherwise a list."""
+        if self._vertex_key_array is None:
+            return list(self.edges)
+        return self._vertex_key_array[self._edge_ends]
+
     def _to_arrays(self):
-        try:
-            for x in self._vertices.keys():
-                assert x == int(x)
-        except:
+        if self._vertex_key_array is None:
             raise ValueError("Vertex keys need to be integers.")
-        
-        number_vertices = len(self._vertices)
-        keys = _np.empty(number_vertices, dtype=_np.int)
-        xcs = _np.empty(number_vertices)
-        ycs = _np.empty(number_vertices)
-        for i, (key, (x,y)) in enumerate(self._vertices.items()):
-            keys[i] = key
-            xcs[i] = x
-            ycs[i] = y
-
-        edges = _np.asarray(self._edges, dtype=_np.int)
-        assert edges.shape == (len(self._edges), 2)
-
-        return keys, xcs, ycs, edges
+        keys = self._vertex_key_array
+        edges = keys[self._edge_ends]
+        assert edges.shape == (self.number_edges, 2)
+        return keys, self._xcoords, self._ycoords, edges
             
     @property
     def vertices(self):
         """A dictionary (do not mutate!) from `key` to planar coordinates
         `(x,y)`.
         """
-        return self._vertices
+        if not hasattr(self, "_vertices_cache"):
+            self._vertices_cache = dict(zip(self._vertex_keys,
+                zip(self._xcoords.tolist(), self._ycoords.tolist())))
+        return self._vertices_cache
 
     @property
     def bounds(self):
         """A bounding box of vertex locations, as `(xmin, ymin, xmax, ymax)`"""
-        xcs = [x for x, _ in self._vertices.values()]
-        ycs = [y for _, y in self._vertices.values()]
-        return min(xcs), min(ycs), max(xcs), max(ycs)
+        if len(self._xcoords) == 0:
+            raise ValueError("No vertices.")
+        return (self._xcoords.min(), self._ycoords.min(),
+            self._xcoords.max(), self._ycoords.max())
 
     def as_quads(self):
         """Returns a numpy array of shape `(N,4)` where `N` is the number of
         edges in the graph.  Each entry is `(x1,y1,x2,y1)` giving the
         coordinates of the "start" and "end" of the edge."""
-        out = []
-        for k1, k2 in self._edges:
-            x1, y1 = self._vertices[k1]
-            x2, y2 = self._vertices[k2]
-            out.append((x1,y1,x2,y2))
-        return _np.asarray(out)
+        v1, v2 = self._edge_ends[:,0], self._edge_ends[:,1]
+        return _np.stack([self._xcoords[v1], self._ycoords[v1],
+            self._xcoords[v2], self._ycoords[v2]], axis=1)
     
     def as_lines(self):
         """Returns a list of "lines" where each "line" has the format
         `[(x1,y1), (x2,y2)]`.  Suitable for passing into a
         :class:`matplotlib.collections.LineCollection` for example."""
-        out = []
-        for k1, k2 in self._edges:
-            x1, y1 = self._vertices[k1]
-            x2, y2 = self._vertices[k2]
-            out.append(((x1,y1),(x2,y2)))
-        return out
+        return [((x1,y1),(x2,y2)) for x1, y1, x2, y2 in self.as_quads().tolist()]
 
     def edge_to_coords(self, key1, key2, t):
         """Return the coordinate of the point which is `t` distant along
@@ -847,8 +1020,9 @@ class PlanarGraph(Graph):
         
         :return: `(x,y)`
         """
-        xs, ys = self._vertices[key1]
-        xe, ye = self._vertices[key2]
+        v1, v2 = self._vertex_index[key1], self._vertex_index[key2]
+        xs, ys = self._xcoords[v1], self._ycoords[v1]
+        xe, ye = self._xcoords[v2], self._ycoords[v2]
         return (xs * (1-t) + xe * t, ys * (1-t) + ye * t)
 
     def project_point_to_graph(self, x, y):
@@ -865,10 +1039,26 @@ class PlanarGraph(Graph):
           and `0 <= t <= 1` is the distance from the node `key1` to the node
           `key2` where the point is projected.
         """
+        index, t = self._point_projector().project_point(x, y)
+        return self.edges[index], t
+
+    def _point_projector(self):
         if not hasattr(self, "_projector"):
             self._projector = PointProjector(self.as_quads())
-        index, t = self._projector.project_point(x, y)
-        return self._edges[index], t
+        return self._projector
+
+    def project_points_to_graph(self, xcoords, ycoords):
+        """Projects many points to their nearest edges in the graph, as
+        :meth:`project_point_to_graph`, using array operations.
+
+        :param xcoords: Array of x coordinates of the points.
+        :param ycoords: Array of y coordinates of the points.
+
+        :return: `(edges, ts)` arrays where `edges` gives the indices into
+          :attr:`edges` and `0 <= t <= 1` is the distance from the first
+          vertex of the edge to the second where the point is projected.
+        """
+        return self._point_projector().project_points(xcoords, ycoords)
 
 
 try:
@@ -878,17 +1068,31 @@ except:
     _rtree = None
     
 class PointProjector():
+    """Projects points to the nearest of a collection of line segments.
+
+    :param quads: Array of shape `(N,4)` of line segments `(x1,y1,x2,y2)`.
+    """
     def __init__(self, quads):
         self._quads = _np.asarray(quads)
+        self._idx = None
+        self._grid = None
+
+    def project_point(self, x, y):
+        """Find the segment closest to the point.  If installed, `rtree` will
+        be used to accelerate the search.
+
+        :return: `(index, t)` where `index` is the index of the segment, and
+          `0 <= t <= 1` is the distance along the segment.
+        """
         if _rtree is None:
-            self.project_point = self._project_point
-        else:
+            return self._project_point(x, y)
+        if self._idx is None:
             def gen():
                 for i, line in enumerate(self._quads):
                     bds = self._bounds(*line)
                     yield i, bds, None
             self._idx = _rtree.index.Index(gen())
-            self.project_point = self._project_point_rtree
+        return self._project_point_rtree(x, y)
 
     @staticmethod
     def _bounds(x1, y1, x2, y2):
@@ -929,6 +1133,161 @@ class PointProjector():
                     return indices[index], t
             h += h
 
+    #: Maximum number of points to project at once in :meth:`project_points`.
+    _points_per_batch = 10000
+
+    def _make_grid(self):
+        """Bucket the segments into a uniform grid of square cells.  Each
+        segment is placed in every cell which its bounding box meets."""
+        quads = self._quads
+        if len(quads) == 0:
+            raise ValueError("No segments to project to.")
+        x0, x1 = _np.minimum(quads[:,0], quads[:,2]), _np.maximum(quads[:,0], quads[:,2])
+        y0, y1 = _np.minimum(quads[:,1], quads[:,3]), _np.maximum(quads[:,1], quads[:,3])
+        xmin, ymin = x0.min(), y0.min()
+        width, height = x1.max() - xmin, y1.max() - ymin
+        size = max(_np.mean(_np.maximum(x1 - x0, y1 - y0)),
+            _np.sqrt(width * height / (4 * len(quads))))
+        if not size > 0:
+            size = max(width, height, 1.0)
+        nx, ny = int(width // size) + 1, int(height // size) + 1
+        cx0 = _np.minimum(((x0 - xmin) // size).astype(_np.int64), nx - 1)
+        cx1 = _np.minimum(((x1 - xmin) // size).astype(_np.int64), nx - 1)
+        cy0 = _np.minimum(((y0 - ymin) // size).astype(_np.int64), ny - 1)
+        cy1 = _np.minimum(((y1 - ymin) // size).astype(_np.int64), ny - 1)
+        widths = cx1 - cx0 + 1
+        counts = widths * (cy1 - cy0 + 1)
+        segments = _np.repeat(_np.arange(len(quads)), counts)
+        within = _np.arange(len(segments)) - _np.repeat(_np.cumsum(counts) - counts, counts)
+        cells = ((cy0[segments] + within // widths[segments]) * nx
+            + cx0[segments] + within % widths[segments])
+        order = _np.argsort(cells, kind="stable")
+        indptr = _np.searchsorted(cells[order], _np.arange(nx * ny + 1))
+        self._grid = (xmin, ymin, size, nx, ny, indptr, segments[order])
+
+    @staticmethod
+    def _ring_cells(cx, cy, radii, nx, ny):
+        """For each cell `(cx, cy)` and radius `r`, the cells of the grid on
+        the boundary of the square of cells `[cx-r,cx+r] x [cy-r,cy+r]`.  Each
+        side of the square is clipped to the grid before being expanded, so
+        the work done is bounded by the size of the grid, and not by `r`.
+
+        :return: `(owner, cells)` where `owner` indexes into `radii` and
+          `cells` are (row-major) indices into the grid.
+        """
+        r = radii
+        zero = _np.zeros_like(r)
+        # The sides: bottom and top rows, then left and right columns
+        fixed = _np.concatenate([cy - r, cy + r, cx - r, cx + r])
+        fixed_limit = _np.concatenate([[ny] * 2, [nx] * 2]).repeat(len(r))
+        centre = _np.concatenate([cx, cx, cy, cy])
+        reach = _np.concatenate([r, r, r - 1, r - 1])
+        limit = _np.concatenate([[nx] * 2, [ny] * 2]).repeat(len(r))
+        low = _np.maximum(centre - reach, 0)
+        high = _np.minimum(centre + reach, limit - 1)
+        counts = _np.maximum(high - low + 1, 0)
+        counts[(fixed < 0) | (fixed >= fixed_limit)] = 0
+        # For radius 0 there is just one cell
+        counts[len(r):] = _np.where(_np.concatenate([r, r, r]) == 0, 0, counts[len(r):])
+        owner = _np.tile(_np.arange(len(r)), 4)
+        is_row = _np.arange(4 * len(r)) < 2 * len(r)
+        side = _np.repeat(_np.arange(4 * len(r)), counts)
+        along = (_np.arange(len(side)) - _np.repeat(_np.cumsum(counts) - counts, counts)
+            + low[side])
+        cells = _np.where(is_row[side], fixed[side] * nx + along, along * nx + fixed[side])
+        return owner[side], cells
+
+    def _unsearched_distsq(self, px, py, cx, cy, r):
+        """A lower bound for the squared distance from each point to any
+        cell of the grid outside the square of cells of radius `r` about
+        `(cx, cy)`.  Is infinite if there are no such cells."""
+        xmin, ymin, size, nx, ny, _, _ = self._grid
+        inf = _np.inf
+        # Distance to the range of the grid in each direction
+        gapx = _np.maximum(0, _np.maximum(xmin - px, px - (xmin + nx * size)))
+        gapy = _np.maximum(0, _np.maximum(ymin - py, py - (ymin + ny * size)))
+        right = _np.maximum(0, xmin + (cx + r + 1) * size - px)
+        left = _np.maximum(0, px - (xmin + (cx - r) * size))
+        top = _np.maximum(0, ymin + (cy + r + 1) * size - py)
+        bottom = _np.maximum(0, py - (ymin + (cy - r) * size))
+        return _np.min([
+            _np.where(cx + r + 1 <= nx - 1, right**2 + gapy**2, inf),
+            _np.where(cx - r - 1 >= 0, left**2 + gapy**2, inf),
+            _np.where(cy + r + 1 <= ny - 1, top**2 + gapx**2, inf),
+            _np.where(cy - r - 1 >= 0, bottom**2 + gapx**2, inf)], axis=0)
+
+    def _project_batch(self, px, py):
+        xmin, ymin, size, nx, ny, indptr, grid_segments = self._grid
+        cx = _np.floor((px - xmin) / size).astype(_np.int64)
+        cy = _np.floor((py - ymin) / size).astype(_np.int64)
+        # Start with the first ring of cells which meets the grid
+        radii = _np.max([-cx, cx - (nx - 1), -cy, cy - (ny - 1),
+            _np.zeros_like(cx)], axis=0)
+        best_distsq = _np.full(len(px), _np.inf)
+        best_index = _np.full(len(px), len(self._quads), dtype=_np.int64)
+        best_t = _np.zeros(len(px))
+        active = _np.arange(len(px))
+        while len(active) > 0:
+            owner, cells = self._ring_cells(cx[active], cy[active], radii[active], nx, ny)
+            points = active[owner]
+            counts = indptr[cells + 1] - indptr[cells]
+            points = _np.repeat(points, counts)
+            within = _np.arange(len(points)) - _np.repeat(_np.cumsum(counts) - counts, counts)
+            segments = grid_segments[_np.repeat(indptr[cells], counts) + within]
+
+            # As `_project_point`
+            lines = self._quads[segments].T
+            vx, vy = lines[2] - lines[0], lines[3] - lines[1]
+            wx, wy = px[points] - lines[0], py[points] - lines[1]
+            norm = vx * vx + vy * vy
+            t = _np.zeros(len(points))
+            _np.divide(wx * vx + wy * vy, norm, out=t, where=(norm > 0))
+            t[t < 0] = 0
+            t[t > 1] = 1
+            distsq = (px[points] - (lines[0] + t * vx))**2 + (py[points] - (lines[1] + t * vy))**2
+
+            # Best candidate for each point, breaking ties by segment index
+            order = _np.lexsort((segments, distsq, points))
+            first = _np.ones(len(order), dtype=bool)
+            first[1:] = points[order[1:]] != points[order[:-1]]
+            order = order[first]
+            p, d, i = points[order], distsq[order], segments[order]
+            better = (d < best_distsq[p]) | ((d == best_distsq[p]) & (i < best_index[p]))
+            p, d, i = p[better], d[better], i[better]
+            best_distsq[p], best_index[p], best_t[p] = d, i, t[order][better]
+
+            # A point is done if the nearest segment is no further away than
+            # any unsearched cell (which is always so once we have searched
+            # the whole grid).
+            bound = self._unsearched_distsq(px[active], py[active], cx[active],
+                cy[active], radii[active])
+            done = best_distsq[active] <= bound
+            radii[active] += 1
+            active = active[~done]
+        return best_index, best_t
+
+    def project_points(self, xcoords, ycoords):
+        """Project many points at once to their closest segments.  Uses a
+        uniform grid of "buckets" of segments, searching outwards from the
+        bucket containing each point, and does not require `rtree`.
+
+        :param xcoords: Array of x coordinates of the points.
+        :param ycoords: Array of y coordinates of the points.
+
+        :return: `(indices, ts)` arrays where `indices` are the indices of the
+          segments, and `0 <= t <= 1` is the distance along each segment.
+        """
+        xcoords = _np.asarray(xcoords, dtype=_np.float64)
+        ycoords = _np.asarray(ycoords, dtype=_np.float64)
+        if self._grid is None:
+            self._make_grid()
+        indices = _np.empty(len(xcoords), dtype=_np.int64)
+        ts = _np.empty(len(xcoords))
+        for start in range(0, len(xcoords), self._points_per_batch):
+            batch = slice(start, start + self._points_per_batch)
+            indices[batch], ts[batch] = self._project_batch(xcoords[batch], ycoords[batch])
+        return indices, ts
+
 
 class TimedNetworkPoints(_data.TimeStamps):
     """A variant of :class:`Data.TimedPoints` where each event has a location
@@ -962,10 +1321,31 @@ class TimedNetworkPoints(_data.TimeStamps):
         :param timed_points: Instance of :class:`data.TimedPoints`
         :param graph: Instance of :class:`PlanarGraph`
         """
-        def projector():
-            for x, y in zip(timed_points.xcoords, timed_points.ycoords):
-                yield graph.project_point_to_graph(x, y)
-        return TimedNetworkPoints(timed_points.timestamps, projector())
+        edges, ts = graph.project_points_to_graph(timed_points.xcoords, timed_points.ycoords)
+        start_keys, end_keys = graph._edge_keys(edges)
+        return TimedNetworkPoints.from_arrays(timed_points.timestamps,
+            start_keys, end_keys, ts)
+
+    @staticmethod
+    def from_arrays(timestamps, start_keys, end_keys, distances):
+        """Construct a new instance directly from arrays.
+
+        :param timestamps: An array of timestamps (must be convertible to
+          :class:`numpy.datetime64`).
+        :param start_keys: Array of the first vertices of the edges.
+        :param end_keys: Array of the second vertices of the edges.
+        :param distances: Array of the distances along each edge.
+        """
+        points = TimedNetworkPoints([], [])
+        points._assert_times_ordered(timestamps)
+        points._timestamps = _np.array(timestamps, dtype="datetime64[ms]")
+        points._start_keys = _np.asarray(start_keys)
+        points._end_keys = _np.asarray(end_keys)
+        points._distances = _np.asarray(distances, dtype=_np.float64)
+        if not (len(points._timestamps) == len(points._start_keys) ==
+                len(points._end_keys) == len(points._distances)):
+            raise ValueError("Number of locations should match the number of timestamps")
+        return points
 
     @property
     def distances(self):
@@ -982,9 +1362,21 @@ class TimedNetworkPoints(_data.TimeStamps):
         """List of vertices which form the end of the edges"""
         return self._end_keys
 
+    @staticmethod
+    def _view(timestamps, start_keys, end_keys, distances):
+        points = TimedNetworkPoints.__new__(TimedNetworkPoints)
+        points._timestamps = timestamps
+        points._start_keys = start_keys
+        points._end_keys = end_keys
+        points._distances = distances
+        return points
+
     def __getitem__(self, index):
         if isinstance(index, int):
             return [self.timestamps[index], self.start_keys[index], self.end_keys[index], self.distances[index]]
+        if isinstance(index, slice) and (index.step is None or index.step > 0):
+            return self._view(self.timestamps[index], self.start_keys[index],
+                self.end_keys[index], self.distances[index])
         # Assume slice-like object
         data = list(zip(self.timestamps[index], self.start_keys[index],
                 self.end_keys[index], self.distances[index]))
@@ -1093,10 +1485,58 @@ def to_derived_graph(graph, use_edge_indicies=False):
         builder.lengths = lengths
     return builder.build()
 
-def shortest_paths(graph, vertex_key):
+def _dijkstra(graph, sources, initial_lengths, max_length=None):
+    """Dijkstra's algorithm using a binary heap, over the array based
+    adjacency list of the graph.  Only visited vertices are stored, so with
+    a small `max_length`, the cost is proportional to the size of the
+    neighbourhood explored, and not the size of the graph.
+
+    :param graph: Instance of :class:`Graph`
+    :param sources: Indices of the starting vertices
+    :param initial_lengths: The initial distance to each starting vertex.
+    :param max_length: If not `None`, do not visit vertices further than this.
+
+    :return: `(lengths, prevs, order)` where `lengths` is a dictionary from
+      vertex index to length, `prevs` is a dictionary from vertex index to
+      the previous vertex (or itself, for a starting vertex) and `order` is a
+      list of the vertices reached, in the order they were visited.
+    """
+    indptr, neighbours, _, edge_lengths, _ = graph._adjacency_lists()
+    if max_length is None:
+        max_length = float("inf")
+    lengths, prevs, done = dict(), dict(), set()
+    heap = []
+    for v, length in zip(sources, initial_lengths):
+        if v not in lengths or length < lengths[v]:
+            lengths[v] = length
+            prevs[v] = v
+            heap.append((length, v))
+    _heapq.heapify(heap)
+    order = []
+    while len(heap) > 0:
+        length, u = _heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        order.append(u)
+        for k in range(indptr[u], indptr[u+1]):
+            v = neighbours[k]
+            if v in done:
+                continue
+            new_length = length + edge_lengths[k]
+            if new_length <= max_length and (v not in lengths or new_length < lengths[v]):
+                lengths[v] = new_length
+                prevs[v] = u
+                _heapq.heappush(heap, (new_length, v))
+    return lengths, prevs, order
+
+def shortest_paths(graph, vertex_key, max_length=None):
     """Uses Dijkstra's algorithm to find the shortest path from
     `vertex_key` to all other vertices.  If we have no lengths, then each
     edge has length 1.
+
+    :param max_length: If not `None`, then only search for paths of at most
+      this length.  Vertices further away are treated as not connected.
     
     :return: `(lengths, prevs)` where `lengths` is a dictionary from key
         to length.  A length of -1 means that the vertex is not connected to
@@ -1105,46 +1545,29 @@ def shortest_paths(graph, vertex_key):
         vertex.  Working backwards, you can hence construct all shortest
         paths.
     """
+    keys = graph._vertex_keys
+    start = graph._vertex_index[vertex_key]
+    lengths, prevs, order = _dijkstra(graph, [start], [0], max_length)
     shortest_length = { k : -1 for k in graph.vertices }
-    shortest_length[vertex_key] = 0
-    candidates = {vertex_key}
-    done = set()
-    prevs = {vertex_key:vertex_key}
-    while len(candidates) > 0:
-        next_vertex, min_dist = None, -1
-        for v in candidates:
-            dist = shortest_length[v]
-            if min_dist == -1 or dist < min_dist:
-                min_dist = dist
-                next_vertex = v
-        candidates.discard(next_vertex)
-        done.add(next_vertex)
-
-        for v in graph.neighbours(next_vertex):
-            edge_index, _ = graph.find_edge(next_vertex, v)
-            dist = min_dist + graph.length(edge_index)
-            current_dist = shortest_length[v]
-            if current_dist == -1 or current_dist > dist:
-                shortest_length[v] = dist
-                prevs[v] = next_vertex
-            if v not in done:
-                candidates.add(v)
-
-    return shortest_length, prevs
-
-def shortest_edge_paths(graph, edge_index, position=0.5):
+    for v in order:
+        shortest_length[keys[v]] = lengths[v]
+    return shortest_length, {keys[v] : keys[prevs[v]] for v in order}
+
+def shortest_edge_paths(graph, edge_index, position=0.5, max_length=None):
     """Find the shortest path from the edge given
     by `edge_index`.  If we have no lengths, then each edge has length 1.
     This could be achieved by using the "derived graph", but our use will also
     require knowing the _vertex_ degree of the path.
 
     We use a simple modification of Dijkstra's algorithm whereby the initial
-    distance to 
+    distance to each end of the starting edge is set from `position`.
     
     :param graph: :class:`Graph` to use
     :param edge_index: The edge to start on
     :param position: `0 <= t <= 1` along the edge to start at.  Defaults
       to the midpoint.
+    :param max_length: If not `None`, then only search for paths of at most
+      this length.
 
     :return: `(lengths, prevs)` where `lengths` is a dictionary from key
         to length.  If a key is not present, it means that vertex is not
@@ -1154,93 +1577,213 @@ def shortest_edge_paths(graph, edge_index, position=0.5):
         construct all shortest paths.  These paths will end at either vertex
         of the initial edge.
     """
-    shortest_length = dict()
-    v1, v2 = graph.edges[edge_index]
-    shortest_length[v1] = graph.length(edge_index) * position
-    shortest_length[v2] = graph.length(edge_index) * (1 - position)
-    candidates = {v1, v2}
-    done = set()
-    prevs = {v1:v1, v2:v2}
-    while len(candidates) > 0:
-        next_vertex, min_dist = None, -1
-        for v in candidates:
-            dist = shortest_length[v]
-            if min_dist == -1 or dist < min_dist:
-                min_dist = dist
-                next_vertex = v
-        candidates.discard(next_vertex)
-        done.add(next_vertex)
-
-        for v in graph.neighbours(next_vertex):
-            edge_index, _ = graph.find_edge(next_vertex, v)
-            dist = min_dist + graph.length(edge_index)
-            if v not in shortest_length or shortest_length[v] > dist:
-                shortest_length[v] = dist
-                prevs[v] = next_vertex
-            if v not in done:
-                candidates.add(v)
-
-    return shortest_length, prevs
-
-def shortest_edge_paths_with_degrees(graph, edge_index):
+    keys = graph._vertex_keys
+    v1, v2 = graph._edge_ends[edge_index].tolist()
+    length = graph._edge_lengths()[edge_index]
+    lengths, prevs, order = _dijkstra(graph, [v1, v2],
+        [length * position, length * (1 - position)], max_length)
+    shortest_length = {keys[v] : lengths[v] for v in order}
+    return shortest_length, {keys[v] : keys[prevs[v]] for v in order}
+
+def _bounded_edge_paths_with_degrees(graph, edge_index, max_length=None):
+    """Sparse version of :func:`shortest_edge_paths_with_degrees`.
+
+    :return: `(edges, distances, degrees)` arrays, for each edge which is
+      connected to the starting edge (by a path of length at most
+      `max_length` to one of its vertices), sorted by edge index.
+    """
+    indptr, _, adjacency_edges, _, factors = graph._adjacency_lists()
+    edge_lengths = graph._edge_lengths()
+    v1, v2 = graph._edge_ends[edge_index].tolist()
+    half = edge_lengths[edge_index] * 0.5
+    lengths, prevs, order = _dijkstra(graph, [v1, v2], [half, half], max_length)
+
+    degrees = dict()
+    edges = set()
+    for v in order:
+        p = prevs[v]
+        degrees[v] = factors[v] if p == v else degrees[p] * factors[v]
+        edges.update(adjacency_edges[indptr[v]:indptr[v+1]])
+    edges = _np.asarray(sorted(edges), dtype=_np.int64)
+
+    inf = float("inf")
+    ends = graph._edge_ends[edges]
+    le1 = _np.asarray([lengths.get(v, inf) for v in ends[:,0].tolist()])
+    le2 = _np.asarray([lengths.get(v, inf) for v in ends[:,1].tolist()])
+    use_first = le1 < le2
+    distances = _np.where(use_first, le1, le2) + edge_lengths[edges] * 0.5
+    nearest = _np.where(use_first, ends[:,0], ends[:,1])
+    cum_degrees = _np.asarray([degrees[v] for v in nearest.tolist()], dtype=_np.float64)
+    mask = (edges == edge_index)
+    distances[mask] = 0
+    cum_degrees[mask] = 1
+    return edges, distances, cum_degrees
+
+def shortest_edge_paths_with_degrees(graph, edge_index, max_length=None):
     """Find the shortest paths between the middle of the `edge_index` to each
     other edge.  Also computes the "cumulative degree" of each path: that is,
     the product of `max(1, degree - 1)` over each vertex in the path.
 
+    :param max_length: If not `None`, then only search for paths to vertices
+      of at most this length.  Edges neither of whose vertices are reached
+      are treated as disconnected.
+
     :return: `(distances, degrees)` where `distances` is an array corresponding
       to `graph.edges`, as is `degrees`.  Edges which are disconnected from
       `edge_index` will have `degress == 1` and `distances == -1`.
     """
-    shortest_length = dict()
-    v1, v2 = graph.edges[edge_index]
-    shortest_length[v1] = graph.length(edge_index) * 0.5
-    shortest_length[v2] = shortest_length[v1]
-    candidates = {v1, v2}
-    done = set()
-    degrees = dict()
-    degrees[v1] = max(1, graph.degree(v1) - 1)
-    degrees[v2] = max(1, graph.degree(v2) - 1)
-    while len(candidates) > 0:
-        next_vertex, min_dist = None, -1
-        for v in candidates:
-            dist = shortest_length[v]
-            if min_dist == -1 or dist < min_dist:
-                min_dist = dist
-                next_vertex = v
-        candidates.discard(next_vertex)
-        done.add(next_vertex)
-
-        for v in graph.neighbours(next_vertex):
-            i, _ = graph.find_edge(next_vertex, v)
-            dist = min_dist + graph.length(i)
-            if v not in shortest_length or shortest_length[v] > dist:
-                shortest_length[v] = dist
-                degrees[v] = degrees[next_vertex] * max(1, graph.degree(v) - 1)
-            if v not in done:
-                candidates.add(v)
-
-    distances = _np.empty(graph.number_edges)
-    cum_degrees = _np.empty(graph.number_edges)
-    for i in range(graph.number_edges):
-        if i == edge_index:
-            distances[i] = 0
-            cum_degrees[i] = 1
-            continue
-        k1, k2 = graph.edges[i]
-        le = graph.length(i) * 0.5
-        if k1 not in shortest_length:
-            distances[i] = -1
-            cum_degrees[i] = 1
-            continue
-        le1, le2 = shortest_length[k1], shortest_length[k2]
-        if le1 < le2:
-            distances[i] = le1 + le
-            cum_degrees[i] = degrees[k1]
+    edges, dists, degs = _bounded_edge_paths_with_degrees(graph, edge_index, max_length)
+    distances = _np.zeros(graph.number_edges) - 1
+    degrees = _np.ones(graph.number_edges)
+    distances[edges] = dists
+    degrees[edges] = degs
+    return distances, degrees
+
+
+class BoundedDistances():
+    """A table of the output of :func:`shortest_edge_paths_with_degrees`
+    for every edge in a graph, restricted to paths of length at most
+    `max_length`.  Stored in "compressed sparse row" format, and can be
+    saved to a file, and then reloaded using memory mapping, so that
+    the (slow) computation can be shared between runs and processes.
+
+    Use :meth:`build` to construct.
+
+    :param indptr: Array of shape `(E+1,)`; the data for edge `i` is in
+      the slice `indptr[i]:indptr[i+1]` of the other arrays.
+    :param edges: Array of edge indices.
+    :param distances: Array of distances.
+    :param degrees: Array of cumulative degrees.
+    :param max_length: The maximum length used in the calculation.
+    """
+    def __init__(self, indptr, edges, distances, degrees, max_length):
+        self._indptr = indptr
+        self._edges = edges
+        self._distances = distances
+        self._degrees = degrees
+        self._max_length = max_length
+
+    @staticmethod
+    def build(graph, max_length):
+        """Compute the table for all edges in the graph.
+
+        :param graph: Instance of :class:`Graph`
+        :param max_length: Only search for paths of at most this length.
+        """
+        indptr = [0]
+        all_edges, all_distances, all_degrees = [], [], []
+        for edge_index in range(graph.number_edges):
+            edges, distances, degrees = _bounded_edge_paths_with_degrees(
+                graph, edge_index, max_length)
+            all_edges.append(edges)
+            all_distances.append(distances)
+            all_degrees.append(degrees)
+            indptr.append(indptr[-1] + len(edges))
+        def concat(arrays, dtype):
+            if len(arrays) == 0:
+                return _np.empty(0, dtype=dtype)
+            return _np.concatenate(arrays).astype(dtype)
+        return BoundedDistances(_np.asarray(indptr, dtype=_np.int64),
+            concat(all_edges, _np.int64), concat(all_distances, _np.float64),
+            concat(all_degrees, _np.float64), max_length)
+
+    @property
+    def max_length(self):
+        """The maximum path length used in the calculation."""
+        return self._max_length
+
+    @property
+    def number_edges(self):
+        """The number of edges in the graph the table was computed for."""
+        return len(self._indptr) - 1
+
+    def __getitem__(self, edge_index):
+        """Return `(edges, distances, degrees)` for the given starting edge,
+        as arrays."""
+        start, end = self._indptr[edge_index], self._indptr[edge_index + 1]
+        return (self._edges[start:end], self._distances[start:end],
+            self._degrees[start:end])
+
+    def to_dense(self, edge_index):
+        """Return `(distances, degrees)` in the same format as
+        :func:`shortest_edge_paths_with_degrees`."""
+        edges, dists, degs = self[edge_index]
+        distances = _np.zeros(self.number_edges) - 1
+        degrees = _np.ones(self.number_edges)
+        distances[edges] = dists
+        degrees[edges] = degs
+        return distances, degrees
+
+    def save(self, filename):
+        """Save the table to a (binary) file which can be memory mapped
+        when loaded."""
+        _save_arrays(filename, {"max_length" : self._max_length},
+            [("indptr", self._indptr), ("edges", self._edges),
+            ("distances", self._distances), ("degrees", self._degrees)])
+
+    @staticmethod
+    def load(filename, mmap=True):
+        """Load from a file written by :meth:`save`.
+
+        :param mmap: If `True` (the default), memory map the arrays, so
+          nothing is read from disc until it is needed, and the operating
+          system can share the memory between processes.
+        """
+        meta, arrays = _load_arrays(filename, mmap)
+        return BoundedDistances(arrays["indptr"], arrays["edges"],
+            arrays["distances"], arrays["degrees"], meta["max_length"])
+
+
+_ARRAYS_MAGIC = b"OPENCPARRAYS1\n"
+_ARRAYS_ALIGNMENT = 64
+
+def _save_arrays(filename, meta, arrays):
+    """Save a list of pairs `(name, array)` of one dimensional arrays, with
+    a JSON header, so that each array starts on an aligned boundary."""
+    alignment = _ARRAYS_ALIGNMENT
+    header = {"meta" : meta, "arrays" : []}
+    offset = 0
+    for name, array in arrays:
+        array = _np.ascontiguousarray(array)
+        header["arrays"].append({"name" : name, "dtype" : array.dtype.str,
+            "length" : len(array), "offset" : offset})
+        offset += -(-array.nbytes // alignment) * alignment
+    header = _json.dumps(header).encode("UTF8") + b"\n"
+    start = len(_ARRAYS_MAGIC) + len(header)
+    start = -(-start // alignment) * alignment
+    with open(filename, "wb") as file:
+        file.write(_ARRAYS_MAGIC)
+        file.write(header)
+        for entry, (name, array) in zip(_json.loads(header)["arrays"], arrays):
+            file.write(b"\0" * (start + entry["offset"] - file.tell()))
+            file.write(_np.ascontiguousarray(array).tobytes())
+
+def _load_arrays(filename, mmap=True):
+    """Load arrays saved by :func:`_save_arrays`.
+
+    :return: `(meta, arrays)` where `arrays` is a dictionary from name to
+      array.
+    """
+    with open(filename, "rb") as file:
+        if file.readline() != _ARRAYS_MAGIC:
+            raise ValueError("File {} is not in the expected format".format(filename))
+        header = _json.loads(file.readline().decode("UTF8"))
+        start = file.tell()
+    alignment = _ARRAYS_ALIGNMENT
+    start = -(-start // alignment) * alignment
+    arrays = dict()
+    for entry in header["arrays"]:
+        dtype = _np.dtype(entry["dtype"])
+        if entry["length"] == 0:
+            arrays[entry["name"]] = _np.empty(0, dtype=dtype)
+        elif mmap:
+            arrays[entry["name"]] = _np.memmap(filename, dtype=dtype, mode="r",
+                offset=start + entry["offset"], shape=(entry["length"],))
         else:
-            target = k2
-            distances[i] = le2 + le
-            cum_degrees[i] = degrees[k2]
-    return distances, cum_degrees
+            with open(filename, "rb") as file:
+                file.seek(start + entry["offset"])
+                arrays[entry["name"]] = _np.fromfile(file, dtype=dtype, count=entry["length"])
+    return header["meta"], arrays
 
 def segment_graph(graph):
     """Partition the edges of a graph into "segments", where a segment is a
@@ -18,7 +18,8 @@ from . import network
 from . import logger as _logger_mod
 import math as _math
 import numpy as _np
-from scipy import ndimage as _ndimage
+import collections as _collections
+import hashlib as _hashlib
 import logging as _logging
 import datetime as _datetime
 
@@ -189,6 +190,195 @@ class TriangleKernel(NetworkKernel):
         return "TriangleKernel({})".format(self._h)
 
 
+def _graph_fingerprint(graph):
+    """A cheap hash of the edges, and their lengths, of the graph, so that a
+    saved cache is only used with the graph it was computed for."""
+    sha = _hashlib.sha1()
+    sha.update(_np.ascontiguousarray(graph._edge_ends, dtype=_np.int64).tobytes())
+    sha.update(_np.ascontiguousarray(graph.lengths, dtype=_np.float64).tobytes())
+    return sha.hexdigest()
+
+
+class ArrayCache():
+    """A cache, keyed by tuples, whose values are tuples of one dimensional
+    arrays.  The total size of the arrays held in memory can be
+    bounded, in which case the least recently used entries are discarded to
+    make room for new ones.
+
+    The cache can be saved to a (binary) file, and then reloaded using
+    memory mapping, so that a precomputed cache can be shared between runs
+    and processes.  Entries loaded in this way do not count against the
+    memory budget, and are never discarded.
+
+    :param max_bytes: The maximum total number of bytes of the arrays to
+      hold, or `None` to not bound the size of the cache.
+    """
+    def __init__(self, max_bytes=None):
+        self._max_bytes = max_bytes
+        self._entries = _collections.OrderedDict()
+        self._nbytes = 0
+        self._loaded = dict()
+        self._loaded_indptr = None
+        self._loaded_columns = []
+
+    @property
+    def max_bytes(self):
+        """The maximum total size, in bytes, of the arrays held in memory, or
+        `None`."""
+        return self._max_bytes
+
+    @property
+    def nbytes(self):
+        """The total size, in bytes, of the arrays held in memory."""
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._entries) + sum(1 for key in self._loaded
+            if key not in self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries or key in self._loaded
+
+    def __getitem__(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        index = self._loaded[key]
+        start, end = self._loaded_indptr[index], self._loaded_indptr[index + 1]
+        return tuple(column[start:end] for column in self._loaded_columns)
+
+    def __setitem__(self, key, arrays):
+        arrays = tuple(_np.asarray(a) for a in arrays)
+        if key in self._entries:
+            self._remove(key)
+        size = sum(a.nbytes for a in arrays)
+        if self._max_bytes is not None:
+            if size > self._max_bytes:
+                return
+            while self._nbytes + size > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+        self._entries[key] = arrays
+        self._nbytes += size
+
+    def _remove(self, key):
+        arrays = self._entries.pop(key)
+        self._nbytes -= sum(a.nbytes for a in arrays)
+
+    def clear(self):
+        """Remove all entries, including any loaded from a file."""
+        self._entries.clear()
+        self._nbytes = 0
+        self._loaded = dict()
+        self._loaded_indptr = None
+        self._loaded_columns = []
+
+    def keys(self):
+        """List of the keys, including those loaded from a file."""
+        return list(self._entries) + [key for key in self._loaded
+            if key not in self._entries]
+
+    def save(self, filename, meta=None):
+        """Save all entries (including those loaded from a file) to a
+        (binary) file which can be memory mapped when loaded.  The keys must
+        all be tuples of integers, of the same length.
+
+        :param meta: Optional dictionary of extra data (which must be
+          serialisable to JSON) to save.
+        """
+        keys = self.keys()
+        entries = [self[key] for key in keys]
+        width = len(keys[0]) if len(keys) > 0 else 0
+        indptr = _np.zeros(len(keys) + 1, dtype=_np.int64)
+        indptr[1:] = _np.cumsum([len(arrays[0]) for arrays in entries])
+        arrays = [("keys", _np.asarray(keys, dtype=_np.int64).reshape(-1)),
+            ("indptr", indptr)]
+        if len(entries) > 0:
+            for i, column in enumerate(zip(*entries)):
+                arrays.append(("column{}".format(i), _np.concatenate(column)))
+        meta = dict() if meta is None else dict(meta)
+        meta["key_width"] = width
+        network._save_arrays(filename, meta, arrays)
+
+    def load(self, filename, mmap=True):
+        """Replace any entries previously loaded from a file with those from
+        a file written by :meth:`save`.  Entries already held in memory are
+        kept, and take precedence.
+
+        :param mmap: If `True` (the default), memory map the arrays, so
+          nothing is read from disc until it is needed, and the operating
+          system can share the memory between processes.
+
+        :return: The dictionary `meta` passed to :meth:`save`.
+        """
+        meta, arrays = network._load_arrays(filename, mmap)
+        width = meta.pop("key_width")
+        keys = arrays["keys"].tolist()
+        keys = [tuple(keys[i:i+width]) for i in range(0, len(keys), max(width, 1))]
+        self._loaded = {key : i for i, key in enumerate(keys)}
+        self._loaded_indptr = arrays["indptr"]
+        self._loaded_columns = []
+        while "column{}".format(len(self._loaded_columns)) in arrays:
+            self._loaded_columns.append(arrays["column{}".format(len(self._loaded_columns))])
+        return meta
+
+
+class _WalkTable():
+    """Compressed (CSR) table of the walks, as generated by
+    :meth:`network.PlanarGraph.walk_with_degrees`, from each "half edge" out
+    to a maximum length.  Half edge `2*i` starts at the second vertex of edge
+    `i` and walks away from the first vertex; half edge `2*i+1` is the
+    reverse.  Walks are computed when first needed, and then cached.
+
+    :param graph: The network.
+    :param max_length: The maximum length of walk to consider.
+    :param max_degree: Ignore walks whose product of degrees exceeds this.
+    """
+    def __init__(self, graph, max_length, max_degree=20000):
+        self._graph = graph
+        self._max_length = max_length
+        self._max_degree = max_degree
+        self._walks = dict()
+
+    @property
+    def max_length(self):
+        """The maximum length of walks."""
+        return self._max_length
+
+    def _walk(self, half_edge):
+        edge = half_edge // 2
+        avoid_key, start_key = self._graph.edges[edge]
+        if half_edge % 2 == 1:
+            start_key, avoid_key = avoid_key, start_key
+        walk = self._graph.walk_with_degrees(start_key, avoid_key, self._max_length, self._max_degree)
+        next(walk)
+        data = _np.asarray(list(walk), dtype=_np.float64).reshape((-1, 4))
+        return data[:,0].astype(_np.int64), data[:,1], data[:,2], 1.0 / data[:,3]
+
+    def table(self, half_edges):
+        """Assemble the walks from each of the given half edges.
+
+        :param half_edges: Array of half edges.
+
+        :return: Tuple `(indptr, edges, starts, ends, inverse_degrees)` where
+          the walks from `half_edges[i]` are described by the entries
+          `indptr[i]` to `indptr[i+1]` of the other arrays.  These give the
+          index of the edge walked, the length of the walk to the start, and
+          to the end, of that edge, and one over the product of the degrees.
+        """
+        walks = []
+        for half_edge in half_edges:
+            half_edge = int(half_edge)
+            if half_edge not in self._walks:
+                self._walks[half_edge] = self._walk(half_edge)
+            walks.append(self._walks[half_edge])
+        indptr = _np.zeros(len(walks) + 1, dtype=_np.int64)
+        indptr[1:] = _np.cumsum([len(w[0]) for w in walks])
+        if len(walks) == 0:
+            return (indptr, _np.empty(0, dtype=_np.int64), _np.empty(0),
+                _np.empty(0), _np.empty(0))
+        return (indptr,) + tuple(_np.concatenate(column) for column in zip(*walks))
+
+
 class Predictor():
     """The class which can make predictions.  Should be constructed by using an
     instance of :class:`Trainer`.
@@ -196,6 +386,7 @@ class Predictor():
     def __init__(self, network_timed_points, graph):
         self._network_timed_points = network_timed_points
         self._graph = graph
+        self._walk_table = None
         self.time_kernel_unit = _np.timedelta64(1, "D")
         self.time_kernel = None
         self.kernel = None
@@ -270,6 +461,85 @@ class Predictor():
         self.add(risks, edge_index, 1, dist, tw)
         self.add(risks, edge_index, -1, 1.0 - dist, tw)
 
+    #: Maximum number of (event, walk) pairs to process at once.
+    _max_pairs = 1000000
+
+    def _walks(self):
+        cutoff = self.kernel.cutoff
+        if self._walk_table is None or self._walk_table.max_length != cutoff:
+            self._walk_table = _WalkTable(self.graph, cutoff)
+        return self._walk_table
+
+    def _add_events(self, risks, edges, dists, time_weights):
+        """Internal use: add the contributions of many events, using array
+        operations.  Events at the same location are first combined, and then
+        the contributions along each walk from the event's edge are computed
+        in chunks.
+
+        :param risks: Array of risks to add to.
+        :param edges: Array of the indices of the edges the events are on.
+        :param dists: Array of how far along the edges the events are (between
+          0 and 1).
+        :param time_weights: Array of how much to scale each event by.
+        """
+        if len(edges) == 0:
+            return
+        lengths = _np.asarray(self.graph.lengths)[edges]
+        # Each event walks out of both ends of its edge
+        half_edges = _np.concatenate([2 * edges, 2 * edges + 1])
+        offsets = _np.concatenate([(1.0 - dists) * lengths, dists * lengths])
+        weights = _np.concatenate([time_weights, time_weights])
+        locations, inverse = _np.unique(_np.stack([half_edges, offsets]), axis=1, return_inverse=True)
+        weights = _np.bincount(inverse, weights=weights)
+        half_edges, offsets = locations[0].astype(_np.int64), locations[1]
+
+        cutoff = self.kernel.cutoff
+        risks += _np.bincount(half_edges // 2, minlength=len(risks),
+            weights = self.kernel.integrate(_np.zeros_like(offsets), offsets) * weights)
+
+        unique_half_edges, rows = _np.unique(half_edges, return_inverse=True)
+        indptr, walk_edges, starts, ends, inverse_degrees = self._walks().table(unique_half_edges)
+        first = indptr[:-1][rows]
+        counts = (indptr[1:] - indptr[:-1])[rows]
+        for chunk in self._chunks(counts):
+            event = _np.repeat(_np.arange(chunk.start, chunk.stop), counts[chunk])
+            within = _np.arange(len(event)) - _np.repeat(
+                _np.cumsum(counts[chunk]) - counts[chunk], counts[chunk])
+            index = first[event] + within
+            a = starts[index] + offsets[event]
+            mask = a < cutoff
+            index, event, a = index[mask], event[mask], a[mask]
+            b = ends[index] + offsets[event]
+            values = self.kernel.integrate(a, b) * inverse_degrees[index] * weights[event]
+            risks += _np.bincount(walk_edges[index], weights=values, minlength=len(risks))
+
+    def _chunks(self, counts):
+        """Split into consecutive slices, each with a total count of at most
+        :attr:`_max_pairs` (unless a single count is larger)."""
+        cumulative = _np.cumsum(counts)
+        start = 0
+        while start < len(counts):
+            limit = cumulative[start] - counts[start] + self._max_pairs
+            end = max(int(_np.searchsorted(cumulative, limit, side="right")), start + 1)
+            yield slice(start, end)
+            start = end
+
+    def _add_events_individually(self, risks, edges, dists, time_weights):
+        """Internal use: add the contributions of many events, one at a time,
+        by calling :meth:`add_edge`."""
+        progress = _logger_mod.ProgressLogger(len(edges), _datetime.timedelta(minutes=2), _logger)
+        for edge_index, dist, tw in zip(edges, dists, time_weights):
+            self.add_edge(risks, edge_index, dist, tw)
+            progress.increase_count()
+
+    def _locate_events(self, data):
+        """Find the edge indices, and the distance along the edges (relative
+        to the order of the vertices in the graph) of the events."""
+        edges, orders = self.graph.find_edges(data.start_keys, data.end_keys)
+        dists = _np.array(data.distances, dtype=_np.float64)
+        dists[orders == -1] = 1.0 - dists[orders == -1]
+        return edges, dists
+
     def predict(self, predict_time=None, cutoff_time=None):
         """Make a prediction.
 
@@ -279,29 +549,19 @@ class Predictor():
         :param cutoff_time: Use only events after this time.  If `None` then use
           all events from the start of the input data.
         """
-        if cutoff_time is None:
-            cutoff_time = self.network_timed_points.time_range[0]
-        cutoff_time = _np.datetime64(cutoff_time)
-        mask = (self.network_timed_points.timestamps >= cutoff_time)
+        data = self.network_timed_points.time_window(cutoff_time, predict_time)
         if predict_time is not None:
             predict_time = _np.datetime64(predict_time)
-            mask &= (self.network_timed_points.timestamps < predict_time)
         else:
             predict_time = self.network_timed_points.time_range[1]
-        data = self.network_timed_points[mask]
 
         times = (predict_time - data.timestamps) / self.time_kernel_unit
         time_weights = self.time_kernel(times)
         risks = _np.zeros(len(self.graph.edges))
         _logger.debug("Making prediction with %s events using %s/%s", len(times), self.kernel, self.time_kernel)
-        progress = _logger_mod.ProgressLogger(len(times), _datetime.timedelta(minutes=2), _logger)
-        for tw, key1, key2, dist in zip(time_weights, data.start_keys,
-                data.end_keys, data.distances):
-            edge_index, orient = self.graph.find_edge(key1, key2)
-            if orient == -1:
-                dist = 1.0 - dist
-            self.add_edge(risks, edge_index, dist, tw)
-            progress.increase_count()
+        edges, dists = self._locate_events(data)
+        time_weights = _np.broadcast_to(time_weights, times.shape).astype(_np.float64)
+        self._add_events(risks, edges, dists, time_weights)
         risks /= self.graph.lengths
 
         return Result(self.graph, risks)
@@ -313,44 +573,45 @@ class FastPredictor(Predictor):
     the first prediction will be slow, but subsequent calls should be fast(er).
     Will also cache intermediate results so that you can change the _time_
     kernel (but not the _space_ kernel) and quickly recompute a result.
-    
-    Unfortunately is very memory hungry.
+
+    The caches can use a lot of memory, so their size can be bounded, and the
+    walks from each edge (which do not depend upon the kernel) can be saved
+    to a file with :meth:`save_cache` and reloaded with :meth:`load_cache`.
     
     :param predictor: An :class:`Predictor` to initialise from.
     :param max_length: The maximum "support" length which any (spatial) kernel
       will be able to have.
+    :param max_cache_bytes: If not `None`, the maximum size, in bytes, of
+      each of the caches; see :class:`ArrayCache`.
     """
-    def __init__(self, predictor, max_length):
+    def __init__(self, predictor, max_length, max_cache_bytes=None):
+        self._cache = ArrayCache(max_cache_bytes)
+        self._add_cache = ArrayCache(max_cache_bytes)
         super().__init__(predictor.network_timed_points, predictor.graph)
         self.time_kernel_unit = predictor.time_kernel_unit
         self.time_kernel = predictor.time_kernel
         self.kernel = predictor.kernel
         self._max_length = max_length
-        self._cache = dict()
-        self._idx_cache = _np.array([])
-        self._add_cache = dict()
+
+    def _add_events(self, risks, edges, dists, time_weights):
+        self._add_events_individually(risks, edges, dists, time_weights)
         
     def _get(self, edge, orient):
         key = (edge, orient)
-        if key not in self._cache:
-            _logger.debug("Populating cache for %s", key)
-            start_key, avoid_key = self.graph.edges[edge]
-            if orient == 1:
-                start_key, avoid_key = avoid_key, start_key
-            data = list(self.graph.walk_with_degrees(start_key, avoid_key, self._max_length, 20000))
-            index = _np.empty(len(data), dtype=_np.int)
-            start = _np.empty(len(data))
-            end = _np.empty(len(data))
-            degree = _np.empty(len(data))
-            for i, (idx, st, en, deg) in enumerate(data):
-                if i==0:
-                    idx = edge
-                index[i] = idx
-                start[i] = st
-                end[i] = en
-                degree[i] = 1.0 / deg
-            self._cache[key] = (index, start, end, degree)
-        return self._cache[key]
+        if key in self._cache:
+            return self._cache[key]
+        _logger.debug("Populating cache for %s", key)
+        start_key, avoid_key = self.graph.edges[edge]
+        if orient == 1:
+            start_key, avoid_key = avoid_key, start_key
+        walk = self.graph.walk_with_degrees(start_key, avoid_key, self._max_length, 20000)
+        data = _np.asarray(list(walk), dtype=_np.float64).reshape((-1, 4))
+        index = data[:,0].astype(_np.int64)
+        index[0] = edge
+        entry = (index, _np.ascontiguousarray(data[:,1]),
+            _np.ascontiguousarray(data[:,2]), 1.0 / data[:,3])
+        self._cache[key] = entry
+        return entry
 
     def add(self, risks, edge, orient, offset, time_weight=1):
         """Internal use: add to the risks from all paths.
@@ -362,21 +623,48 @@ class FastPredictor(Predictor):
         :param time_weight: How much to scale by
         """
         key = (edge, orient, offset)
-        if key not in self._add_cache:
+        if key in self._add_cache:
+            indices, values = self._add_cache[key]
+        else:
             if self.kernel.cutoff > self._max_length:
                 raise ValueError("Build from maximum length {}".format(self._max_length))
             offset = (1.0 - offset) * self.graph.length(edge)
             index, start, end, degree = self._get(edge, orient)
-            start = _np.array(start) + offset
-            end = _np.array(end) + offset
+            start = start + offset
+            end = end + offset
             start[0] = 0
             mask = start < self.kernel.cutoff
             index, start, end, degree = index[mask], start[mask], end[mask], degree[mask]
             to_add = self.kernel.integrate(start, end) * degree
-            if len(self._idx_cache) != len(risks):
-                self._idx_cache = _np.arange(len(risks))
-            self._add_cache[key] = _ndimage.sum(to_add, labels=index, index=self._idx_cache)
-        risks += self._add_cache[key] * time_weight
+            indices, inverse = _np.unique(index, return_inverse=True)
+            values = _np.bincount(inverse, weights=to_add, minlength=len(indices))
+            self._add_cache[key] = (indices, values)
+        risks[indices] += values * time_weight
+
+    def save_cache(self, filename):
+        """Save the cache of walks from each edge (which does not depend on
+        the kernel) to a file, which can be reloaded, for the same graph, by
+        :meth:`load_cache`."""
+        self._cache.save(filename, {"max_length" : self._max_length,
+            "number_edges" : self.graph.number_edges,
+            "graph" : _graph_fingerprint(self.graph)})
+
+    def load_cache(self, filename, mmap=True):
+        """Use the walks saved to a file by :meth:`save_cache`.
+
+        :param mmap: If `True` (the default), memory map the file, so
+          nothing is read from disc until it is needed, and the operating
+          system can share the memory between processes.
+        """
+        meta = self._cache.load(filename, mmap)
+        if (meta["number_edges"] != self.graph.number_edges
+                or meta["max_length"] != self._max_length):
+            self._cache.clear()
+            raise ValueError("Cache was computed for {} edges and maximum length {}".format(
+                meta["number_edges"], meta["max_length"]))
+        if meta.get("graph") != _graph_fingerprint(self.graph):
+            self._cache.clear()
+            raise ValueError("Cache was computed for a different graph")
 
     @property
     def kernel(self):
@@ -385,7 +673,7 @@ class FastPredictor(Predictor):
 
     @kernel.setter
     def kernel(self, v):
-        self._add_cache = dict()
+        self._add_cache.clear()
         self._kernel = v
 
 
@@ -405,6 +693,9 @@ class ApproxPredictor(Predictor):
         self.time_kernel = predictor.time_kernel
         self.kernel = predictor.kernel
 
+    def _add_events(self, risks, edges, dists, time_weights):
+        self._add_events_individually(risks, edges, dists, time_weights)
+
     def add_edge(self, risks, edge_index, dist, tw):
         """Internal use.  Add both contributions to an edge.
 
@@ -447,18 +738,34 @@ class ApproxPredictor(Predictor):
 
 class ApproxPredictorCaching(ApproxPredictor):
     """As :class:`ApproxPredictor` but caches data.  Uses the same strategy
-    as :class:`FastPredictor` and also caches spatial kernel data.
+    as :class:`FastPredictor` and also caches spatial kernel data.  The
+    shortest paths from each edge can be saved to a file with
+    :meth:`save_cache` and reloaded with :meth:`load_cache`.
 
     :param predictor: An :class:`Predictor` to initialise from.
+    :param distance_table: Optional instance of
+      :class:`network.BoundedDistances`, computed for the same graph with a
+      `max_length` of at least the cutoff of the kernel, to use instead of
+      computing shortest paths.
+    :param max_cache_bytes: If not `None`, the maximum size, in bytes, of
+      each of the caches; see :class:`ArrayCache`.
     """
-    def __init__(self, predictor):
+    def __init__(self, predictor, distance_table=None, max_cache_bytes=None):
+        self._cache = ArrayCache(max_cache_bytes)
+        self._add_cache = ArrayCache(max_cache_bytes)
         super().__init__(predictor)
-        self._cache = dict()
-        self._add_cache = dict()
+        self._distance_table = distance_table
 
     def _get_data(self, edge_index):
+        if self._distance_table is not None:
+            return self._distance_table[edge_index]
+        key = (edge_index,)
+        if key in self._cache:
+            return self._cache[key]
         _logger.debug("ApproxPredictorCaching: Calculating for %s", edge_index)
-        return network.shortest_edge_paths_with_degrees(self.graph, edge_index)
+        entry = network._bounded_edge_paths_with_degrees(self.graph, edge_index)
+        self._cache[key] = entry
+        return entry
 
     def add_edge(self, risks, edge_index, dist, tw):
         """Internal use.  Add both contributions to an edge.
@@ -469,14 +776,38 @@ class ApproxPredictorCaching(ApproxPredictor):
           We ignore and set to 0.5
         :param tw: How much to scale by
         """
-        if edge_index not in self._add_cache:
-            if edge_index not in self._cache:
-                self._cache[edge_index] = self._get_data(edge_index)
-            kernel_dists, cumulative_degrees = self._cache[edge_index]
-            mask = kernel_dists > -1
-            self._add_cache[edge_index] = mask, self.kernel(kernel_dists[mask]) / cumulative_degrees[mask] * self.graph.lengths[mask]
-        mask, toadd = self._add_cache[edge_index]
-        risks[mask] += toadd * tw
+        key = (edge_index,)
+        if key in self._add_cache:
+            edges, toadd = self._add_cache[key]
+        else:
+            edges, kernel_dists, cumulative_degrees = self._get_data(edge_index)
+            toadd = self.kernel(kernel_dists) / cumulative_degrees * self.graph.lengths[edges]
+            mask = toadd != 0
+            edges, toadd = edges[mask], toadd[mask]
+            self._add_cache[key] = (edges, toadd)
+        risks[edges] += toadd * tw
+
+    def save_cache(self, filename):
+        """Save the cache of shortest paths from each edge (which does not
+        depend on the kernel) to a file, which can be reloaded, for the same
+        graph, by :meth:`load_cache`."""
+        self._cache.save(filename, {"number_edges" : self.graph.number_edges,
+            "graph" : _graph_fingerprint(self.graph)})
+
+    def load_cache(self, filename, mmap=True):
+        """Use the shortest paths saved to a file by :meth:`save_cache`.
+
+        :param mmap: If `True` (the default), memory map the file, so
+          nothing is read from disc until it is needed, and the operating
+          system can share the memory between processes.
+        """
+        meta = self._cache.load(filename, mmap)
+        if meta["number_edges"] != self.graph.number_edges:
+            self._cache.clear()
+            raise ValueError("Cache was computed for {} edges".format(meta["number_edges"]))
+        if meta.get("graph") != _graph_fingerprint(self.graph):
+            self._cache.clear()
+            raise ValueError("Cache was computed for a different graph")
 
     @property
     def kernel(self):
@@ -485,7 +816,7 @@ class ApproxPredictorCaching(ApproxPredictor):
 
     @kernel.setter
     def kernel(self, v):
-        self._add_cache = dict()
+        self._add_cache.clear()
         self._kernel = v
 
 
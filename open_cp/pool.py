@@ -21,9 +21,15 @@ class OurProcessPoolExecutor():
     """Minimal version of the standard library :class:`ProcessPoolExecutor`
     which raises exceptions on failure to launch a worker task.  Uses
     :mod:`multiprocessing.Pool` internally.
+
+    :param processes: The number of worker processes, or `None` to use the
+      number of CPUs.
+    :param initializer: If not `None`, a callable which each worker process
+      will call, once, when it starts.
+    :param initargs: Arguments to pass to `initializer`.
     """
-    def __init__(self):
-        self._pool = _mp.Pool()
+    def __init__(self, processes=None, initializer=None, initargs=()):
+        self._pool = _mp.Pool(processes, initializer, initargs)
 
     def __enter__(self):
         return self
@@ -105,9 +111,21 @@ class PoolExecutor():
             for result in yield_task_results(futures):
                 # Process result
                 pass
+
+    Large, read-only data which every task needs (for example, the input
+    events) is best sent to the workers using `initializer`, as then it is
+    pickled once per worker process, and not once per task.
+
+    :param processes: The number of worker processes, or `None` to use the
+      number of CPUs.
+    :param initializer: If not `None`, a callable which each worker process
+      will call, once, when it starts.
+    :param initargs: Arguments to pass to `initializer`.
     """
-    def __init__(self):
+    def __init__(self, processes=None, initializer=None, initargs=()):
         self._executor = None
+        self._pool_args = {"processes" : processes, "initializer" : initializer,
+            "initargs" : initargs}
         self._logger = _log.getLogger(PoolExecutor.__name__)
     
     def __enter__(self):
@@ -119,7 +137,7 @@ class PoolExecutor():
 
     def start(self):
         """Manually start the executor, instead of using as a context."""
-        self._executor = _ProcessPoolExecutor()
+        self._executor = _ProcessPoolExecutor(**self._pool_args)
 
     def shutdown(self):
         """Manually stop the executor"""
@@ -196,14 +214,17 @@ def yield_task_results(futures, timeout=None):
 
 
 class RestorableExecutor():
-    """An executor which will save current progress on a `KeyboardInterrupt`.
+    """An executor which will save current progress on a `KeyboardInterrupt`,
+    or any other exception raised while waiting for results.
     Use as a context manager, take the context, `submit` all your tasks (with
     unique keys) and then leave the context.  All the tasks will be run using
     a :class:`ProcessPoolExecutor` and will then be available from the
     :attr:`results` property.
 
-    If a `KeyboardInterrupt` is raised, the key/value pairs so far generated
-    will be pickled and saved to the given filename.
+    If an exception is raised, the key/value pairs so far generated
+    will be pickled and saved to the given filename.  If `checkpoint_interval`
+    is set, then the results so far are also saved periodically, so that
+    progress survives the whole process being killed.
 
     When initialising, if the file exists, an attempt will be made to unpickle
     it to a dictionary.  Any keys present in the dictionary will not be
@@ -212,10 +233,21 @@ class RestorableExecutor():
     On successful completion, results are _not_ written to file!
 
     :param filename: Filename to use if interupted.
+    :param processes: The number of worker processes, or `None` to use the
+      number of CPUs.
+    :param initializer: If not `None`, a callable which each worker process
+      will call, once, when it starts.
+    :param initargs: Arguments to pass to `initializer`.
+    :param checkpoint_interval: If not `None`, a :class:`datetime.timedelta`
+      giving how often to save the results so far.
     """
-    def __init__(self, filename):
+    def __init__(self, filename, processes=None, initializer=None, initargs=(),
+            checkpoint_interval=None):
         self._logger = _log.getLogger(RestorableExecutor.__name__)
         self._filename = filename
+        self._pool_args = {"processes" : processes, "initializer" : initializer,
+            "initargs" : initargs}
+        self._checkpoint_interval = checkpoint_interval
         self._results = self._load()
         self._futures = []
         self._executor = None
@@ -255,19 +287,30 @@ class RestorableExecutor():
         return self._results
 
     def __enter__(self):
-        self._executor = _ProcessPoolExecutor()
+        self._executor = _ProcessPoolExecutor(**self._pool_args)
         return self
 
+    def _collect(self):
+        if self._checkpoint_interval is not None:
+            import datetime
+            next_save = datetime.datetime.now() + self._checkpoint_interval
+        for k, v in yield_task_results(self._futures):
+            self._logger.debug("Completed task %s", k)
+            self._results[k] = v
+            if (self._checkpoint_interval is not None and
+                    datetime.datetime.now() >= next_save):
+                self._save()
+                next_save = datetime.datetime.now() + self._checkpoint_interval
+
     def __exit__(self, ex, b, c):
         if ex is None:
             try:
-                print("Here...")
-                for k, v in yield_task_results(self._futures):
-                    print("Got", k, v)
-                    self._results[k] = v
-            except KeyboardInterrupt as ex:
-                self._logger.warning("KeyboardInterrupt detected; saving results so far...")
+                self._collect()
+            except BaseException as ex:
+                self._logger.warning("%s detected; saving results so far...", type(ex).__name__)
                 self._save()
+                self._executor.terminate()
+                self._executor = None
                 raise ex
         self._executor.shutdown(False)
         self._executor = None
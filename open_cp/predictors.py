@@ -344,96 +344,90 @@ class ContinuousPrediction():
         y = (gy + _np.random.random(self.samples)) * self.cell_height + self.yoffset
         return _np.mean(self.risk(x, y))
 
+    # Approximate number of bytes of memory to use when evaluating the risk
+    # at many points at once, and an estimate of how much working memory the
+    # `risk` method needs for each point.  Points are evaluated in chunks of
+    # `memory_budget // risk_point_bytes`, by default 50 points at a time.
+    # The memory needed per point depends on the `risk` method (e.g. a KDE
+    # over `N` events needs `O(N)` working memory for each point), so only
+    # increase the budget if you know the risk is cheap to evaluate.  Change
+    # on the class or instance.
+    memory_budget = 50 * 2**16
+    risk_point_bytes = 2**16
+
+    def _chunk_points(self):
+        return max(1, int(self.memory_budget // self.risk_point_bytes))
+
     def _risk_array(self, x, y):
-        # Like `return self.risk(x,y)` but do in blocks of at most 50 to avoid
-        # excessive memory usage
+        # Like `return self.risk(x,y)` but do in chunks to avoid excessive
+        # memory usage
         assert len(x.shape) == 1
         out = _np.empty_like(x)
         offset = 0
         length = x.shape[0]
+        chunk = self._chunk_points()
         while offset < length:
-            end = min(offset + 50, length)
+            end = min(offset + chunk, length)
             xx, yy = x[offset : end], y[offset : end]
             out[offset : end] = self.risk(xx, yy)
             offset = end
         return out
-    
-    def to_matrix(self, width, height):
-        """Sample the risk at each grid point from `(0, 0)` to
-        `(width-1, height-1)` inclusive.  Optimised."""
-        if self.samples < 0:
-            return self._to_matrix_grid(width, height)
-        matrix = _np.empty((height, width))
-        for gy in range(height):
-            y = (gy + _np.random.random(size=self.samples * width)) * self.cell_height + self.yoffset
-            # 0,1,...,width-1, 0,1,...,width-1  with the block repeated self.sample times
-            gx = _np.broadcast_to(_np.arange(width), (self.samples, width)).ravel()
-            x = (gx + _np.random.random(self.samples * width)) * self.cell_width + self.xoffset
-            matrix[gy] = _np.mean(_np.reshape(self._risk_array(x, y), (self.samples, width)), axis=0)
-        return matrix
 
     def _sub_grid_mesh(self):
         s = -self.samples
         pat = (_np.arange(s) * 2 + 1) / (s + s)
         xx, yy = _np.meshgrid(pat, pat)
         return xx.ravel(), yy.ravel()
-        
-    def _to_matrix_grid(self, width, height):
-        matrix = _np.empty((height, width))
-        xx, yy = self._sub_grid_mesh()
-        for gy in range(height):
-            y = (yy + gy) * self.cell_height + self.yoffset
-            for gx in range(width):
-                x = (xx + gx) * self.cell_width + self.xoffset
-                matrix[gy][gx] = _np.mean(self.risk(x, y))
-        return matrix
+
+    def _sample_cells(self, gx, gy, size, offset):
+        """Average risk over each of the grid cells `(gx[i], gy[i])`.  Sample
+        locations are built for as many cells at once as fit in one chunk (see
+        :attr:`memory_budget`).
+
+        :param gx: One dimensional array of x cell indices.
+        :param gy: One dimensional array of y cell indices.
+        :param size: Pair `(xsize, ysize)` of cell size.
+        :param offset: Pair `(xoffset, yoffset)` of grid offset.
+        """
+        if self.samples < 0:
+            xx, yy = self._sub_grid_mesh()
+            per_cell = len(xx)
+        else:
+            per_cell = self.samples
+        cells_per_chunk = max(1, self._chunk_points() // per_cell)
+        out = _np.empty(len(gx))
+        for start in range(0, len(gx), cells_per_chunk):
+            cx = gx[start : start + cells_per_chunk, None]
+            cy = gy[start : start + cells_per_chunk, None]
+            if self.samples >= 0:
+                xx = _np.random.random(size=(cx.shape[0], per_cell))
+                yy = _np.random.random(size=(cx.shape[0], per_cell))
+            x = ((cx + xx) * size[0] + offset[0]).ravel()
+            y = ((cy + yy) * size[1] + offset[1]).ravel()
+            values = self._risk_array(x, y)
+            out[start : start + cx.shape[0]] = _np.mean(values.reshape(cx.shape[0], per_cell), axis=1)
+        return out
+
+    def to_matrix(self, width, height):
+        """Sample the risk at each grid point from `(0, 0)` to
+        `(width-1, height-1)` inclusive.  Optimised."""
+        gx, gy = _np.meshgrid(_np.arange(width), _np.arange(height))
+        values = self._sample_cells(gx.ravel(), gy.ravel(),
+            (self.cell_width, self.cell_height), (self.xoffset, self.yoffset))
+        return values.reshape((height, width))
 
     def to_matrix_from_masked_grid(self, masked_grid):
         """Sample the risk at each "valid" grid point from `masked_grid`.
         Takes grid geometry from `masked_grid` and not from own settings.
         Useful for when the kernel cannot be evaluated at certain points."""
-        if self.samples < 0:
-            return self._to_matrix_from_masked_grid_regular(masked_grid)
-        locations = []
-        to_cell = []
-        size = [masked_grid.xsize, masked_grid.ysize]
-        offset = [masked_grid.xoffset, masked_grid.yoffset]
-        for gy in range(masked_grid.yextent):
-            for gx in range(masked_grid.xextent):
-                if masked_grid.is_valid(gx, gy):
-                    to_cell.append((gx, gy))
-                    parts = (_np.random.random(size=(self.samples,2)) + [gx,gy]) * size + offset
-                    locations.extend(parts)
-        locations = _np.asarray(locations)
-        values = self._risk_array(*locations.T)
-        values = _np.mean(_np.reshape(values, (values.shape[0] // self.samples, self.samples)), axis=1)
-        matrix = _np.zeros((masked_grid.yextent, masked_grid.xextent))
-        for v, (gx, gy) in zip(values, to_cell):
-            matrix[gy, gx] = v
-        return matrix
-
-    def _to_matrix_from_masked_grid_regular(self, masked_grid):
-        locations = []
-        to_cell = []
-        size = [masked_grid.xsize, masked_grid.ysize]
-        offset = [masked_grid.xoffset, masked_grid.yoffset]
-        xx, yy = self._sub_grid_mesh()
-        for gy in range(masked_grid.yextent):
-            for gx in range(masked_grid.xextent):
-                if masked_grid.is_valid(gx, gy):
-                    to_cell.append((gx, gy))
-                    parts = _np.vstack([xx + gx, yy + gy]).T * size + offset
-                    locations.extend(parts)
-        locations = _np.asarray(locations)
-        values = self._risk_array(*locations.T)
-        ss = self.samples * self.samples
-        values = _np.mean(_np.reshape(values, (values.shape[0] // ss, ss)), axis=1)
+        gy, gx = _np.nonzero(~_np.asarray(masked_grid.mask))
         matrix = _np.zeros((masked_grid.yextent, masked_grid.xextent))
-        for v, (gx, gy) in zip(values, to_cell):
-            matrix[gy, gx] = v
+        if len(gx) > 0:
+            matrix[gy, gx] = self._sample_cells(gx, gy,
+                (masked_grid.xsize, masked_grid.ysize),
+                (masked_grid.xoffset, masked_grid.yoffset))
         return matrix
 
-
     def to_kernel(self):
         """Returns a callable object which when called at `point` gives the
         risk at (point[0], point[1]).  `point` may be an array."""
@@ -448,6 +442,8 @@ class ContinuousPrediction():
             samples = self.__samples
         instance = ContinuousPrediction(cell_width, cell_height, xoffset,
             yoffset, samples)
+        instance.memory_budget = self.memory_budget
+        instance.risk_point_bytes = self.risk_point_bytes
         # Monkey-patch a delegation
         instance.risk = self.risk
         return instance
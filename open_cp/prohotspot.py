@@ -169,6 +169,104 @@ class ProspectiveHotSpot(_predictors.DataTrainer):
         distances = self.distance(gridx, gridy, cellx, celly)
         return _np.sum(self.weight(time_deltas, distances))
 
+    # Bound the number of (event cell, offset) pairs handled at once
+    _max_pairs = 1000000
+
+    def _bin_events(self, time_deltas, coords):
+        """Assign each event to a grid cell and time bucket, and then merge
+        identical entries.
+
+        :return: Tuple `(time_buckets, gridx, gridy, counts)` of one
+          dimensional arrays, sorted by time bucket.
+        """
+        gridx, gridy = self._cell(coords[0], coords[1])
+        keys = _np.vstack([time_deltas, gridx, gridy]).T
+        keys, counts = _np.unique(keys, axis=0, return_counts=True)
+        return keys[:,0], keys[:,1].astype(_np.int64), keys[:,2].astype(_np.int64), counts
+
+    def _offsets(self, width, height):
+        """The offsets `(xoffsets, yoffsets, distances)` from an event cell
+        to every grid cell which an event inside a `width` by `height` grid
+        can reach, and the distance of each.  This assumes that
+        :attr:`distance` only depends upon the difference between grid cells,
+        which is true of all the provided classes."""
+        xoffsets, yoffsets = _np.meshgrid(_np.arange(1 - width, width),
+            _np.arange(1 - height, height))
+        xoffsets, yoffsets = xoffsets.ravel(), yoffsets.ravel()
+        zeros = _np.zeros(len(xoffsets))
+        return xoffsets, yoffsets, self.distance(zeros, zeros, xoffsets, yoffsets)
+
+    def _stamp(self, bucket, offsets):
+        """The offsets, and weights, with non-zero weight for an event in the
+        given time bucket, from the output of :meth:`_offsets`."""
+        xoffsets, yoffsets, distances = offsets
+        weights = self.weight(_np.full(len(distances), bucket), distances)
+        support = _np.flatnonzero(weights)
+        return xoffsets[support], yoffsets[support], weights[support]
+
+    def _contributions(self, bucket, gridx, gridy, stamp, width, height):
+        """Find the non-zero weight of each event, all in the same time
+        bucket, in each cell of a `width` by `height` grid.  Events inside the
+        grid use the `stamp` from :meth:`_stamp`, while the (typically few)
+        events outside the grid are evaluated against every cell, so the
+        offsets never depend upon how far the events are spread out.
+
+        :return: Generator of tuples `(events, cells, weights)` of arrays
+          giving the index into `gridx` of the event, the flattened index of
+          the grid cell, and the weight.  At most about :attr:`_max_pairs`
+          entries are generated at once.
+        """
+        inside = (gridx >= 0) & (gridx < width) & (gridy >= 0) & (gridy < height)
+        index = _np.flatnonzero(inside)
+        xoffsets, yoffsets, weights = stamp
+        if len(weights) > 0:
+            chunk = max(1, self._max_pairs // len(weights))
+            for s in range(0, len(index), chunk):
+                events = index[s : s + chunk]
+                tx = gridx[events,None] + xoffsets[None,:]
+                ty = gridy[events,None] + yoffsets[None,:]
+                mask = (tx >= 0) & (tx < width) & (ty >= 0) & (ty < height)
+                yield (_np.broadcast_to(events[:,None], tx.shape)[mask],
+                    (ty * width + tx)[mask],
+                    _np.broadcast_to(weights[None,:], tx.shape)[mask])
+
+        index = _np.flatnonzero(~inside)
+        size = width * height
+        cellx, celly = _np.meshgrid(_np.arange(width), _np.arange(height))
+        cellx, celly = cellx.ravel(), celly.ravel()
+        chunk = max(1, self._max_pairs // size)
+        for s in range(0, len(index), chunk):
+            count = len(index[s : s + chunk])
+            events = _np.repeat(index[s : s + chunk], size)
+            distances = self.distance(gridx[events], gridy[events],
+                _np.tile(cellx, count), _np.tile(celly, count))
+            weights = self.weight(_np.full(len(distances), bucket), distances)
+            mask = weights != 0
+            yield events[mask], _np.tile(_np.arange(size), count)[mask], weights[mask]
+
+    def _grid_weights(self, time_deltas, coords, width, height):
+        """Compute the total weight in each grid cell.  Events are binned
+        once, and then for each time bucket, the weight is evaluated once for
+        each possible offset between a cell in the grid and another grid cell.
+        The contribution of each (cell, offset) pair with non-zero weight is
+        then accumulated with a single `bincount`.  See
+        :meth:`_contributions` for events outside the grid.
+        """
+        matrix = _np.zeros(height * width)
+        if len(time_deltas) == 0:
+            return matrix.reshape((height, width))
+        buckets, gridx, gridy, counts = self._bin_events(time_deltas, coords)
+        offsets = self._offsets(width, height)
+
+        splits = _np.flatnonzero(buckets[1:] != buckets[:-1]) + 1
+        for start, end in zip(_np.append(0, splits), _np.append(splits, len(buckets))):
+            stamp = self._stamp(buckets[start], offsets)
+            for events, cells, weights in self._contributions(buckets[start],
+                    gridx[start:end], gridy[start:end], stamp, width, height):
+                matrix += _np.bincount(cells, weights=weights * counts[start:end][events],
+                        minlength=len(matrix))
+        return matrix.reshape((height, width))
+
     def predict(self, cutoff_time, predict_time):
         """Calculate a grid based prediction.
 
@@ -187,14 +285,113 @@ class ProspectiveHotSpot(_predictors.DataTrainer):
 
         width = int(_np.rint((self.region.xmax - self.region.xmin) / self.grid))
         height = int(_np.rint((self.region.ymax - self.region.ymin) / self.grid))
-        matrix = _np.empty((height, width))
-        for x in range(width):
-            for y in range(height):
-                matrix[y][x] = self._total_weight(time_deltas, events.coords, x, y)
+        matrix = self._grid_weights(time_deltas, events.coords, width, height)
         return _predictors.GridPredictionArray(self.grid, self.grid, matrix,
                                               self.region.xmin, self.region.ymin)
 
 
+class ProspectiveHotSpotIncremental():
+    """Makes a sequence of predictions with :class:`ProspectiveHotSpot` for
+    increasing cutoff and prediction times, keeping a running total in each
+    grid cell.  As the weight only depends on the whole number of time units
+    between an event and the prediction time, moving the prediction time
+    forward only changes the contribution of those events which cross into a
+    new time unit.  Each step thus costs `O(events)` to find the new time
+    buckets, plus `O((new or changed events) x (cells with non-zero weight))`
+    to update the totals, instead of visiting every event and cell.
+
+    Each call to :meth:`predict` gives the same prediction as calling
+    `predictor.predict` with the same arguments, up to floating point
+    rounding (cells with no contributing events are exactly zero).  If either
+    time moves backwards, or the data, weight or distance of the predictor is
+    changed, the totals are recomputed from scratch.  As for
+    :meth:`ProspectiveHotSpot._grid_weights`, the distance should only depend
+    upon the difference between grid cells.
+
+    :param predictor: Instance of :class:`ProspectiveHotSpot` with the weight,
+      distance and data already set.
+    """
+    def __init__(self, predictor):
+        self._predictor = predictor
+        self.reset()
+
+    @property
+    def predictor(self):
+        """The :class:`ProspectiveHotSpot` instance we use."""
+        return self._predictor
+
+    def reset(self):
+        """Forget the running totals, so the next prediction is computed from
+        scratch."""
+        self._state = None
+
+    def _rebuild(self, key):
+        p = self._predictor
+        width = int(_np.rint((p.region.xmax - p.region.xmin) / p.grid))
+        height = int(_np.rint((p.region.ymax - p.region.ymin) / p.grid))
+        gridx, gridy = p._cell(*p.data.coords)
+        self._offsets = p._offsets(width, height)
+        self._stamps = dict()
+        self._gridx, self._gridy = gridx.astype(_np.int64), gridy.astype(_np.int64)
+        self._state = [key, 0, None, _np.zeros((height, width)),
+            _np.zeros((height, width), dtype=_np.int64), _np.empty(0)]
+
+    def _stamp(self, bucket):
+        if bucket not in self._stamps:
+            self._stamps[bucket] = self._predictor._stamp(bucket, self._offsets)
+        return self._stamps[bucket]
+
+    def _apply(self, matrix, counts, buckets, indices, sign):
+        height, width = matrix.shape
+        order = _np.argsort(buckets, kind="stable")
+        buckets, indices = buckets[order], indices[order]
+        splits = _np.flatnonzero(buckets[1:] != buckets[:-1]) + 1
+        for start, end in zip(_np.append(0, splits), _np.append(splits, len(buckets))):
+            if start == end:
+                continue
+            index = indices[start:end]
+            for _, cells, weights in self._predictor._contributions(buckets[start],
+                    self._gridx[index], self._gridy[index], self._stamp(buckets[start]),
+                    width, height):
+                matrix += sign * _np.bincount(cells, weights=weights,
+                    minlength=matrix.size).reshape(matrix.shape)
+                counts += sign * _np.bincount(cells, minlength=matrix.size).reshape(matrix.shape)
+
+    def predict(self, cutoff_time, predict_time):
+        """Calculate a grid based prediction.
+
+        :param cutoff_time: Ignore data with a timestamp after this time.
+        :param predict_time: Timestamp of the prediction.  Used to calculate
+          the time difference between events and "now".  Typically the same as
+          `cutoff_time`.
+
+        :return: An instance of :class:`GridPredictionArray`
+        """
+        if not cutoff_time <= predict_time:
+            raise ValueError("Data cutoff point should be before prediction time")
+        p = self._predictor
+        predict_time = _np.datetime64(predict_time)
+        timestamps = p.data.timestamps
+        hi = _np.searchsorted(timestamps, _np.datetime64(cutoff_time), side="right")
+        key = (p.data, p.weight, p.distance, p.region, p.grid, p.time_unit)
+        if (self._state is None or any(a is not b for a, b in zip(self._state[0], key[:4]))
+                or key[4:] != self._state[0][4:] or hi < self._state[1]
+                or predict_time < self._state[2]):
+            self._rebuild(key)
+        _, old_hi, _, matrix, counts, old_buckets = self._state
+
+        buckets = _np.floor((predict_time - timestamps[:hi]) / p.time_unit)
+        changed = _np.flatnonzero(buckets[:old_hi] != old_buckets)
+        self._apply(matrix, counts, old_buckets[changed], changed, -1)
+        added = _np.append(changed, _np.arange(old_hi, hi))
+        self._apply(matrix, counts, buckets[added], added, 1)
+        matrix[counts == 0] = 0
+        self._state[1:3] = hi, predict_time
+        self._state[5] = buckets
+        return _predictors.GridPredictionArray(p.grid, p.grid, matrix.copy(),
+                                              p.region.xmin, p.region.ymin)
+
+
 class ProspectiveHotSpotContinuous(_predictors.DataTrainer):
     """Implements the prospective hotspot algorithm as a kernel density
     estimation.  A copy of the space/time kernel / weight is laid down over
@@ -40,6 +40,14 @@ class Weight(metaclass=_abc.ABCMeta):
         """
         pass
 
+    @property
+    def support(self):
+        """If the weight is zero at all points further than some distance from
+        the origin, then that distance; otherwise `None`.  Subclasses with
+        compact support should override this, as it allows much faster
+        computation of grid based predictions."""
+        return None
+
 
 class Quartic(Weight):
     """The classic "quartic" weight, which is the function :math:`(1-d^2)^2`
@@ -58,6 +66,11 @@ class Quartic(Weight):
         weight = (1 - distance_sq / self._cutoff) ** 2
         return weight * ( distance_sq <= self._cutoff )
 
+    @property
+    def support(self):
+        """The bandwidth, as the weight is zero beyond this distance."""
+        return self._h
+
     def __repr__(self):
         return "Quartic(bandwidth={})".format(self._h)
 
@@ -84,6 +97,11 @@ class TruncatedGaussian(Weight):
         out = _np.exp(-normalised / 2)
         return out * ( distance_sq <= self._cutoff )
         
+    @property
+    def support(self):
+        """The bandwidth, as the weight is zero beyond this distance."""
+        return self._h
+
     def __repr__(self):
         return "TruncatedGaussian(bandwidth={}, sd={})".format(self._h, self._range)
 
@@ -93,13 +111,7 @@ class TruncatedGaussian(Weight):
 
 
 def _clip_data(data, start_time, end_time):
-    mask = None
-    if start_time is not None:
-        mask = data.timestamps >= start_time
-    if end_time is not None:
-        end_mask = data.timestamps <= end_time
-        mask = end_mask if (mask is None) else (mask & end_mask)
-    return data.coords if mask is None else data.coords[:,mask]
+    return data.time_window(start_time, end_time, include_end=True).coords
 
         
 class RetroHotSpot(predictors.DataTrainer):
@@ -138,13 +150,19 @@ class RetroHotSpotGrid(predictors.DataTrainer):
     using :class:`RetroHotSpot` and then gridding the resulting continuous risk 
     estimate.
 
+    If the weight has compact support (see :attr:`Weight.support`) then for
+    each event, only the grid cells within that distance are visited.
+
     :param region: An instance of :RectangularRegion: giving the region the
       grid should cover.
     :param grid_size: The size of grid to use.
     :param grid: Alternative to specifying the region and grid_size is to pass
-      a :class:`BoundedGrid` instance.
+      a :class:`BoundedGrid` instance.  If this is a :class:`MaskedGrid` then
+      the risk is only computed in valid cells, and the returned prediction is
+      masked.
     """
     def __init__(self, region=None, grid_size=150, grid=None):
+        self._masked_grid = None
         if grid is None:
             self.grid_size = grid_size
             self.region = region
@@ -153,8 +171,82 @@ class RetroHotSpotGrid(predictors.DataTrainer):
             self.grid_size = grid.xsize
             if grid.xsize != grid.ysize:
                 raise ValueError("Only supports *square* grid cells.")
+            if hasattr(grid, "mask"):
+                self._masked_grid = grid
         self.weight = Quartic()
 
+    # Maximum number of (event, grid cell) pairs to evaluate the weight at in
+    # one go
+    _max_pairs = 1000000
+
+    def _valid_cells(self, xsize, ysize):
+        if self._masked_grid is None:
+            return _np.ones((ysize, xsize), dtype=bool)
+        return ~_np.asarray(self._masked_grid.mask, dtype=bool)
+
+    def _accumulate(self, matrix, x, y, gx, gy, sign=1, counts=None):
+        """Add the weight from each event `(x[i], y[i])` to the grid cells
+        `(gx[i,j], gy[i,j])`, multiplied by `sign`.  If `counts` is given, also
+        add `sign` times the number of non-zero weights to each cell."""
+        cx = gx * self.grid_size + self.region.xmin + self.grid_size / 2
+        cy = gy * self.grid_size + self.region.ymin + self.grid_size / 2
+        weights = self.weight((cx - x[:,None]).ravel(), (cy - y[:,None]).ravel())
+        weights = _np.broadcast_to(weights, gx.size)
+        indices = (gy * matrix.shape[1] + gx).ravel()
+        matrix += sign * _np.bincount(indices, weights=weights,
+            minlength=matrix.size).reshape(matrix.shape)
+        if counts is not None:
+            counts += sign * _np.bincount(indices[weights != 0],
+                minlength=matrix.size).reshape(matrix.shape)
+
+    def _add_events(self, matrix, coords, valid, sign=1, counts=None):
+        """Add (or with `sign=-1`, remove) the weight from each event in
+        `coords` to `matrix`."""
+        if coords.shape[1] == 0:
+            return
+        support = getattr(self.weight, "support", None)
+        if support is None:
+            self._predict_all_cells(matrix, coords, valid, sign, counts)
+        else:
+            self._predict_support(matrix, coords, valid, support, sign, counts)
+
+    def _to_prediction(self, matrix):
+        pred = predictors.GridPredictionArray(self.grid_size, self.grid_size,
+            matrix, self.region.xmin, self.region.ymin)
+        if self._masked_grid is not None:
+            pred.mask_with(self._masked_grid)
+        return pred
+
+    def _predict_all_cells(self, matrix, coords, valid, sign=1, counts=None):
+        gy, gx = _np.nonzero(valid)
+        if len(gx) == 0:
+            return
+        chunk = max(1, self._max_pairs // len(gx))
+        for start in range(0, coords.shape[1], chunk):
+            x, y = coords[0, start : start + chunk], coords[1, start : start + chunk]
+            shape = (len(x), len(gx))
+            self._accumulate(matrix, x, y, _np.broadcast_to(gx, shape),
+                _np.broadcast_to(gy, shape), sign, counts)
+
+    def _predict_support(self, matrix, coords, valid, support, sign=1, counts=None):
+        ysize, xsize = matrix.shape
+        r = int(_np.ceil(support / self.grid_size)) + 1
+        dx, dy = _np.meshgrid(_np.arange(-r, r+1), _np.arange(-r, r+1))
+        dx, dy = dx.ravel(), dy.ravel()
+        ex = _np.floor((coords[0] - self.region.xmin) / self.grid_size).astype(_np.int64)
+        ey = _np.floor((coords[1] - self.region.ymin) / self.grid_size).astype(_np.int64)
+        chunk = max(1, self._max_pairs // len(dx))
+        for start in range(0, coords.shape[1], chunk):
+            gx = ex[start : start + chunk, None] + dx[None, :]
+            gy = ey[start : start + chunk, None] + dy[None, :]
+            inside = (gx >= 0) & (gx < xsize) & (gy >= 0) & (gy < ysize)
+            inside[inside] = valid[gy[inside], gx[inside]]
+            rows, cols = _np.nonzero(inside)
+            x = coords[0, start : start + chunk][rows]
+            y = coords[1, start : start + chunk][rows]
+            self._accumulate(matrix, x, y, gx[rows, cols][:,None],
+                gy[rows, cols][:,None], sign, counts)
+
     def predict(self, start_time=None, end_time=None):
         """Produce a grid-based risk prediction over the optional time range.
 
@@ -165,12 +257,70 @@ class RetroHotSpotGrid(predictors.DataTrainer):
         """
         coords = _clip_data(self.data, start_time, end_time)
         xsize, ysize = self.region.grid_size(self.grid_size)
-        matrix = _np.empty((ysize, xsize))
-        for gridx in range(xsize):
-            x = gridx * self.grid_size + self.region.xmin + self.grid_size / 2
-            for gridy in range(ysize):
-                y = gridy * self.grid_size + self.region.ymin + self.grid_size / 2
-                matrix[gridy][gridx] = _np.sum(self.weight(
-                        x - coords[0], y - coords[1]))
-        return predictors.GridPredictionArray(self.grid_size, self.grid_size,
-            matrix, self.region.xmin, self.region.ymin)
\ No newline at end of file
+        matrix = _np.zeros((ysize, xsize))
+        self._add_events(matrix, coords, self._valid_cells(xsize, ysize))
+        return self._to_prediction(matrix)
+
+
+class RetroHotSpotGridIncremental():
+    """Makes a sequence of predictions with :class:`RetroHotSpotGrid` over a
+    sliding window of time, keeping a running total in each grid cell.  When
+    the window moves forward, only the events which have entered or left the
+    window are visited, so each step costs `O(changed events x cells in the
+    support of the weight)`.
+
+    Each call to :meth:`predict` gives the same prediction as calling
+    `predictor.predict` with the same arguments, up to floating point
+    rounding (cells with no contributing events are exactly zero).  If the
+    start or end of the window moves backwards, or the data or weight of the
+    predictor is changed, the totals are recomputed from scratch.
+
+    :param predictor: Instance of :class:`RetroHotSpotGrid` with the weight
+      and data already set.
+    """
+    def __init__(self, predictor):
+        self._predictor = predictor
+        self.reset()
+
+    @property
+    def predictor(self):
+        """The :class:`RetroHotSpotGrid` instance we use."""
+        return self._predictor
+
+    def reset(self):
+        """Forget the running totals, so the next prediction is computed from
+        scratch."""
+        self._state = None
+
+    def _window(self, start_time, end_time):
+        timestamps = self._predictor.data.timestamps
+        lo, hi = 0, len(timestamps)
+        if start_time is not None:
+            lo = _np.searchsorted(timestamps, _np.datetime64(start_time), side="left")
+        if end_time is not None:
+            hi = _np.searchsorted(timestamps, _np.datetime64(end_time), side="right")
+        return lo, max(lo, hi)
+
+    def predict(self, start_time=None, end_time=None):
+        """Produce a grid-based risk prediction over the optional time range.
+
+        :param start_time: If given, only use the data with a timestamp after
+          this time.
+        :param end_time: If given, only use the data with a timestamp before
+          this time.
+        """
+        p = self._predictor
+        lo, hi = self._window(start_time, end_time)
+        key = (p.data, p.weight)
+        if (self._state is None or any(a is not b for a, b in zip(self._state[0], key)) or
+                lo < self._state[1] or hi < self._state[2]):
+            xsize, ysize = p.region.grid_size(p.grid_size)
+            self._state = [key, lo, lo, _np.zeros((ysize, xsize)),
+                _np.zeros((ysize, xsize), dtype=_np.int64), p._valid_cells(xsize, ysize)]
+        _, old_lo, old_hi, matrix, counts, valid = self._state
+        coords = p.data.coords
+        p._add_events(matrix, coords[:, old_lo : min(lo, old_hi)], valid, -1, counts)
+        p._add_events(matrix, coords[:, max(lo, old_hi) : hi], valid, 1, counts)
+        matrix[counts == 0] = 0
+        self._state[1:3] = lo, hi
+        return p._to_prediction(matrix.copy())
@@ -21,8 +21,16 @@ from .processors import *
 
 from .. import data
 from .. import logger
-import logging, lzma, pickle, collections, datetime
+from .. import pool
+import logging, lzma, pickle, collections, datetime, io, os, struct
+import numpy
 from .. import geometry
+from .. import predictors
+
+try:
+    import fcntl as _fcntl
+except ImportError:
+    _fcntl = None
 
 logger.log_to_true_stdout()
 _logger = logging.getLogger(__name__)
@@ -38,10 +46,10 @@ class Data():
         points = point_provider()
         _logger.info("Loaded %s crime events, time range: %s", points.number_data_points, points.time_range)
         if start is not None:
-            points = points[points.timestamps >= start]
+            points = points.time_window(start_time=start)
             _logger.info("Restricted to events not before %s, leading %s events", start, points.number_data_points)
         if end is not None:
-            points = points[points.timestamps < end]
+            points = points.time_window(end_time=end)
             _logger.info("Restricted to events before %s, leading %s events", end, points.number_data_points)
         if grid is None:
             grid = data.Grid(150, 150, 0, 0)
@@ -64,6 +72,7 @@ class Data():
         self._processors = []
         self._prediction_cache = PredictionCache()
         self._prediction_notifiers = []
+        self._pool_settings = None
 
     def __enter__(self):
         return self
@@ -79,12 +88,15 @@ class Data():
         _logger.info("Have a total of %s prediction methods", len(self._predictors))
 
         try:
-            all_scores = dict()
-            pl = logger.ProgressLogger(len(self._predictors), datetime.timedelta(minutes=1), _logger, level=logging.INFO)
-            pl.message = "Total prediction tasks; completed %s / %s, time left: %s"
-            for predictor, time_range, class_type in self._predictors:
-                all_scores[predictor] = self._run_predictor(predictor, time_range, class_type), time_range
-                pl.increase_count()
+            if self._pool_settings is None:
+                all_scores = dict()
+                pl = logger.ProgressLogger(len(self._predictors), datetime.timedelta(minutes=1), _logger, level=logging.INFO)
+                pl.message = "Total prediction tasks; completed %s / %s, time left: %s"
+                for predictor, time_range, class_type in self._predictors:
+                    all_scores[predictor] = self._run_predictor(predictor, time_range, class_type), time_range
+                    pl.increase_count()
+            else:
+                all_scores = self._run_in_pool()
             
             for processor in self._processors:
                 _logger.info("Running processor %s", processor)
@@ -105,12 +117,7 @@ class Data():
         for start, end in times:
             if not self._prediction_cache.has(predictor, start):
                 _logger.debug("Making prediction for time %s", start)
-                if class_type == 0:
-                    pred = predictor.predict(start)
-                elif class_type == 1:
-                    pred = predictor.predict(start, end)
-                else:
-                    raise ValueError("Unsupported class type {}".format(class_type))
+                pred = _make_prediction(predictor, class_type, start, end)
                 self._prediction_cache.put(predictor, start, pred)
                 for watcher in self._prediction_notifiers:
                     watcher.notify(predictor, start, pred)
@@ -122,6 +129,65 @@ class Data():
 
         return scores
 
+    def _run_in_pool(self):
+        processes, filename, interval = self._pool_settings
+        return_predictions = len(self._prediction_notifiers) > 0
+        tasks = dict()
+        for index, (predictor, times, class_type) in enumerate(self._predictors):
+            for start, end in times:
+                task = _PredictionTask(index, class_type, start, end, return_predictions)
+                tasks[task.key] = task
+        _logger.info("Running %s prediction tasks in a process pool", len(tasks))
+        initargs = ([predictor for predictor, _, _ in self._predictors], self._evaluators)
+
+        if filename is None:
+            results = dict()
+            pl = logger.ProgressLogger(len(tasks), datetime.timedelta(minutes=1), _logger, level=logging.INFO)
+            pl.message = "Total prediction tasks; completed %s / %s, time left: %s"
+            with pool.PoolExecutor(processes, _init_worker, initargs) as executor:
+                futures = [executor.submit(task) for task in tasks.values()]
+                for key, result in pool.yield_task_results(futures):
+                    results[key] = result
+                    pl.increase_count()
+        else:
+            executor = pool.RestorableExecutor(filename, processes, _init_worker,
+                initargs, interval)
+            with executor:
+                for task in tasks.values():
+                    executor.submit(task)
+            results = executor.results
+
+        all_scores = dict()
+        for index, (predictor, times, _) in enumerate(self._predictors):
+            scores = {ev : list() for ev in self._evaluators}
+            for start, end in times:
+                task_scores, pred = results[(index, start, end)]
+                for evaluator, score in zip(self._evaluators, task_scores):
+                    scores[evaluator].append(score)
+                if pred is not None:
+                    for watcher in self._prediction_notifiers:
+                        watcher.notify(predictor, start, pred)
+            all_scores[predictor] = scores, times
+        return all_scores
+
+    def use_process_pool(self, processes=None, checkpoint_filename=None,
+            checkpoint_interval=datetime.timedelta(minutes=5)):
+        """Make and score the predictions using a pool of worker processes,
+        instead of sequentially.  The input events and grid are sent to each
+        worker once, when it starts, and scores are assembled in the same
+        order as a sequential run would give.  If predictions are being saved,
+        they are passed back to this process and saved here.
+
+        :param processes: The number of worker processes, or `None` to use the
+          number of CPUs.
+        :param checkpoint_filename: If not `None`, completed results are saved
+          to this file periodically, and on any error.  Running the same
+          script again will then only compute the missing predictions.  The
+          file should be deleted once it is no longer needed.
+        :param checkpoint_interval: How often to save to `checkpoint_filename`.
+        """
+        self._pool_settings = (processes, checkpoint_filename, checkpoint_interval)
+
     def add_prediction(self, prediction_provider, times):
         """Add a prediction method to be run
         
@@ -168,8 +234,8 @@ class Data():
         """Save the input data points, geometry (if applicable) and each
         prediction.
         
-        :param filename: Name of a file to save to.  Will be a `lzma`
-          compressed `pickle` file.
+        :param filename: Name of a file to save to.  See :class:`Saver` for
+          the file format.
         """
         saver = Saver(filename, self._points, self._geometry, self._grid)        
         self._prediction_notifiers.append(saver)
@@ -187,41 +253,242 @@ class Data():
 
 
 
+def _make_prediction(predictor, class_type, start, end):
+    if class_type == 0:
+        return predictor.predict(start)
+    if class_type == 1:
+        return predictor.predict(start, end)
+    raise ValueError("Unsupported class type {}".format(class_type))
+
+
+# Set in each worker process by `_init_worker`, so that the predictors (and
+# hence the input events and grid) are only pickled once per worker.
+_worker_state = None
+
+def _init_worker(predictors, evaluators):
+    global _worker_state
+    _worker_state = (predictors, evaluators)
+
+
+class _PredictionTask(pool.Task):
+    """Make one prediction in a worker process, and score it.  The key is
+    `(predictor_index, start, end)`."""
+    def __init__(self, predictor_index, class_type, start, end, return_prediction):
+        super().__init__((predictor_index, start, end))
+        self._class_type = class_type
+        self._return_prediction = return_prediction
+
+    def __call__(self):
+        predictors, evaluators = _worker_state
+        index, start, end = self.key
+        pred = _make_prediction(predictors[index], self._class_type, start, end)
+        scores = [evaluator.evaluate(pred, start, end) for evaluator in evaluators]
+        if not self._return_prediction:
+            pred = None
+        return scores, pred
+
+
+# Prediction archive file format.  The file starts with `_ARCHIVE_MAGIC`,
+# padded to `_ARCHIVE_ALIGNMENT` bytes, and is followed by a sequence of
+# records.  Each record is a fixed size prefix (kind, header length, data
+# length), a pickled header dictionary, and then a raw data chunk.  Header and
+# data are padded so that every record is a multiple of `_ARCHIVE_ALIGNMENT`
+# bytes long; thus data chunks are always aligned, whatever order records are
+# appended in.  Record kinds are:
+#   - "HEAD": data is the pickled input points, geometry and grid
+#   - "PRDR": data is the pickled predictor, header has its `repr`
+#   - "GRID": a :class:`GridPredictionArray`; data is the raw intensity
+#     matrix followed by the mask (if any)
+#   - "PICK": any other prediction; data is the pickled prediction
+_ARCHIVE_MAGIC = b"OPENCPPREDICTIONS1\n"
+_ARCHIVE_ALIGNMENT = 64
+_RECORD_PREFIX = struct.Struct("<4s4xQQ")
+
+def _padding(length):
+    return (-length) % _ARCHIVE_ALIGNMENT
+
+def _make_record(kind, header, data=b""):
+    header = pickle.dumps(header)
+    header_length = len(header) + _padding(_RECORD_PREFIX.size + len(header))
+    parts = [_RECORD_PREFIX.pack(kind, header_length, len(data)), header,
+        bytes(header_length - len(header)), data, bytes(_padding(len(data)))]
+    return b"".join(parts)
+
+def _time_key(time):
+    return numpy.datetime64(time, "us")
+
+
+class _ReferencePickler(pickle.Pickler):
+    """Pickles the input points, geometry and grid by reference, so that they
+    are not saved again with every predictor."""
+    def __init__(self, file, references):
+        super().__init__(file)
+        self._references = references
+
+    def persistent_id(self, obj):
+        for name, ref in self._references.items():
+            if ref is not None and obj is ref:
+                return name
+        return None
+
+
+class _ReferenceUnpickler(pickle.Unpickler):
+    def __init__(self, file, references):
+        super().__init__(file)
+        self._references = references
+
+    def persistent_load(self, pid):
+        return self._references[pid]
+
+
 class Saver():
-    def __init__(self, filename, points, geometry, grid):
-        self._file = lzma.open(filename, "wb")
-        pickle.dump(points, self._file)
-        pickle.dump(geometry, self._file)
-        pickle.dump(grid, self._file)
-        
+    """Save predictions to an archive file.  Each prediction is stored as a
+    separate record, with grid based predictions stored as raw arrays, so that
+    :class:`Loader` can read back individual predictions without loading the
+    whole file.
+
+    Each call to :meth:`notify` appends one complete record to the file,
+    holding an exclusive lock (where the platform supports this), so several
+    processes can each open a :class:`Saver` with `append=True` and write to
+    the same archive.
+
+    :param filename: Name of the file to write.
+    :param points: The input :class:`open_cp.data.TimedPoints`.
+    :param geometry: The geometry used, or `None`.
+    :param grid: The grid used for predictions.
+    :param append: If `True` then append to an existing archive, and do not
+      write `points`, `geometry` or `grid` again.  These are still used to
+      recognise when a predictor refers to them.  If the file does not exist,
+      or is empty, then a new archive is started.
+    """
+    def __init__(self, filename, points, geometry, grid, append=False):
+        self._references = {"points" : points, "geometry" : geometry, "grid" : grid}
+        self._saved_predictors = set()
+        if not append:
+            with open(filename, "wb") as file:
+                file.write(self._header())
+        # Always append, so that writes from other processes are not overwritten
+        self._file = open(filename, "ab")
+        if append and os.fstat(self._file.fileno()).st_size == 0:
+            self._write(self._header(), only_if_empty=True)
+
+    def _header(self):
+        refs = self._references
+        data = pickle.dumps((refs["points"], refs["geometry"], refs["grid"]))
+        return (_ARCHIVE_MAGIC + bytes(_padding(len(_ARCHIVE_MAGIC)))
+            + _make_record(b"HEAD", {}, data))
+
     def close(self):
         self._file.close()
-        
+
+    def _write(self, record, only_if_empty=False):
+        if _fcntl is not None:
+            _fcntl.flock(self._file.fileno(), _fcntl.LOCK_EX)
+        try:
+            # Check the size while holding the lock, so that only one process
+            # starts a new archive
+            if only_if_empty and os.fstat(self._file.fileno()).st_size > 0:
+                return
+            self._file.write(record)
+            self._file.flush()
+        finally:
+            if _fcntl is not None:
+                _fcntl.flock(self._file.fileno(), _fcntl.LOCK_UN)
+
+    def _predictor_record(self, predictor):
+        file = io.BytesIO()
+        _ReferencePickler(file, self._references).dump(predictor)
+        return _make_record(b"PRDR", {"predictor" : repr(predictor)}, file.getvalue())
+
+    def _prediction_record(self, predictor, time, prediction):
+        header = {"predictor" : repr(predictor), "time" : time}
+        if not isinstance(prediction, predictors.GridPredictionArray):
+            return _make_record(b"PICK", header, pickle.dumps(prediction))
+        matrix = prediction.intensity_matrix
+        header.update({"xsize" : prediction.xsize, "ysize" : prediction.ysize,
+            "xoffset" : prediction.xoffset, "yoffset" : prediction.yoffset,
+            "dtype" : numpy.asarray(matrix).dtype.str, "shape" : matrix.shape,
+            "masked" : numpy.ma.isMaskedArray(matrix)})
+        data = numpy.ascontiguousarray(numpy.ma.getdata(matrix)).tobytes()
+        if header["masked"]:
+            data += bytes(_padding(len(data)))
+            mask = numpy.ma.getmaskarray(matrix)
+            data += numpy.ascontiguousarray(mask).tobytes()
+        return _make_record(b"GRID", header, data)
+
     def notify(self, predictor, time, prediction):
-        pickle.dump((predictor, time, prediction), self._file)
+        record = b""
+        if repr(predictor) not in self._saved_predictors:
+            record = self._predictor_record(predictor)
+            self._saved_predictors.add(repr(predictor))
+        self._write(record + self._prediction_record(predictor, time, prediction))
         _logger.debug("Saving prediction for {}".format(time))
 
 
 LoadedPrediction = collections.namedtuple("LoadedPrediction", "predictor_class time prediction")
 
 class Loader():
-    """Use to load saved predictions.
-    
-    :param filename: The `lzma` compressed file to load.
+    """Use to load saved predictions.  The file is memory mapped, and only an
+    index of the predictions is read on construction; each prediction is
+    loaded when it is asked for.  The intensity matrices of grid based
+    predictions are read-only views onto the file.
+
+    Files in the older format, an `lzma` compressed stream of pickles, can
+    still be loaded, but are read completely into memory.
+
+    :param filename: The file to load.
     """
     def __init__(self, filename):
+        with open(filename, "rb") as f:
+            magic = f.read(len(_ARCHIVE_MAGIC))
+        if magic != _ARCHIVE_MAGIC:
+            self._load_legacy(filename)
+            return
+        self._buffer = numpy.memmap(filename, dtype=numpy.uint8, mode="r")
+        self._predictors = dict()
+        self._index = []
+        self._lookup = dict()
+        offset = len(_ARCHIVE_MAGIC) + _padding(len(_ARCHIVE_MAGIC))
+        while offset + _RECORD_PREFIX.size <= len(self._buffer):
+            kind, header, data_offset, data_length = self._read_record(offset)
+            offset = data_offset + data_length + _padding(data_length)
+            if kind == b"HEAD":
+                self._points, self._geometry, self._grid = pickle.loads(
+                    self._data(data_offset, data_length))
+            elif kind == b"PRDR":
+                if header["predictor"] not in self._predictors:
+                    self._predictors[header["predictor"]] = (data_offset, data_length)
+            else:
+                key = (header["predictor"], _time_key(header["time"]))
+                self._lookup[key] = len(self._index)
+                self._index.append((kind, header, data_offset, data_length))
+
+    def _read_record(self, offset):
+        end = offset + _RECORD_PREFIX.size
+        kind, header_length, data_length = _RECORD_PREFIX.unpack(self._data(offset, _RECORD_PREFIX.size))
+        header = pickle.loads(self._data(end, header_length))
+        return kind, header, end + header_length, data_length
+
+    def _data(self, offset, length):
+        return memoryview(self._buffer[offset : offset + length])
+
+    def _load_legacy(self, filename):
         with lzma.open(filename, "rb") as f:
             self._points = pickle.load(f)
             self._geometry = pickle.load(f)
             self._grid = pickle.load(f)
-            self._predictions = []
+            predictions = []
             while True:
                 try:
                     triple = pickle.load(f)
                 except EOFError:
                     break
-                self._predictions.append(triple)
-                
+                predictions.append(triple)
+        self._predictors = {repr(p) : p for p, _, _ in predictions}
+        self._index = [(None, {"predictor" : repr(p), "time" : t}, pred, None)
+            for p, t, pred in predictions]
+        self._lookup = {(repr(p), _time_key(t)) : i for i, (p, t, _) in enumerate(predictions)}
+
     @property
     def timed_points(self):
         """The loaded data"""
@@ -236,10 +503,61 @@ class Loader():
     def grid(self):
         """The grid object we used for making predictions."""
         return self._grid
-    
+
+    def _predictor(self, name):
+        predictor = self._predictors[name]
+        if isinstance(predictor, tuple):
+            references = {"points" : self._points, "geometry" : self._geometry,
+                "grid" : self._grid}
+            file = io.BytesIO(self._data(*predictor))
+            predictor = _ReferenceUnpickler(file, references).load()
+            self._predictors[name] = predictor
+        return predictor
+
+    def _prediction(self, kind, header, data_offset, data_length):
+        if kind is None:
+            return data_offset
+        if kind == b"PICK":
+            return pickle.loads(self._data(data_offset, data_length))
+        dtype = numpy.dtype(header["dtype"])
+        size = int(numpy.prod(header["shape"]))
+        matrix = self._buffer[data_offset : data_offset + size * dtype.itemsize]
+        matrix = matrix.view(dtype).reshape(header["shape"])
+        if header["masked"]:
+            offset = data_offset + size * dtype.itemsize
+            offset += _padding(size * dtype.itemsize)
+            mask = self._buffer[offset : offset + size].view(bool).reshape(header["shape"])
+            matrix = numpy.ma.masked_array(matrix, mask)
+        return predictors.GridPredictionArray(header["xsize"], header["ysize"],
+            matrix, header["xoffset"], header["yoffset"])
+
+    def _loaded(self, index):
+        kind, header, data_offset, data_length = self._index[index]
+        return LoadedPrediction(self._predictor(header["predictor"]), header["time"],
+            self._prediction(kind, header, data_offset, data_length))
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        """List of pairs `(predictor_name, time)` in the order saved, where
+        `predictor_name` is the `repr` of the predictor."""
+        return [(header["predictor"], header["time"]) for _, header, _, _ in self._index]
+
+    def get(self, predictor_name, time):
+        """Load a single prediction.
+
+        :param predictor_name: The `repr` of the predictor, as returned by
+          :meth:`keys`.
+        :param time: The time of the prediction.
+
+        :return: Instance of :class:`LoadedPrediction`
+        """
+        return self._loaded(self._lookup[(predictor_name, _time_key(time))])
+
     def __iter__(self):
-        for row in self._predictions:
-            yield LoadedPrediction(*row)
+        for index in range(len(self._index)):
+            yield self._loaded(index)
 
 
 class PredictionCache():
@@ -31,8 +31,7 @@ class HitRateEvaluator(EvaluatorBase):
         super().__init__()
 
     def evaluate(self, prediction, start, end):
-        mask = (self.data.timestamps >= start) & (self.data.timestamps < end)
-        points = self.data[mask]
+        points = self.data.time_window(start, end)
         coverages = list(range(1,101))
         return _evaluation.hit_rates(prediction, points, coverages)
 
@@ -44,7 +43,6 @@ class HitCountEvaluator(EvaluatorBase):
         super().__init__()
 
     def evaluate(self, prediction, start, end):
-        mask = (self.data.timestamps >= start) & (self.data.timestamps < end)
-        points = self.data[mask]
+        points = self.data.time_window(start, end)
         coverages = list(range(1,101))
         return _evaluation.hit_counts(prediction, points, coverages)
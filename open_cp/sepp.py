@@ -38,7 +38,9 @@ References
 
 from . import predictors
 from . import kernels
+from . import sepp_base as _sepp_base
 import numpy as _np
+import scipy.sparse as _sparse
 import logging as _logging
 
 def _normalise_matrix(p):
@@ -99,6 +101,55 @@ def p_matrix_fast(points, background_kernel, trigger_kernel, time_cutoff=150, sp
     p += _np.diag(background_kernel(points))
     return _normalise_matrix(p)
 
+def sparse_p_matrix(points, background_kernel, trigger_kernel, time_cutoff=None,
+        space_cutoff=None, chunk_size=100000):
+    """Computes the probability matrix as a sparse matrix.  As with
+    :func:`p_matrix_fast`, we ignore pairs of events beyond a space or time
+    cutoff, but only these pairs are ever stored, so memory usage is
+    proportional to the number of events times the typical number of
+    "neighbours" of each event.  Pairs are found using
+    :func:`sepp_base.neighbour_pairs`.
+
+    :param points: The (time, x, y) data, with times increasing.
+    :param background_kernel: The kernel giving the background event intensity.
+    :param trigger_kernel: The kernel giving the triggered event intensity.
+    :param time_cutoff: The maximum time between two events which can be
+      considered in the trigging calculation, or `None`.
+    :param space_cutoff: The maximum (two-dimensional Eucliean) distance
+      between two events which can be considered in the trigging calculation,
+      or `None`.
+    :param chunk_size: Evaluate the `trigger_kernel` on at most this many
+      pairs at once.
+
+    :return: A :class:`scipy.sparse.csc_matrix` with the same entries as
+      the matrix returned by :func:`p_matrix_fast`.
+    """
+    points = _np.asarray(points)
+    number_data_points = points.shape[-1]
+    rows, cols = _sepp_base.neighbour_pairs(points, time_cutoff, space_cutoff)
+    values = _np.empty(len(rows))
+    for start in range(0, len(rows), chunk_size):
+        end = start + chunk_size
+        values[start:end] = trigger_kernel(points[:, cols[start:end]] - points[:, rows[start:end]])
+    diag = _np.arange(number_data_points)
+    rows = _np.concatenate((rows, diag))
+    cols = _np.concatenate((cols, diag))
+    values = _np.concatenate((values, background_kernel(points)))
+    p = _sparse.csc_matrix((values, (rows, cols)),
+            shape=(number_data_points, number_data_points))
+    p.sort_indices()
+    return _sepp_base.normalise_p(p)
+
+def _initial_kernels(initial_time_bandwidth, initial_space_bandwidth):
+    def bkernel(pts):
+        return _np.zeros(pts.shape[-1]) + 1
+    def tkernel(pts):
+        time = _np.exp( - pts[0] / initial_time_bandwidth )
+        norm = 2 * initial_space_bandwidth ** 2
+        space = _np.exp( - (pts[1]**2 + pts[2]**2) / norm )
+        return time * space
+    return bkernel, tkernel
+
 def initial_p_matrix(points, initial_time_bandwidth = 0.1,
         initial_space_bandwidth = 50.0):
     """Returns an initial estimate of the probability matrix.  Uses a Gaussian
@@ -110,19 +161,24 @@ def initial_p_matrix(points, initial_time_bandwidth = 0.1,
     :param initial_time_bandwidth: The "scale" of the exponential.
     :param initial_space_bandwidth: The standard deviation of the Gaussian.
     """
-    def bkernel(pts):
-        return _np.zeros(pts.shape[-1]) + 1
-    def tkernel(pts):
-        time = _np.exp( - pts[0] / initial_time_bandwidth )
-        norm = 2 * initial_space_bandwidth ** 2
-        space = _np.exp( - (pts[1]**2 + pts[2]**2) / norm )
-        return time * space
+    bkernel, tkernel = _initial_kernels(initial_time_bandwidth, initial_space_bandwidth)
     return p_matrix(points, bkernel, tkernel)
 
+def initial_sparse_p_matrix(points, initial_time_bandwidth = 0.1,
+        initial_space_bandwidth = 50.0, time_cutoff=None, space_cutoff=None):
+    """As :func:`initial_p_matrix` but returns a sparse matrix, ignoring pairs
+    of events beyond the cutoffs.  See :func:`sparse_p_matrix`.
+    """
+    bkernel, tkernel = _initial_kernels(initial_time_bandwidth, initial_space_bandwidth)
+    return sparse_p_matrix(points, bkernel, tkernel, time_cutoff, space_cutoff)
+
 def _make_mask_choice(points, p):
     number_data_points = points.shape[-1]
-    choice = _np.array([ _np.random.choice(j+1, p=p[0:j+1, j])
-        for j in range(number_data_points) ])
+    if _sparse.issparse(p):
+        choice = _sepp_base.sparse_choice(p)
+    else:
+        choice = _np.array([ _np.random.choice(j+1, p=p[0:j+1, j])
+            for j in range(number_data_points) ])
     mask = ( choice == _np.arange(number_data_points) )
     return choice, mask    
 
@@ -130,7 +186,8 @@ def sample_points(points, p):
     """Using the probability matrix, sample background and triggered points.
 
     :param points: The (time, x, y) data.
-    :param p: The probability matrix.
+    :param p: The probability matrix; may be a dense array, or a sparse
+      matrix as returned by :func:`sparse_p_matrix`.
 
     :return: A pair of `(backgrounds, triggered)` where `backgrounds` is the
       `(time, x, y)` data of the points classified as being background events,
@@ -150,7 +207,8 @@ def sample_offsets(points, p):
     but can be useful in visualising what the algorithm is doing.
     
     :param points: The (time, x, y) data.
-    :param p: The probability matrix.
+    :param p: The probability matrix; may be a dense array, or a sparse
+      matrix as returned by :func:`sparse_p_matrix`.
 
     :return: A triple of `(backgrounds, triggered, trigger)` where `trigger`
       is the coordinates of the trigger for each `triggered` entry.
@@ -231,6 +289,10 @@ class StocasticDecluster():
       in units of minutes (so 120*24*60).
     :param points: The three dimensional data.  `points[0]` is the times of
       events, and `points[1]` and `points[2]` are the x and y coordinates.
+    :param sparse: If `True` then store the probability matrix as a sparse
+      matrix, see :func:`sparse_p_matrix`.  The initial matrix then also
+      respects the space and time cutoffs.  Recommended for more than a few
+      thousand events.  Default is `False`.
     """
     def __init__(self, background_kernel_estimator = None,
             trigger_kernel_estimator = None,
@@ -238,7 +300,7 @@ class StocasticDecluster():
             initial_space_bandwidth = 50.0,
             space_cutoff = 500.0,
             time_cutoff = 120 * (_np.timedelta64(1, "D") / _np.timedelta64(1, "m")),
-            points = None):
+            points = None, sparse = False):
         self.background_kernel_estimator = background_kernel_estimator
         self.trigger_kernel_estimator = trigger_kernel_estimator
         self.initial_time_bandwidth = initial_time_bandwidth
@@ -246,6 +308,7 @@ class StocasticDecluster():
         self.space_cutoff = space_cutoff
         self.time_cutoff = time_cutoff
         self.points = points
+        self.sparse = sparse
 
     def next_iteration(self, p):
         """Perform a single iteration of the optimisation algorithm:
@@ -275,12 +338,19 @@ class StocasticDecluster():
         number_triggered_events = number_events - number_background_events
         bkernel.set_scale(number_background_events)
         tkernel.set_scale(number_triggered_events / number_events)
-        pnew = p_matrix_fast(self.points, bkernel, tkernel,
-            time_cutoff = self.time_cutoff, space_cutoff = self.space_cutoff)
+        if self.sparse:
+            pnew = sparse_p_matrix(self.points, bkernel, tkernel,
+                time_cutoff = self.time_cutoff, space_cutoff = self.space_cutoff)
+        else:
+            pnew = p_matrix_fast(self.points, bkernel, tkernel,
+                time_cutoff = self.time_cutoff, space_cutoff = self.space_cutoff)
         return pnew, bkernel, tkernel
     
     def initial_p_matrix(self):
         """Return the initial "p matrix"."""
+        if self.sparse:
+            return initial_sparse_p_matrix(self.points, self.initial_time_bandwidth,
+                self.initial_space_bandwidth, self.time_cutoff, self.space_cutoff)
         return initial_p_matrix(self.points, self.initial_time_bandwidth, self.initial_space_bandwidth)
 
     def run_optimisation(self, iterations=20):
@@ -299,7 +369,10 @@ class StocasticDecluster():
         logger = _logging.getLogger(__name__)
         for iter in range(iterations):
             pnew, bkernel, tkernel = self.next_iteration(p)
-            errors.append(_np.sum((pnew - p) ** 2))
+            if self.sparse:
+                errors.append((pnew - p).power(2).sum())
+            else:
+                errors.append(_np.sum((pnew - p) ** 2))
             p = pnew
             logger.debug("Completed iteration %s", iter)
         kernel = make_kernel(self.points, bkernel, tkernel)
@@ -312,7 +385,8 @@ class OptimisationResult():
     """Contains results of the optimisation process.
 
     :param kernel: the overall estimated intensity kernel.
-    :param p: the estimated probability matrix.
+    :param p: the estimated probability matrix; a sparse matrix if the
+      optimisation was run with `sparse` set.
     :param background_kernel: the estimatede background event intensity kernel.
     :param trigger_kernel: the estimated triggered event intensity kernel.
     :param ell2_error: an array of the L^2 differences between successive
@@ -516,6 +590,7 @@ class SEPPTrainer(predictors.DataTrainer):
     def __init__(self, k_time=100, k_space=15):
         self.k_time = k_time
         self.k_space = k_space
+        self._sparse = False
         self._space_cutoff = 500
         self._time_cutoff = 120 * 24 * 60 # minutes
         self._trigger_kernel_estimator = kernels.KthNearestNeighbourGaussianKDE(self.k_space)
@@ -583,6 +658,19 @@ class SEPPTrainer(predictors.DataTrainer):
     def time_cutoff(self, value):
         self._time_cutoff = _np.timedelta64(value) / _np.timedelta64(1, "m")
 
+    @property
+    def sparse(self):
+        """Set to `True` to store the probability matrix as a sparse matrix
+        during optimisation, using the :attr:`space_cutoff` and
+        :attr:`time_cutoff`.  This reduces memory usage from quadratic in the
+        number of events to linear.  Default is `False`.
+        """
+        return self._sparse
+
+    @sparse.setter
+    def sparse(self, value):
+        self._sparse = bool(value)
+
     def as_time_space_points(self, cutoff_time=None):
         """Return a copy of the input data as an array of shape (3,N) of
         time/space points (without units), as used by the declustering
@@ -607,6 +695,7 @@ class SEPPTrainer(predictors.DataTrainer):
         decluster.initial_space_bandwidth = self.initial_space_bandwidth
         decluster.space_cutoff = self._space_cutoff
         decluster.time_cutoff = self._time_cutoff
+        decluster.sparse = self._sparse
         decluster.points = self.as_time_space_points(cutoff_time)
         return decluster
 
@@ -10,6 +10,8 @@ from . import predictors
 from . import logger as _ocp_logger
 from . import data as _ocp_data
 import numpy as _np
+import scipy.sparse as _sparse
+import scipy.spatial as _spatial
 import datetime as _datetime
 import logging as _logging
 _logger = _logging.getLogger(__name__)
@@ -358,11 +360,21 @@ def non_normalised_p_matrix(model, points):
     return p
 
 def normalise_p(p):
+    if _sparse.issparse(p):
+        return _normalise_sparse_p(p)
     norm = _np.sum(p, axis=0)[None,:]
     if _np.any(norm==0):
         raise ValueError("Zero column in p matrix", p)
     return p / norm
 
+def _normalise_sparse_p(p):
+    p = _sparse.csc_matrix(p, copy=True)
+    norm = _np.asarray(p.sum(axis=0)).ravel()
+    if _np.any(norm==0):
+        raise ValueError("Zero column in p matrix", p)
+    p.data /= _np.repeat(norm, _np.diff(p.indptr))
+    return p
+
 def p_matrix(model, points):
     """Compute the normalised "p" matrix.
     
@@ -372,6 +384,142 @@ def p_matrix(model, points):
     p = non_normalised_p_matrix(model, points)
     return normalise_p(p)
 
+def neighbour_pairs(points, time_cutoff=None, space_cutoff=None):
+    """Find all pairs of events `(i, j)` with `i < j` which are close enough
+    in space and time that event `i` could have triggered event `j`.  These
+    are the off-diagonal entries which are computed in a sparse "p" matrix.
+
+    If `space_cutoff` is set, then pairs are found using a k-d tree.  If
+    `time_cutoff` is set, then we use a sliding window over the times, which
+    must be increasing; with both set, blocks of events are searched in
+    space only against the events in their time window.
+
+    :param points: Usual array of shape `(3,N)`
+    :param time_cutoff: If not `None`, only return pairs with
+      `t_j - t_i <= time_cutoff`.
+    :param space_cutoff: If not `None`, only return pairs with spatial
+      distance `<= space_cutoff`.
+
+    :return: Pair `(rows, cols)` of arrays of indices, sorted by column and
+      then row.
+    """
+    points = _np.asarray(points)
+    number_data_points = points.shape[-1]
+    if space_cutoff is not None and time_cutoff is not None:
+        rows, cols = _space_time_pairs(points, time_cutoff, space_cutoff)
+    elif space_cutoff is not None:
+        tree = _spatial.cKDTree(points[1:].T)
+        pairs = tree.query_pairs(space_cutoff, output_type="ndarray").reshape((-1,2))
+        rows, cols = _np.min(pairs, axis=1), _np.max(pairs, axis=1)
+    else:
+        indices = _np.arange(number_data_points)
+        if time_cutoff is None:
+            starts = _np.zeros(number_data_points, dtype=_np.int64)
+        else:
+            starts = _np.searchsorted(points[0], points[0] - time_cutoff, side="left")
+            starts = _np.minimum(starts, indices)
+        lengths = indices - starts
+        cols = _np.repeat(indices, lengths)
+        offsets = _np.arange(len(cols)) - _np.repeat(_np.cumsum(lengths) - lengths, lengths)
+        rows = _np.repeat(starts, lengths) + offsets
+        if time_cutoff is not None:
+            mask = points[0, cols] - points[0, rows] <= time_cutoff
+            rows, cols = rows[mask], cols[mask]
+    order = _np.lexsort((rows, cols))
+    return rows[order], cols[order]
+
+def _space_time_pairs(points, time_cutoff, space_cutoff, block_size=1024):
+    """Pairs `(i, j)` with `i < j`, `t_j - t_i <= time_cutoff` and spatial
+    distance `<= space_cutoff`, for increasing times.  Each block of
+    `block_size` events is only compared, using k-d trees, against the
+    earlier events in its time window, so we never find, or store, pairs
+    which are close in space but not in time."""
+    times = points[0]
+    coords = points[1:].T
+    all_rows, all_cols, tree = [], [], None
+    for start in range(0, len(times), block_size):
+        end = min(start + block_size, len(times))
+        first = min(_np.searchsorted(times, times[start] - time_cutoff, side="left"), start)
+        block_tree = _spatial.cKDTree(coords[start:end])
+        if 2 * (end - first) > len(times):
+            # Cheaper to search every event than to keep building large trees
+            if tree is None:
+                tree = _spatial.cKDTree(coords)
+            window_tree, first = tree, 0
+        else:
+            window_tree = _spatial.cKDTree(coords[first:end])
+        pairs = block_tree.sparse_distance_matrix(window_tree, space_cutoff, output_type="ndarray")
+        cols, rows = pairs["i"] + start, pairs["j"] + first
+        mask = (rows < cols) & (times[cols] - times[rows] <= time_cutoff)
+        all_rows.append(rows[mask])
+        all_cols.append(cols[mask])
+    if len(all_rows) == 0:
+        return _np.empty(0, dtype=_np.int64), _np.empty(0, dtype=_np.int64)
+    return _np.concatenate(all_rows), _np.concatenate(all_cols)
+
+def non_normalised_sparse_p_matrix(model, points, time_cutoff=None, space_cutoff=None):
+    """As :func:`non_normalised_p_matrix` but only evaluates the trigger for
+    pairs of events found by :func:`neighbour_pairs`, and returns a
+    :class:`scipy.sparse.csc_matrix`.  Memory usage is proportional to the
+    number of events times the typical number of neighbours.
+    """
+    points = _np.asarray(points)
+    d = points.shape[1]
+    rows, cols = neighbour_pairs(points, time_cutoff, space_cutoff)
+    deltas = points[:, cols] - points[:, rows]
+    values = _np.zeros(len(rows))
+    m = deltas[0] > 0
+    splits = _np.searchsorted(cols, _np.arange(d + 1))
+    for i in _np.flatnonzero(_np.diff(splits)):
+        start, end = splits[i], splits[i+1]
+        mm = m[start:end]
+        if _np.any(mm):
+            values[start:end][mm] = model.trigger(points[:,i], deltas[:,start:end][:,mm])
+    diag = _np.arange(d)
+    rows = _np.concatenate((rows, diag))
+    cols = _np.concatenate((cols, diag))
+    values = _np.concatenate((values, model.background(points)))
+    p = _sparse.csc_matrix((values, (rows, cols)), shape=(d,d))
+    p.sort_indices()
+    return p
+
+def sparse_p_matrix(model, points, time_cutoff=None, space_cutoff=None):
+    """Compute the normalised "p" matrix as a sparse matrix, ignoring pairs
+    of events which are further apart than the cutoffs.  The trigger of the
+    model should be (close to) zero beyond these cutoffs.
+
+    :param model: Instance of :class:`ModelBase`
+    :param points: Data
+    :param time_cutoff: Maximum time between trigger and triggered event, or
+      `None`.
+    :param space_cutoff: Maximum distance between trigger and triggered
+      event, or `None`.
+
+    :return: Instance of :class:`scipy.sparse.csc_matrix`
+    """
+    p = non_normalised_sparse_p_matrix(model, points, time_cutoff, space_cutoff)
+    return normalise_p(p)
+
+def sparse_choice(p):
+    """For each column of the (normalised) sparse "p" matrix, randomly choose
+    a row, using the column as the probability distribution.
+
+    :param p: Sparse matrix, which will be converted to CSC format.
+
+    :return: Array of row indices, one for each column.
+    """
+    p = _sparse.csc_matrix(p)
+    counts = _np.diff(p.indptr)
+    if _np.any(counts == 0):
+        raise ValueError("Zero column in p matrix")
+    cumulative = _np.cumsum(p.data)
+    base = _np.concatenate(([0], cumulative))[p.indptr[:-1]]
+    totals = cumulative[p.indptr[1:] - 1] - base
+    targets = base + _np.random.random(len(counts)) * totals
+    index = _np.searchsorted(cumulative, targets, side="right")
+    index = _np.clip(index, p.indptr[:-1], p.indptr[1:] - 1)
+    return p.indices[index]
+
 def clamp_p(p, cutoff = 99.9):
     """For each column, set entries beyond the `cutoff` percentile to 0.
     """
@@ -386,14 +534,23 @@ def clamp_p(p, cutoff = 99.9):
 
 class Optimiser():
     """We cannot know all models and how to optimise them, but we provide some
-    helper routines."""
-    def __init__(self, model, points, make_p=True):
+    helper routines.
+
+    If either of `time_cutoff` or `space_cutoff` is set, then the "p" matrix
+    is computed and stored as a sparse matrix; see :func:`sparse_p_matrix`.
+    """
+    def __init__(self, model, points, make_p=True, time_cutoff=None, space_cutoff=None):
         self._logger = _logging.getLogger(__name__)
         self._model = model
         self._points = points
         if make_p:
-            self._p = _np.asarray( p_matrix(model, points) )
-            if _np.any(self._p < 0):
+            if time_cutoff is None and space_cutoff is None:
+                self._p = _np.asarray( p_matrix(model, points) )
+                values = self._p
+            else:
+                self._p = sparse_p_matrix(model, points, time_cutoff, space_cutoff)
+                values = self._p.data
+            if _np.any(values < 0):
                 raise ValueError("p should ve +ve")
         
     @property
@@ -416,6 +573,8 @@ class Optimiser():
     @property
     def p_diag(self):
         """The diagonal of the p matrix."""
+        if _sparse.issparse(self._p):
+            return self._p.diagonal()
         d = self._points.shape[1]
         return self._p[_np.diag_indices(d)]
     
@@ -425,15 +584,20 @@ class Optimiser():
     
     @property
     def p_upper_tri_sum(self):
-        out = 0.0
-        for i in range(1, self._p.shape[0]):
-            out += _np.sum(self._p[:i, i])
+        if _sparse.issparse(self._p):
+            out = _sparse.triu(self._p, k=1).sum()
+        else:
+            out = 0.0
+            for i in range(1, self._p.shape[0]):
+                out += _np.sum(self._p[:i, i])
         if abs(out) < 1e-10:
             #raise ValueError()
             self._logger.warn("p-matrix has become diagonal-- no repeat behaviour!")
         return out
     
     def upper_tri_col(self, col):
+        if _sparse.issparse(self._p):
+            return self._p[:col, col].toarray().ravel()
         return self._p[:col, col]
     
     def diff_col_times(self, col):
@@ -454,6 +618,11 @@ class Optimiser():
           `trigger` is the trigger index, and `triggered` if the (later) index
           of the event which is triggered.
         """
+        if _sparse.issparse(self._p):
+            choice = sparse_choice(self._p)
+            indices = _np.arange(len(choice))
+            mask = (choice == indices)
+            return indices[mask].tolist(), list(zip(choice[~mask].tolist(), indices[~mask].tolist()))
         bk, tr = [], []
         for i in range(self.num_points):
             j = _np.random.choice(i+1, p=self.p[:i+1,i])
@@ -204,6 +204,164 @@ def _make_cells(region, grid_size, events, times):
     return cells
 
 
+class FlatCells():
+    """Stores the times of events, grouped by grid cell, in one flat array:
+    the times for cell `k` (with cells numbered in row-major order) are
+    `times[offsets[k] : offsets[k+1]]`, in increasing order.  This is
+    equivalent to the object array returned by :func:`_make_cells`, but
+    allows computations over all cells at once.
+
+    :param times: One dimensional array of times, grouped by cell.
+    :param offsets: Array of length one more than the number of cells.
+    :param shape: The shape of the grid.
+    """
+    def __init__(self, times, offsets, shape):
+        self._times = _np.asarray(times, dtype=_np.float)
+        self._offsets = _np.asarray(offsets, dtype=_np.int64)
+        self._shape = tuple(shape)
+        if len(self._offsets) != int(_np.prod(self._shape)) + 1:
+            raise ValueError("Need one more offset than there are cells")
+        counts = _np.diff(self._offsets)
+        self._cell_index = _np.repeat(_np.arange(len(counts)), counts)
+        self._delta = _np.zeros_like(self._times)
+        self._delta[1:] = self._times[1:] - self._times[:-1]
+        self._delta[self._offsets[:-1][counts > 0]] = 0
+        self._rank_indices = self._make_rank_indices(counts)
+
+    def _make_rank_indices(self, counts):
+        """For each `k>=1`, the indices of events which are the `k`th event
+        in their cell (counting from 0)."""
+        order = _np.argsort(-counts, kind="stable")
+        starts, negative_counts = self._offsets[order], -counts[order]
+        rank_indices = []
+        for k in range(1, -negative_counts[0] if len(counts) > 0 else 0):
+            active = _np.searchsorted(negative_counts, -k, side="left")
+            rank_indices.append(starts[:active] + k)
+        return rank_indices
+
+    @staticmethod
+    def from_events(region, grid_size, events, times):
+        """Assign the events to grid cells.
+
+        :param region: The rectangular region the grid covers.
+        :param grid_size: The size of each (square) grid cell.
+        :param events: Object with `xcoords` and `ycoords` attributes.
+        :param times: Array of times of the events, in increasing order.
+
+        :raises ValueError: If any event falls outside the grid.
+        """
+        xsize, ysize = region.grid_size(grid_size)
+        xcs = _np.floor((_np.asarray(events.xcoords) - region.xmin) / grid_size).astype(_np.int)
+        ycs = _np.floor((_np.asarray(events.ycoords) - region.ymin) / grid_size).astype(_np.int)
+        outside = (xcs < 0) | (xcs >= xsize) | (ycs < 0) | (ycs >= ysize)
+        if _np.any(outside):
+            raise ValueError("{} events fall outside the grid of size {}x{}".format(
+                _np.sum(outside), xsize, ysize))
+        cell_index = ycs * xsize + xcs
+        order = _np.argsort(cell_index, kind="stable")
+        offsets = _np.zeros(xsize * ysize + 1, dtype=_np.int64)
+        offsets[1:] = _np.cumsum(_np.bincount(cell_index, minlength=xsize * ysize))
+        return FlatCells(_np.asarray(times)[order], offsets, (ysize, xsize))
+
+    @staticmethod
+    def from_cells(cells):
+        """Convert an array of arrays of times, as returned by
+        :func:`_make_cells`."""
+        cells = _np.asarray(cells)
+        lengths = [len(c) for c in cells.ravel()]
+        offsets = _np.zeros(len(lengths) + 1, dtype=_np.int64)
+        offsets[1:] = _np.cumsum(lengths)
+        times = [_np.asarray(c, dtype=_np.float) for c in cells.ravel()]
+        times = _np.concatenate(times) if len(times) > 0 else []
+        return FlatCells(times, offsets, cells.shape)
+
+    @property
+    def shape(self):
+        """The shape of the grid."""
+        return self._shape
+
+    @property
+    def times(self):
+        """The times of all events, grouped by cell."""
+        return self._times
+
+    @property
+    def offsets(self):
+        """The offsets into :attr:`times` of the start of each cell."""
+        return self._offsets
+
+    @property
+    def cell_index(self):
+        """For each entry of :attr:`times`, the (row-major) index of its
+        cell."""
+        return self._cell_index
+
+    @property
+    def counts(self):
+        """Array, of shape :attr:`shape`, of the number of events in each
+        cell."""
+        return _np.diff(self._offsets).reshape(self._shape)
+
+    def trigger_sums(self, omega):
+        """For each event `j`, compute
+        :math:`A_j = \\sum_{i<j} e^{-\\omega(t_j-t_i)}` and
+        :math:`B_j = \\sum_{i<j} (t_j-t_i) e^{-\\omega(t_j-t_i)}`, the sums
+        being over earlier events in the same cell.  Uses the recursions
+        :math:`A_j = e^{-\\omega\\Delta}(A_{j-1} + 1)` and
+        :math:`B_j = e^{-\\omega\\Delta}(B_{j-1} + \\Delta(A_{j-1}+1))`
+        where :math:`\\Delta = t_j - t_{j-1}`, processing all cells together.
+
+        :return: Pair `(A, B)` of arrays.
+        """
+        decay = _np.exp(-omega * self._delta)
+        a = _np.zeros_like(self._times)
+        b = _np.zeros_like(self._times)
+        for index in self._rank_indices:
+            previous = index - 1
+            a_plus_one = a[previous] + 1
+            a[index] = decay[index] * a_plus_one
+            b[index] = decay[index] * (b[previous] + self._delta[index] * a_plus_one)
+        return a, b
+
+
+def recursive_maximisation(cells, omega, theta, mu, time_duration, corrected=False):
+    """Perform an iteration of the EM algorithm, giving the same result as
+    :func:`maximisation` or :func:`maximisation_corrected`, but in time linear
+    in the number of events, using the recursive formula for sums of
+    exponentials, see :meth:`FlatCells.trigger_sums`.
+
+    :param cells: Instance of :class:`FlatCells`.
+    :param mu: An array, of shape `cells.shape`, giving the background rate in
+      each cell.
+    :param time_duration: The total time range of the data.
+    :param corrected: If `True` then apply edge corrections, as
+      :func:`maximisation_corrected`.
+
+    :return: Triple `(omega, theta, mu)` of new estimates.
+    """
+    mu = _np.asarray(mu, dtype=_np.float)
+    a, b = cells.trigger_sums(omega)
+    mus = mu.ravel()[cells.cell_index]
+    trigger = theta * omega * a
+    denominator = mus + trigger
+    upper_trianglar_sum = _np.sum(trigger / denominator)
+    weighted_upper_trianglar_sum = theta * omega * _np.sum(b / denominator)
+    diagonal_sums = _np.bincount(cells.cell_index, weights=mus / denominator,
+        minlength=mu.size)
+    event_count = len(cells.times)
+    if corrected:
+        dt = time_duration - cells.times
+        dtt = _np.exp(-omega * dt)
+        weighted_upper_trianglar_sum += theta * _np.sum(dt * dtt)
+        event_count -= _np.sum(dtt)
+
+    omega = upper_trianglar_sum / weighted_upper_trianglar_sum
+    theta = upper_trianglar_sum / event_count
+    mu = diagonal_sums.reshape(mu.shape) / time_duration
+
+    return (omega, theta, mu)
+
+
 class SEPPPredictor(predictors.DataTrainer):
     """Returned by :class:`SEPPTrainer` encapsulated computed background rates
     and triggering parameters.  This class allows these to be evaluated on
@@ -289,12 +447,14 @@ class SEPPTrainer(predictors.DataTrainer):
 
     def _make_cells(self, events):
         times = events.time_deltas(time_unit = _np.timedelta64(1, "m"))
-        cells = _make_cells(self.region, self.grid_size, events, times)
+        cells = FlatCells.from_events(self.region, self.grid_size, events, times)
         return cells, times[-1]
 
     def train(self, cutoff_time=None, iterations=20, use_corrected=False):
-        """Perform the (slow) training step on historical data.  This estimates
-        kernels, and returns an object which can make predictions.
+        """Perform the training step on historical data.  This estimates
+        kernels, and returns an object which can make predictions.  Each
+        iteration of the EM algorithm takes time linear in the number of
+        events, see :func:`recursive_maximisation`.
 
         :param cutoff_time: If specified, then limit the historical data to
           before this time.
@@ -306,21 +466,17 @@ class SEPPTrainer(predictors.DataTrainer):
         theta = 0.5
         # time unit of minutes, want mean to be a day
         omega = 1 / (60 * 24)
-        mu = _np.vectorize(len)(cells) / time_duration
+        mu = cells.counts / time_duration
+        for _ in range(iterations):
+            self._logger.debug("Iterating with omega=%s, theta=%s, mu=%s", omega, theta, mu)
+            omega, theta, mu = recursive_maximisation(cells, omega, theta, mu,
+                time_duration, corrected=use_corrected)
+            if not _np.all(_np.isfinite([omega, theta])) or not _np.all(_np.isfinite(mu)):
+                raise Exception("Convergence failed!")
         if use_corrected:
-            for _ in range(iterations):
-                self._logger.debug("Iterating with omega=%s, theta=%s, mu=%s", omega, theta, mu)
-                omega, theta, mu = maximisation_corrected(cells, omega, theta, mu, time_duration)
-                if not _np.all(_np.isfinite([omega, theta])) or not _np.all(_np.isfinite(mu)):
-                    raise Exception("Convergence failed!")
             self._logger.debug("Using edge-corrected algorithm, estimated omega=%s, theta=%s, mu=%s",
                                omega, theta, mu)
         else:
-            for _ in range(iterations):
-                self._logger.debug("Iterating with omega=%s, theta=%s, mu=%s", omega, theta, mu)
-                omega, theta, mu = maximisation(cells, omega, theta, mu, time_duration)
-                if not _np.all(_np.isfinite([omega, theta])) or not _np.all(_np.isfinite(mu)):
-                    raise Exception("Convergence failed!")
             self._logger.debug("Using quicker algorithm, estimated omega=%s, theta=%s, mu=%s",
                                omega, theta, mu)
 
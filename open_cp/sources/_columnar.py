@@ -0,0 +1,138 @@
+"""
+sources._columnar
+=================
+
+Helpers for streaming CSV files of events into typed `numpy` arrays, a chunk
+of rows at a time, so that large files can be loaded without building a
+Python object for every row.
+"""
+
+import csv as _csv
+import itertools as _itertools
+import numpy as _np
+from ..data import TimedPoints as _TimedPoints
+
+#: Default number of CSV rows to process at once.
+DEFAULT_CHUNK_SIZE = 100000
+
+def _lookup_columns(header, fields):
+    lookup = []
+    for field in fields:
+        if not field in header:
+            raise Exception("No field '{}' found in header".format(field))
+        lookup.append(header.index(field))
+    return lookup
+
+def iterate_chunks(file, description_field, x_field, y_field, time_field,
+        primary_description_names, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read a CSV file, a chunk of rows at a time, yielding only the columns
+    we need.
+
+    :param file: File-like object, open in text mode.
+    :param primary_description_names: Set of values of the description
+      field to keep, or `None` to keep all rows.
+    :param chunk_size: Maximum number of rows to hold at once.
+
+    :return: Generator yielding triples `(times, xs, ys)` of arrays of
+      (stripped) strings, for the rows which have the correct description,
+      and non-empty coordinates.
+    """
+    reader = _csv.reader(file)
+    description, x, y, t = _lookup_columns(next(reader),
+        [description_field, x_field, y_field, time_field])
+    while True:
+        rows = list(_itertools.islice(reader, chunk_size))
+        if len(rows) == 0:
+            return
+        if primary_description_names is not None:
+            rows = [row for row in rows if row[description].strip() in primary_description_names]
+        xs = _np.asarray([row[x].strip() for row in rows], dtype=_np.str_)
+        ys = _np.asarray([row[y].strip() for row in rows], dtype=_np.str_)
+        times = _np.asarray([row[t].strip() for row in rows], dtype=_np.str_)
+        valid = (xs != "") & (ys != "")
+        yield times[valid], xs[valid], ys[valid]
+
+def parse_times(strings, dt_convert):
+    """Convert an array of strings to an array of `datetime64`, calling the
+    Python function `dt_convert` once for each distinct string.
+    """
+    if len(strings) == 0:
+        return _np.empty(0, dtype="datetime64[ms]")
+    uniques, inverse = _np.unique(strings, return_inverse=True)
+    parsed = _np.asarray([dt_convert(s) for s in uniques], dtype="datetime64[ms]")
+    return parsed[inverse]
+
+_US_FORMAT = "00/00/0000 00:00:00 AM"
+
+def parse_us_times(strings, dt_convert):
+    """Convert an array of strings in the format "%m/%d/%Y %I:%M:%S %p" to an
+    array of `datetime64`, without calling Python code for each entry.  Any
+    strings not exactly in this format are passed to `dt_convert` (which
+    should raise an exception for invalid strings).
+    """
+    strings = _np.asarray(strings, dtype=_np.str_)
+    out = _np.empty(len(strings), dtype="datetime64[ms]")
+    width = len(_US_FORMAT)
+    fixed = _np.char.str_len(strings) == width if len(strings) > 0 else _np.zeros(0, dtype=bool)
+    codes = strings[fixed].astype("U{}".format(width)).view(_np.uint32).reshape((-1, width))
+    digits = codes.astype(_np.int64) - ord("0")
+
+    def number(start, length):
+        value = _np.zeros(len(digits), dtype=_np.int64)
+        for i in range(start, start + length):
+            value = value * 10 + digits[:,i]
+        return value
+
+    ok = _np.ones(len(codes), dtype=bool)
+    for i, c in enumerate(_US_FORMAT):
+        if c == "0":
+            ok &= (digits[:,i] >= 0) & (digits[:,i] <= 9)
+        elif c != "A":
+            ok &= codes[:,i] == ord(c)
+    pm = codes[:,20] == ord("P")
+    ok &= pm | (codes[:,20] == ord("A"))
+    month, day, year = number(0, 2), number(3, 2), number(6, 4)
+    hour, minute, second = number(11, 2), number(14, 2), number(17, 2)
+    ok &= (month >= 1) & (month <= 12) & (day >= 1) & (hour >= 1) & (hour <= 12)
+    ok &= (minute < 60) & (second < 60)
+    month = _np.where(ok, month, 1)
+    months = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    dates = months.astype("datetime64[D]") + (_np.where(ok, day, 1) - 1)
+    # Reject e.g. the 31st of April
+    ok &= dates.astype("datetime64[M]") == months
+    seconds = ((hour % 12 + 12 * pm) * 60 + minute) * 60 + second
+    times = dates.astype("datetime64[ms]") + seconds.astype("timedelta64[s]")
+
+    parsed = _np.empty(len(codes), dtype="datetime64[ms]")
+    parsed[ok] = times[ok]
+    others = _np.nonzero(fixed)[0][~ok]
+    parsed[~ok] = parse_times(strings[others], dt_convert)
+    out[fixed] = parsed
+    out[~fixed] = parse_times(strings[~fixed], dt_convert)
+    return out
+
+def load_timed_points(chunks, time_parser, scale=1):
+    """Convert the output of :func:`iterate_chunks` to a
+    :class:`TimedPoints` instance, sorting the data once (stably, so events
+    with the same timestamp remain in file order).
+
+    :param chunks: Iterable of triples of arrays of strings.
+    :param time_parser: Function which converts an array of strings to an
+      array of `datetime64`.
+    :param scale: Divide the coordinates by this.
+    """
+    all_times, all_xs, all_ys = [], [], []
+    for times, xs, ys in chunks:
+        all_times.append(time_parser(times))
+        all_xs.append(xs.astype(_np.float64))
+        all_ys.append(ys.astype(_np.float64))
+    if len(all_times) == 0:
+        return _TimedPoints.from_coords([], [], [])
+    times = _np.concatenate(all_times)
+    order = _np.argsort(times, kind="stable")
+    coords = _np.empty((2, len(times)))
+    coords[0] = _np.concatenate(all_xs)[order]
+    coords[1] = _np.concatenate(all_ys)[order]
+    if scale != 1:
+        coords /= scale
+    return _TimedPoints(times[order], coords)
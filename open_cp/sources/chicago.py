@@ -20,8 +20,7 @@ The crime type "HOMICIDE" is reported multiple times in the dataset.
 import csv as _csv
 import os.path as _path
 import datetime
-import numpy as _np
-from ..data import TimedPoints
+from . import _columnar
 
 _datadir = None
 _default_filename = "chicago.csv"
@@ -116,14 +115,6 @@ _FIELDS["all_other"] = dict(_FIELDS["all"])
 _FIELDS["all_other"]["DT_CONVERT"] = _date_from_other
         
 
-def _convert_header(header, dic):
-    lookup = dict()
-    for field in [dic["_DESCRIPTION_FIELD"], dic["_X_FIELD"], dic["_Y_FIELD"], dic["_TIME_FIELD"]]:
-        if not field in header:
-            raise Exception("No field '{}' found in header".format(field))
-        lookup[field] = header.index(field)
-    return lookup
-
 def default_burglary_data():
     """Load the default data, if available, giving just "THEFT" data.
 
@@ -140,24 +131,22 @@ def _get_dic(type):
     except KeyError:
         raise ValueError("Don't understand type {}".format(type))
 
-def _load_to_list(file, dic, primary_description_names):
-    reader = _csv.reader(file)
-    lookup = _convert_header(next(reader), dic)
+def _load_chunks(file, dic, primary_description_names, chunk_size):
+    return _columnar.iterate_chunks(file, dic["_DESCRIPTION_FIELD"],
+        dic["_X_FIELD"], dic["_Y_FIELD"], dic["_TIME_FIELD"],
+        primary_description_names, chunk_size)
+
+def _time_parser(dic):
     dt_convert = dic["DT_CONVERT"]
-    data = []
-    for row in reader:
-        description = row[lookup[dic["_DESCRIPTION_FIELD"]]].strip()
-        if not description in primary_description_names:
-            continue
-        x = row[lookup[dic["_X_FIELD"]]].strip()
-        y = row[lookup[dic["_Y_FIELD"]]].strip()
-        t = row[lookup[dic["_TIME_FIELD"]]].strip()
-        if x != "" and y != "":
-            data.append((dt_convert(t), float(x), float(y)))
-    return data
-
-def load(file, primary_description_names, to_meters=True, type="snapshot"):
-    """Load data from a CSV file in the expected format.
+    if dt_convert is _date_from_csv:
+        return lambda strings : _columnar.parse_us_times(strings, dt_convert)
+    return lambda strings : _columnar.parse_times(strings, dt_convert)
+
+def load(file, primary_description_names, to_meters=True, type="snapshot",
+        chunk_size=_columnar.DEFAULT_CHUNK_SIZE):
+    """Load data from a CSV file in the expected format.  The file is read in
+    chunks of rows, and only the rows of the requested crime types are kept,
+    converted to arrays of numbers and timestamps.
 
     :param file: Name of the CSV file load, or a file-like object.
     :param primary_description_names: Set of names to search for in the
@@ -166,27 +155,20 @@ def load(file, primary_description_names, to_meters=True, type="snapshot"):
     :param to_meters: Convert the coordinates to meters; True by default.
     :param type: Either "snapshot" or "all" depending on whether the data
       has headers conforming the the data "last year" or "2001 to present".
+    :param chunk_size: The maximum number of rows of the file to process at
+      once, which bounds the memory used beyond the returned data.
 
     :return: An instance of :class:`open_cp.data.TimedPoints` or `None`.
     """
     dic = _get_dic(type)
+    scale = _FEET_IN_METERS if to_meters else 1
 
     if isinstance(file, str):
         with open(file) as file:
-            data = _load_to_list(file, dic, primary_description_names)
-    else:
-        data = _load_to_list(file, dic, primary_description_names)
-
-    data.sort(key = lambda triple : triple[0])
-    xcoords = _np.empty(len(data))
-    ycoords = _np.empty(len(data))
-    for i, (_, x, y) in enumerate(data):
-        xcoords[i], ycoords[i] = x, y
-    times = [t for t, _, _ in data]
-    if to_meters:
-        xcoords /= _FEET_IN_METERS
-        ycoords /= _FEET_IN_METERS
-    return TimedPoints.from_coords(times, xcoords, ycoords)
+            chunks = _load_chunks(file, dic, primary_description_names, chunk_size)
+            return _columnar.load_timed_points(chunks, _time_parser(dic), scale)
+    chunks = _load_chunks(file, dic, primary_description_names, chunk_size)
+    return _columnar.load_timed_points(chunks, _time_parser(dic), scale)
 
 def _convert_header_for_geojson(header, dic):
     try:
@@ -15,11 +15,10 @@ non-uniquely identifying location) and geocoding resolves to the centre of
 streets.  Most importantly, all timestamps are only to a _monthly_ resolution.
 """
 
-import csv
 import os.path
 import datetime
 import numpy as np
-from ..data import TimedPoints
+from . import _columnar
 
 _default_filename = os.path.join(os.path.split(__file__)[0],"uk_police.csv")
 _DESCRIPTION_FIELD = 'Crime type'
@@ -31,14 +30,6 @@ def _date_from_csv(date_string):
     return datetime.datetime.strptime(date_string, "%Y-%m")
     raise Exception("This: '{}'".format(date_string))
 
-def _convert_header(header):
-    lookup = dict()
-    for field in [_DESCRIPTION_FIELD, _X_FIELD, _Y_FIELD, _TIME_FIELD]:
-        if not field in header:
-            raise Exception("No field '{}' found in header".format(field))
-        lookup[field] = header.index(field)
-    return lookup
-
 def default_burglary_data():
     """Load the default data, if available.
 
@@ -49,31 +40,24 @@ def default_burglary_data():
     except Exception:
         return None
 
-def load(filename, primary_description_names):
-    """Load data from a CSV file in the expected format.
+def load(filename, primary_description_names, chunk_size=_columnar.DEFAULT_CHUNK_SIZE):
+    """Load data from a CSV file in the expected format.  The file is read in
+    chunks of rows, and only the rows of the requested crime types are kept,
+    converted to arrays of numbers and timestamps.
 
     :param filename: Name of the CSV file load.
     :param primary_description_names: Set of names to search for in the
       "primary description field". E.g. pass `{"Burglary"}` to return only the
       "burglary" crime type.
+    :param chunk_size: The maximum number of rows of the file to process at
+      once, which bounds the memory used beyond the returned data.
 
     :return: An instance of :class:`open_cp.data.TimedPoints` or `None`.
     """
-    data = []
-
+    if len(primary_description_names) == 0:
+        primary_description_names = None
     with open(filename) as file:
-        reader = csv.reader(file)
-        lookup = _convert_header(next(reader))
-        for row in reader:
-            description = row[lookup[_DESCRIPTION_FIELD]].strip()
-            if len(primary_description_names) > 0 and not description in primary_description_names:
-                continue
-            x = row[lookup[_X_FIELD]].strip()
-            y = row[lookup[_Y_FIELD]].strip()
-            t = row[lookup[_TIME_FIELD]].strip()
-            if x != "" and y != "":
-                data.append((_date_from_csv(t), float(x), float(y)))
-
-    data.sort(key = lambda triple : triple[0])
-    return TimedPoints.from_coords([t for t, _, _ in data],
-        [x for _, x, _ in data], [y for _, _, y in data])
\ No newline at end of file
+        chunks = _columnar.iterate_chunks(file, _DESCRIPTION_FIELD, _X_FIELD,
+            _Y_FIELD, _TIME_FIELD, primary_description_names, chunk_size)
+        return _columnar.load_timed_points(chunks,
+            lambda strings : _columnar.parse_times(strings, _date_from_csv))
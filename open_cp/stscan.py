@@ -312,7 +312,25 @@ class STSTrainer(_STSTrainerBase):
         scanner.time_max_interval = self.time_max_interval / self._TIME_UNIT
         return scanner, time
 
-    def predict(self, time=None, max_clusters=None):
+    def monte_carlo_simulate(self, time=None, runs=999, processes=1):
+        """Perform a monte carlo simulation for the purposes of estimating 
+        p-values.  We repeatedly shuffle the timestamps of the data and then
+        find the statistic of the most likely cluster for each new dataset.
+        See :meth:`STScanNumpy.monte_carlo_simulate`; call `numpy.random.seed`
+        first for reproducible results.
+
+        :param time: Optionally restrict the data to before this time, as for
+          :method:`predict`
+        :param runs: The number of samples to take, by default 999
+        :param processes: The number of processes to use.  If 1 (the default)
+          then run in this process; if `None` then use one process per CPU.
+
+        :return: An ordered array of statistics.
+        """
+        scanner, _ = self.to_scanner(time)
+        return scanner.monte_carlo_simulate(runs, processes)
+
+    def predict(self, time=None, max_clusters=None, processes=1, monte_carlo_runs=None):
         """Make a prediction.
         
         :param time: Timestamp of the prediction point.  Only data up to this
@@ -321,6 +339,12 @@ class STSTrainer(_STSTrainerBase):
           important!)  If `None` then use the last timestamp of the data.
         :param max_clusters: If not `None` then return at most this many
           clusters.
+        :param processes: The number of processes to spread the scan over.  If
+          1 (the default) then run in this process; if `None` then use one
+          process per CPU.
+        :param monte_carlo_runs: If not `None`, then run this many monte carlo
+          simulations, see :meth:`monte_carlo_simulate`, and estimate a p-value
+          for each cluster.
         
         :return: A instance of :class:`STSResult` giving the found clusters.
         """
@@ -328,15 +352,21 @@ class STSTrainer(_STSTrainerBase):
         clusters = []
         time_regions = []
         stats = []
-        for cluster in scanner.find_all_clusters():
+        for cluster in scanner.find_all_clusters(processes):
             clusters.append(Cluster(cluster.centre, cluster.radius))
             start_time = time - cluster.time * self._TIME_UNIT
             time_regions.append((start_time, time))
             stats.append(cluster.statistic)
 
+        pvalues = None
+        if monte_carlo_runs is not None:
+            simulated = scanner.monte_carlo_simulate(monte_carlo_runs, processes)
+            pvalues = list(scanner.pvalues(stats, simulated))
+
         max_clusters = self.maximise_clusters(clusters, time)
         return STSResult(self.region, clusters, max_clusters,
-                         time_ranges=time_regions, statistics=stats)
+                         time_ranges=time_regions, statistics=stats,
+                         pvalues=pvalues)
 
 
 class STSTrainerSlow(_STSTrainerBase):
@@ -22,8 +22,10 @@ The classes here are useful for testing and verification.  The module
 """
 
 import numpy as _np
+import scipy.spatial as _spatial
 from collections import namedtuple as _nt
 import itertools as _itertools
+from . import pool as _pool
 
 class AbstractSTScan():
     """For testing and verification.  Coordinates are as usual, but timestamps
@@ -274,6 +276,41 @@ class SaTScanData():
                 yield int(i), int(count), int(t)
 
 
+_worker_state = None
+
+def _init_worker(*args):
+    global _worker_state
+    _worker_state = args
+
+
+class _ScanTask(_pool.Task):
+    def __init__(self, key, centres):
+        super().__init__(key)
+        self._centres = centres
+
+    def run(self, scanner, time_index, time_counts, times):
+        return list(scanner._scan_centres(self._centres, time_index, time_counts, times))
+
+    def __call__(self):
+        return self.run(*_worker_state)
+
+
+class _MonteCarloTask(_pool.Task):
+    def __init__(self, key, seed, size):
+        super().__init__(key)
+        self._seed = seed
+        self._size = size
+
+    def run(self, scanner, orderings, time_index, time_counts):
+        state = _np.random.RandomState(self._seed)
+        perms = [time_index[state.permutation(len(time_index))] for _ in range(self._size)]
+        perms = _np.asarray(perms, dtype=_np.int64).reshape((self._size, len(time_index)))
+        return scanner._max_statistics(orderings, perms, time_counts)
+
+    def __call__(self):
+        return self.run(*_worker_state)
+
+
 class STScanNumpy():
     """For testing and verification; numpy accelerated.
     Coordinates are as usual, but timestamps
@@ -297,6 +334,18 @@ class STScanNumpy():
         self.timestamps = self.timestamps[arg_sort]
         self.coords = self.coords[:,arg_sort]
 
+    def _time_ranges(self):
+        """As :meth:`make_time_ranges` but without the masks.
+
+        :return: Pair of counts and the cutoff used for each count.
+        """
+        unique_times = _np.unique(self.timestamps)
+        unique_times = unique_times[unique_times <= self.time_max_interval]
+        time_counts = _np.searchsorted(self.timestamps, unique_times, side="right")
+        limit = self.timestamps.shape[0] * self.time_population_limit
+        m = time_counts <= limit
+        return time_counts[m], unique_times[m]
+
     def make_time_ranges(self):
         """Compute the posssible time intervals.
         
@@ -305,16 +354,9 @@ class STScanNumpy():
           length k).  Hence `masks[:,i]` corresponds to `count[i]` is given by
           looking at event `<= cutoff[i]` before the end of time.
         """
-        unique_times = _np.unique(self.timestamps)
-        unique_times = unique_times[unique_times <= self.time_max_interval]
-        unique_times.sort()
+        time_counts, unique_times = self._time_ranges()
         time_masks = self.timestamps[:,None] <= unique_times[None,:]
-        
-        limit = self.timestamps.shape[0] * self.time_population_limit
-        time_counts = _np.sum(time_masks, axis=0)
-        m = time_counts <= limit
-        
-        return time_masks[:,m], time_counts[m], unique_times[m]
+        return time_masks, time_counts, unique_times
     
     def find_discs(self, centre):
         """Compute the possible disks.
@@ -433,6 +475,12 @@ class STScanNumpy():
 
     def _ma_statistics_lookup(self, space_counts, time_counts, stcounts, actual, _mask, N):
         # Faster version which uses lookup tables
+        stats = self._statistics_lookup(space_counts, time_counts, stcounts, actual, N)
+        return _np.ma.array(stats, mask=~_mask)
+
+    def _statistic_terms(self, space_counts, time_counts, stcounts, N):
+        """The parts of the log likelihood which do not depend on the actual
+        counts; uses lookup tables."""
         if self._cache_N != N:
             self._cache_N = N
             self._log_lookup = self._build_log_lookup(N)
@@ -442,12 +490,277 @@ class STScanNumpy():
                 self._log_lookup2 = self._build_log_lookup(N*N)
         sl = self._log_lookup[space_counts]
         tl = self._log_lookup[time_counts]
-        y = actual * (self._log_lookup[actual] - sl[:,None] - tl[None,:])
         if self._log_lookup2 is None:
-            yy = (N-actual) * (self._log_lookup[N-actual] - _np.log(N*N-stcounts))
+            return sl[:,None] + tl[None,:], _np.log(N*N-stcounts)
+        return sl[:,None] + tl[None,:], self._log_lookup2[N*N-stcounts]
+
+    def _statistics_lookup(self, space_counts, time_counts, stcounts, actual, N):
+        st_term, nn_term = self._statistic_terms(space_counts, time_counts, stcounts, N)
+        # In place, to save allocating temporary arrays
+        y = self._log_lookup[actual]
+        y -= st_term
+        y *= actual
+        yy = self._log_lookup[N-actual]
+        yy -= nn_term
+        yy *= N-actual
+        y += yy
+        y += N*_np.log(N)
+        return y
+
+    def unique_centres(self):
+        """The distinct coordinates of the events, in the order in which they
+        first occur.
+
+        :return: Array of shape `(2, M)`.
+        """
+        if self.coords.shape[1] == 0:
+            return self.coords
+        _, index = _np.unique(self.coords.T, axis=0, return_index=True)
+        return self.coords[:, _np.sort(index)]
+
+    def _make_tree(self):
+        """A k-d tree of the events, or `None` if there is no radius limit."""
+        if not _np.isfinite(self.geographic_radius_limit) or self.coords.shape[1] == 0:
+            return None
+        return _spatial.cKDTree(self.coords.T)
+
+    def _space_discs(self, centre, tree=None):
+        """Find the events in the possible discs about `centre`, without
+        forming masks.  Only the events within the radius limit (found using
+        `tree`, if not `None`), and of those, the nearest events up to the
+        population limit, are sorted.
+
+        :return: Tuple `(indices, disc_index, space_counts, dists)` where
+          `indices` are the events in the largest disc, sorted by distance,
+          `disc_index[j]` is the smallest disc containing event `indices[j]`,
+          and `space_counts` and `dists` are the number of events in, and the
+          radius squared of, each disc.
+        """
+        if tree is None:
+            indices = _np.arange(self.coords.shape[1])
         else:
-            yy = (N-actual) * (self._log_lookup[N-actual] - self._log_lookup2[N*N-stcounts])
-        return _np.ma.array(y + yy + N*_np.log(N), mask=~_mask)
+            # Slightly enlarge, as we test the distance exactly below
+            radius = self.geographic_radius_limit * (1 + 1e-9)
+            indices = _np.asarray(tree.query_ball_point(centre, radius), dtype=_np.int64)
+        distsq = _np.sum((self.coords[:,indices] - centre[:,None])**2, axis=0)
+        m = distsq <= self.geographic_radius_limit**2
+        indices, distsq = indices[m], distsq[m]
+        limit = self.timestamps.shape[0] * self.geographic_population_limit
+        size = int(_np.floor(limit)) + 1
+        if len(indices) > size:
+            # Any disc with more than `size` events is too large
+            part = _np.argpartition(distsq, size - 1)[:size]
+            indices, distsq = indices[part], distsq[part]
+        d = distsq
+        order = _np.argsort(d, kind="stable")
+        indices, d = indices[order], d[order]
+        dists, first = _np.unique(d, return_index=True)
+        space_counts = _np.append(first[1:], len(d))
+        disc_index = _np.repeat(_np.arange(len(dists)), _np.diff(_np.append(first, len(d))))
+        return indices, disc_index, space_counts, dists
+
+    def _centre_ordering(self, centre, tree=None):
+        """The possible discs about `centre`, which depend only on the
+        coordinates of the events, and so can be reused for any assignment of
+        timestamps to events.
+
+        :return: `None` if there are no possible discs, or a tuple
+          `(indices, disc_index, mask, space_counts, dists)` where `mask`
+          selects the allowed discs, and `space_counts` and `dists` are only
+          for the allowed discs.
+        """
+        limit = self.timestamps.shape[0] * self.geographic_population_limit
+        indices, disc_index, space_counts, dists = self._space_discs(centre, tree)
+        m = (space_counts > 1) & (space_counts <= limit)
+        if not _np.any(m):
+            return None
+        return indices, disc_index, m, space_counts[m], dists[m]
+
+    @staticmethod
+    def _actual_counts(ordering, time_index, k):
+        """Count the events in each allowed disc and time range.
+
+        :param ordering: As returned by :meth:`_centre_ordering`.
+        :param time_index: Array of shape `(B, N)` giving, for each of `B`
+          assignments of times to events, the index of the first time range
+          each event is in (or `k` for none).
+        :param k: The number of time ranges.
+
+        :return: Array of shape `(B, D, k)` where `D` is the number of allowed
+          discs.
+        """
+        indices, disc_index, m, _, _ = ordering
+        B, size = time_index.shape[0], len(m)
+        flat = (_np.arange(B)[:,None] * size + disc_index[None,:]) * (k + 1)
+        flat += time_index[:, indices]
+        actual = _np.bincount(flat.ravel(), minlength = B * size * (k + 1))
+        actual = actual.reshape((B, size, k + 1))
+        # In place, and along the contiguous time axis first, to save copies
+        _np.cumsum(actual, axis=2, out=actual)
+        _np.cumsum(actual, axis=1, out=actual)
+        return actual[:, m, :k]
+
+    def _score_centre(self, centre, time_index, time_counts, times, tree=None):
+        N = self.timestamps.shape[0]
+        ordering = self._centre_ordering(centre, tree)
+        if ordering is None or len(times) == 0:
+            return None
+        actual = self._actual_counts(ordering, time_index[None,:], len(times))[0]
+        space_counts, dists = ordering[3], ordering[4]
+
+        stcounts = space_counts[:,None] * time_counts[None,:]
+        _mask = (actual > 1) & (N * actual > stcounts)
+        _mask1 = _np.any(_mask, axis=1)
+        if not _np.any(_mask1):
+            return None
+        stats = self._statistics_lookup(space_counts, time_counts, stcounts, actual, N)
+        stats[~_mask] = -_np.inf
+        stats = stats[_mask1]
+        m = _np.argmax(stats, axis=1)
+        stats = stats[_np.arange(stats.shape[0]), m]
+        return centre, dists[_mask1], times[m], stats
+
+    def _max_statistics(self, orderings, time_index, time_counts):
+        """The largest statistic over all discs and times, for each row of
+        `time_index`, see :meth:`_actual_counts`."""
+        N = self.timestamps.shape[0]
+        best = _np.full(time_index.shape[0], -_np.inf)
+        if len(time_counts) == 0:
+            return best
+        B = time_index.shape[0]
+        for ordering in orderings:
+            actual = self._actual_counts(ordering, time_index, len(time_counts)).reshape((B, -1))
+            space_counts = ordering[3]
+            stcounts = (space_counts[:,None] * time_counts[None,:]).ravel()
+            # Only evaluate the statistic where it is defined
+            rows, cols = _np.nonzero((actual > 1) & (N * actual > stcounts[None,:]))
+            if len(rows) == 0:
+                continue
+            st_term, nn_term = self._statistic_terms(space_counts, time_counts,
+                stcounts.reshape((len(space_counts), -1)), N)
+            actual = actual[rows, cols]
+            stats = actual * (self._log_lookup[actual] - st_term.ravel()[cols])
+            stats += (N-actual) * (self._log_lookup[N-actual] - nn_term.ravel()[cols])
+            stats += N * _np.log(N)
+            starts = _np.searchsorted(rows, _np.arange(B))
+            has_any = starts < _np.append(starts[1:], len(rows))
+            maxes = _np.maximum.reduceat(stats, starts[has_any])
+            best[has_any] = _np.maximum(best[has_any], maxes)
+        return best
+
+    def _scan_centres(self, centres, time_index, time_counts, times):
+        tree = self._make_tree()
+        for centre in centres.T:
+            result = self._score_centre(centre, time_index, time_counts, times, tree)
+            if result is not None:
+                yield result
+
+    # Number of centres to send to a worker process in one task
+    _centres_per_task = 500
+
+    def scan_all(self, processes=1):
+        """As :meth:`faster_score_all` but with a faster engine, which never
+        forms masks of events, and which only considers each distinct centre
+        once.  The events within the radius limit of each centre are found
+        with a k-d tree and sorted by distance, and counts
+        of events in space/time regions computed as cumulative sums.  Yields
+        tuples (centre, distance_array, time_array, statistic_array).
+
+        :param processes: The number of processes to spread the centres over.
+          If 1 (the default) then run in this process; if `None` then use one
+          process per CPU.
+        """
+        time_counts, times = self._time_ranges()
+        time_index = _np.searchsorted(times, self.timestamps, side="left")
+        centres = self.unique_centres()
+        if processes == 1:
+            yield from self._scan_centres(centres, time_index, time_counts, times)
+            return
+
+        size = self._centres_per_task
+        tasks = [_ScanTask(i, centres[:, i:i+size]) for i in range(0, centres.shape[1], size)]
+        results = dict()
+        worker_state = (self, time_index, time_counts, times)
+        with _pool.PoolExecutor(processes, _init_worker, worker_state) as executor:
+            futures = [executor.submit(task) for task in tasks]
+            for key, result in _pool.yield_task_results(futures):
+                results[key] = result
+        for task in tasks:
+            yield from results[task.key]
+
+    # Rough memory budget, in bytes, for each batch of replicates, which is
+    # also the unit of work sent to a worker process
+    _batch_bytes = 2**27
+
+    def _batch_size(self, orderings, k):
+        """The number of replicates to process together, so that the working
+        arrays of :meth:`_max_statistics`, which for each disc ordering hold
+        a count for every replicate, disc and time range, take up about
+        `_batch_bytes` bytes."""
+        per_replicate = len(self.timestamps)
+        if len(orderings) > 0:
+            per_replicate += max(len(o[0]) + 6 * len(o[2]) * (k + 1) for o in orderings)
+        return max(1, self._batch_bytes // (8 * per_replicate))
+
+    def monte_carlo_simulate(self, runs=999, processes=1):
+        """Perform a monte carlo simulation for the purposes of estimating
+        p-values.  We repeatedly shuffle the timestamps of the data and then
+        find the statistic of the most likely cluster for each new dataset.
+        The discs about each centre are found once and reused for every
+        replicate, and replicates are processed in batches, whose size is
+        chosen to bound the memory used.
+
+        Each batch uses a seed drawn, in advance, from `numpy.random`, so the
+        result can be made reproducible by calling `numpy.random.seed`, and
+        does not depend on the number of processes.
+
+        :param runs: The number of samples to take, by default 999
+        :param processes: The number of processes to use.  If 1 (the default)
+          then run in this process; if `None` then use one process per CPU.
+
+        :return: An ordered array of statistics.
+        """
+        time_counts, times = self._time_ranges()
+        time_index = _np.searchsorted(times, self.timestamps, side="left")
+        tree = self._make_tree()
+        orderings = [self._centre_ordering(centre, tree) for centre in self.unique_centres().T]
+        orderings = [o for o in orderings if o is not None]
+
+        size = self._batch_size(orderings, len(time_counts))
+        tasks = []
+        for key, start in enumerate(range(0, runs, size)):
+            tasks.append(_MonteCarloTask(key, _np.random.randint(2**31), min(size, runs - start)))
+        worker_state = (self, orderings, time_index, time_counts)
+        if processes == 1:
+            batches = [task.run(*worker_state) for task in tasks]
+        else:
+            results = dict()
+            with _pool.PoolExecutor(processes, _init_worker, worker_state) as executor:
+                futures = [executor.submit(task) for task in tasks]
+                for key, result in _pool.yield_task_results(futures):
+                    results[key] = result
+            batches = [results[task.key] for task in tasks]
+        if len(batches) == 0:
+            return _np.empty(0)
+        stats = _np.concatenate(batches)
+        stats.sort()
+        return stats
+
+    @staticmethod
+    def pvalues(statistics, simulated):
+        """Estimate the p-value of each statistic, from the output of
+        :meth:`monte_carlo_simulate`, as the proportion of the observed and
+        simulated datasets with at least as large a statistic.
+
+        :param statistics: Array of statistics of found clusters.
+        :param simulated: Ordered array of simulated statistics.
+
+        :return: Array of p-values.
+        """
+        statistics = _np.asarray(statistics, dtype=_np.float)
+        simulated = _np.asarray(simulated)
+        at_least = len(simulated) - _np.searchsorted(simulated, statistics, side="left")
+        return (at_least + 1) / (len(simulated) + 1)
 
     def faster_score_all_old(self):
         """As :method:`score_all` but yields tuples (centre, distance_array,
@@ -490,14 +803,18 @@ class STScanNumpy():
 
     Result = _nt("Result", ["centre", "radius", "time", "statistic"])
         
-    def find_all_clusters(self):
+    def find_all_clusters(self, processes=1):
+        """Find all the disjoint clusters from most to least significant,
+        using :meth:`scan_all`.
+
+        :param processes: The number of processes to use, see
+          :meth:`scan_all`.
+        """
         scores = []
-        count = 0
-        for centre, dists, times, stats in self.faster_score_all():
+        for centre, dists, times, stats in self.scan_all(processes):
             dists = _np.sqrt(dists)
             scores.extend(zip(_itertools.repeat(centre[0]),
                             _itertools.repeat(centre[1]), dists, times, stats))
-            count += 1
         if len(scores) == 0:
             return
         scores = _np.asarray(scores)
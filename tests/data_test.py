@@ -266,6 +266,100 @@ def test_TimedPoints_bin(timedpoints):
     np.testing.assert_allclose(ts.coords, timedpoints.coords)
 
 
+def test_TimedPoints_slices_are_views(timedpoints):
+    tp = timedpoints[1:4]
+    assert np.shares_memory(tp.coords, timedpoints.coords)
+    np.testing.assert_equal(tp.timestamps, timedpoints.timestamps[1:4])
+    tp = timedpoints.events_before(datetime.datetime(2017,1,3,0,0))
+    assert tp.number_data_points == 3
+    assert np.shares_memory(tp.timestamps, timedpoints.timestamps)
+
+def test_TimedPoints_reversed_slice(timedpoints):
+    expected = timedpoints.timestamps.copy()
+    tp = timedpoints[::-1]
+    np.testing.assert_equal(tp.timestamps, expected)
+    np.testing.assert_equal(timedpoints.timestamps, expected)
+
+def test_TimedPoints_time_window(timedpoints):
+    tp = timedpoints.time_window(datetime.datetime(2017,1,2,14,23), datetime.datetime(2017,1,3,4,5))
+    np.testing.assert_equal(tp.timestamps, timedpoints.timestamps[1:3])
+    np.testing.assert_equal(tp.coords, timedpoints.coords[:,1:3])
+    assert np.shares_memory(tp.coords, timedpoints.coords)
+    tp = timedpoints.time_window(datetime.datetime(2017,1,2,14,23),
+        datetime.datetime(2017,1,3,4,5), include_end=True)
+    np.testing.assert_equal(tp.timestamps, timedpoints.timestamps[1:4])
+    assert timedpoints.time_window(end_time=datetime.datetime(2017,1,1)).empty
+    assert timedpoints.time_window(start_time=datetime.datetime(2017,1,3)).number_data_points == 3
+    assert timedpoints.time_window(datetime.datetime(2017,1,4), datetime.datetime(2017,1,3)).empty
+    assert timedpoints.time_window_indices(datetime.datetime(2017,1,3)) == (2, 5)
+
+def test_TimedPoints_time_slices(timedpoints):
+    import open_cp.scripted.preds as preds
+    time_range = preds.TimeRange(datetime.datetime(2017,1,2), datetime.datetime(2017,1,5),
+        datetime.timedelta(days=1))
+    slices = list(timedpoints.time_slices(time_range))
+    assert [(s, e) for s, e, _ in slices] == list(time_range)
+    for start, end, tp in slices:
+        mask = (timedpoints.timestamps >= start) & (timedpoints.timestamps < end)
+        np.testing.assert_equal(tp.timestamps, timedpoints.timestamps[mask])
+        np.testing.assert_equal(tp.coords, timedpoints.coords[:,mask])
+    assert [tp.number_data_points for _, _, tp in slices] == [2, 2, 1]
+    assert list(timedpoints.time_slices([])) == []
+
+
+def test_TimeStamps_time_window(timedpoints):
+    times = open_cp.data.TimeStamps(timedpoints.timestamps)
+    window = times.time_window(datetime.datetime(2017,1,2,14,23), datetime.datetime(2017,1,3,4,5))
+    assert isinstance(window, open_cp.data.TimeStamps)
+    np.testing.assert_equal(window.timestamps, times.timestamps[1:3])
+    assert np.shares_memory(window.timestamps, times.timestamps)
+    assert times[2] == times.timestamps[2]
+    np.testing.assert_equal(times[::-1].timestamps, times.timestamps)
+    import open_cp.scripted.preds as preds
+    time_range = preds.TimeRange(datetime.datetime(2017,1,2), datetime.datetime(2017,1,5),
+        datetime.timedelta(days=1))
+    assert [len(w.timestamps) for _, _, w in times.time_slices(time_range)] == [2, 2, 1]
+
+def test_save_load_timed_points(timedpoints, tmpdir):
+    path = str(tmpdir.join("store"))
+    open_cp.data.save_timed_points(timedpoints, path)
+    for mmap in [True, False]:
+        tp = open_cp.data.load_timed_points(path, mmap=mmap)
+        np.testing.assert_equal(tp.timestamps, timedpoints.timestamps)
+        np.testing.assert_equal(tp.coords, timedpoints.coords)
+        np.testing.assert_equal(tp.xcoords, timedpoints.xcoords)
+
+    tp = open_cp.data.load_timed_points(path)
+    assert isinstance(tp.timestamps, np.memmap)
+    before = tp.events_before(datetime.datetime(2017,1,3,0,0))
+    assert np.shares_memory(before.coords, tp.coords)
+    np.testing.assert_equal(before.coords, timedpoints.coords[:,:3])
+    binned = tp.bin_timestamps(datetime.datetime(2017,1,1), datetime.timedelta(days=1))
+    assert np.shares_memory(binned.coords, tp.coords)
+    np.testing.assert_allclose(binned.time_deltas(np.timedelta64(1,"h")), [0,0,24,24,48])
+
+def test_append_timed_points(timedpoints, tmpdir):
+    path = str(tmpdir.join("store"))
+    open_cp.data.save_timed_points(timedpoints[:2], path)
+    open_cp.data.append_timed_points(path, timedpoints[2:4])
+    open_cp.data.append_timed_points(path, timedpoints[4:])
+    tp = open_cp.data.load_timed_points(path)
+    np.testing.assert_equal(tp.timestamps, timedpoints.timestamps)
+    np.testing.assert_equal(tp.coords, timedpoints.coords)
+
+    with pytest.raises(ValueError):
+        open_cp.data.append_timed_points(path, timedpoints[:1])
+    assert open_cp.data.load_timed_points(path).number_data_points == 5
+
+def test_save_load_empty_timed_points(tmpdir):
+    path = str(tmpdir.join("store"))
+    open_cp.data.save_timed_points(TimedPoints([], [[],[]]), path)
+    assert open_cp.data.load_timed_points(path).empty
+    open_cp.data.append_timed_points(path, a_valid_TimedPoints())
+    np.testing.assert_equal(open_cp.data.load_timed_points(path).coords,
+        a_valid_TimedPoints().coords)
+
+
 def test_project_from_lon_lat():
     tp = TimedPoints([np.datetime64("2016-12")], [[-1.5],[50]])
     tp1 = open_cp.data.points_from_lon_lat(tp, epsg=7405)
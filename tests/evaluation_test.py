@@ -5,6 +5,7 @@ import open_cp.evaluation as evaluation
 import open_cp.predictors
 import open_cp.data
 import open_cp.network
+import open_cp.geometry
 import open_cp.retrohotspot
 import numpy as np
 import scipy.special
@@ -123,6 +124,24 @@ def test_hit_rate_out_of_range(prediction):
     out = evaluation.hit_rates(prediction, tp, {1, 5, 100})
     assert set(out.values()) == {0}
     
+def test_hit_count_curve_matches_top_slice():
+    state = np.random.RandomState(3)
+    matrix = state.randint(0, 5, size=(7, 9))
+    mask = state.random_sample(size=(7, 9)) < 0.2
+    matrix = np.ma.array(matrix, mask=mask)
+    pred = open_cp.predictors.GridPredictionArray(xsize=10, ysize=10, matrix=matrix)
+    x = state.random_sample(200) * 100 - 5
+    y = state.random_sample(200) * 80 - 5
+    tp = open_cp.data.TimedPoints.from_coords([np.datetime64("2017-01-01")] * 200, x, y)
+    coverages = list(range(0, 101))
+    counts, total = evaluation.hit_count_curve(pred, tp, coverages)
+    assert total == 200
+    gx, gy = pred.grid_coord(x, y)
+    inside = (gx >= 0) & (gx < 9) & (gy >= 0) & (gy < 7)
+    for coverage, count in zip(coverages, counts):
+        covered = evaluation.top_slice(matrix, coverage / 100)
+        assert count == np.sum(covered[gy[inside], gx[inside]])
+
 @pytest.fixture
 def masked_prediction():
     mask = [[True, False, False, False], [True, True, False, True]]
@@ -541,6 +560,72 @@ def test_grid_risk_coverage_to_graph_cutoff(prediction):
     assert g.number_edges == 1
     assert g.edges[0] == (0, 1)
 
+def test_grid_risk_coverage_to_graph_many_cells(prediction):
+    b = open_cp.network.PlanarGraphBuilder()
+    b.add_vertex(5, 10)
+    b.add_vertex(40, 10)
+    b.add_vertex(15, 30)
+    b.add_vertex(17, 35)
+    b.add_edge(0, 1)
+    b.add_edge(2, 3)
+    graph = b.build()
+
+    g = evaluation.grid_risk_coverage_to_graph(prediction, graph, 100)
+    assert g.edges == [(0, 1), (2, 3)]
+    g = evaluation.grid_risk_coverage_to_graph(prediction, graph, 100, 0.25)
+    assert g.edges == [(0, 1), (2, 3)]
+    g = evaluation.grid_risk_coverage_to_graph(prediction, graph, 100, 0.3)
+    assert g.edges == [(2, 3)]
+    g = evaluation.grid_risk_coverage_to_graph(prediction, graph, 25)
+    assert g.number_edges == 0
+    g = evaluation.grid_risk_coverage_to_graph(prediction, graph, 50)
+    assert g.edges == [(2, 3)]
+    g = evaluation.grid_risk_coverage_to_graph(prediction, graph, 76)
+    assert g.edges == [(0, 1), (2, 3)]
+
+def test_graph_grid_overlap(prediction):
+    b = open_cp.network.PlanarGraphBuilder()
+    b.add_vertex(-3, 10)
+    b.add_vertex(27, 10)
+    b.add_vertex(15, 30)
+    b.add_vertex(17, 35)
+    b.add_edge(0, 1)
+    b.add_edge(2, 3)
+    graph = b.build()
+
+    overlap = evaluation.graph_grid_overlap(graph, prediction)
+    assert evaluation.graph_grid_overlap(graph, prediction) is overlap
+    np.testing.assert_array_equal(overlap.edges, [0, 0, 0, 0, 1])
+    np.testing.assert_array_equal(overlap.gx, [-1, 0, 1, 2, 1])
+    np.testing.assert_array_equal(overlap.gy, [0, 0, 0, 0, 1])
+    np.testing.assert_allclose(overlap.t2 - overlap.t1, [1/6, 1/3, 1/3, 1/6, 1])
+    gx, gy = overlap.most()
+    np.testing.assert_array_equal(gx, [0, 1])
+    np.testing.assert_array_equal(gy, [0, 1])
+
+    matrix = overlap.matrix(4, 2).toarray()
+    np.testing.assert_allclose(matrix, [[1/3, 1/3, 1/6, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 1, 0, 0]])
+
+def test_graph_grid_overlap_most_random_graph():
+    rng = np.random.RandomState(5)
+    grid = open_cp.data.Grid(10, 10, 0, 0)
+    b = open_cp.network.PlanarGraphBuilder()
+    for _ in range(300):
+        b.add_vertex(*(rng.random_sample(2) * 100))
+    for i in range(150):
+        b.add_edge(2*i, 2*i+1)
+    graph = b.build()
+
+    gx, gy = evaluation.GraphGridOverlap(graph, grid).most()
+    for e, (k1, k2) in enumerate(graph.edges):
+        line = (graph.vertices[k1], graph.vertices[k2])
+        _, intervals = open_cp.geometry.full_intersect_line_grid(line, grid)
+        lengths = np.asarray([t2 - t1 for _, _, t1, t2 in intervals])
+        # Crossings of whole cells are tied; take the first along the edge
+        first = np.flatnonzero(lengths >= lengths.max() * (1 - 1e-9))[0]
+        assert (gx[e], gy[e]) == tuple(intervals[first][:2])
+
 @pytest.fixture
 def network_points():
     times = [np.datetime64("2017-01-01")] * 3
@@ -806,4 +891,54 @@ def test_STScanProvider(mock_provider, timed_pts_10):
     pred1 = prov1.predict(datetime.datetime(2017,2,3))
     assert mock_provider.call_count == 1
     assert pred1 is stresult.grid_prediction.return_value.renormalise.return_value
-    
\ No newline at end of file
+    
+def test_batch_scores():
+    state = np.random.RandomState(7)
+    mask = state.random_sample(size=(6, 8)) < 0.2
+    edges = np.datetime64("2017-01-01") + np.arange(5) * np.timedelta64(1, "D")
+    grid = open_cp.data.MaskedGrid(xsize=10, ysize=10, xoffset=0, yoffset=0, mask=mask)
+    gy, gx = np.nonzero(~mask)
+    cells = state.randint(len(gx), size=40)
+    x = (gx[cells] + state.random_sample(40)) * 10
+    y = (gy[cells] + state.random_sample(40)) * 10
+    times = edges[0] + state.random_sample(40) * np.timedelta64(3, "D")
+    order = np.argsort(times)
+    tp = open_cp.data.TimedPoints.from_coords(times[order], x[order], y[order])
+    counts = evaluation.bin_timed_points(grid, tp, edges)
+    assert counts.shape == (4, 6, 8)
+    assert np.sum(counts) == 40
+    assert np.sum(counts[3]) == 0
+
+    matrices = state.random_sample(size=(4, 6, 8))
+    matrices[:, 2, 3] = 0
+    matrices = np.ma.array(matrices, mask=np.broadcast_to(mask, matrices.shape).copy())
+    matrices /= np.sum(matrices, axis=(1,2))[:,None,None]
+    table = evaluation.batch_scores(matrices, counts, cell_area=100, bias=20)
+    assert len(table) == 4
+    np.testing.assert_array_equal(table["index"], [0,1,2,3])
+
+    for t in range(3):
+        pred = open_cp.predictors.GridPredictionArray(10, 10, matrices[t])
+        tps = tp[(tp.timestamps >= edges[t]) & (tp.timestamps < edges[t+1])]
+        assert table[t]["likelihood"] == pytest.approx(evaluation.likelihood(pred, tps))
+        score, skill = evaluation.brier_score(pred, tps)
+        assert table[t]["brier_score"] == pytest.approx(score)
+        assert table[t]["brier_skill"] == pytest.approx(skill)
+        assert table[t]["kl_score"] == pytest.approx(evaluation.kl_score(pred, tps))
+        assert table[t]["poisson_crps_score"] == pytest.approx(
+            evaluation.poisson_crps_score(pred, tps), rel=1e-6)
+        assert table[t]["ranking_score"] == pytest.approx(
+            np.mean(evaluation.ranking_score(pred, tps)))
+        assert table[t]["bayesian_dirichlet_prior"] == pytest.approx(
+            evaluation.bayesian_dirichlet_prior(pred, tps, bias=20))
+        assert table[t]["bayesian_predictive"] == pytest.approx(
+            evaluation.bayesian_predictive(pred, tps, bias=20))
+
+    assert table[3]["likelihood"] == 0
+    assert np.isnan(table[3]["brier_score"])
+
+def test_batch_scores_events_in_mask():
+    matrices = np.ma.array(np.ones((1, 2, 2)), mask=[[[True, False], [False, False]]])
+    counts = np.asarray([[[1, 0], [0, 0]]])
+    with pytest.raises(ValueError):
+        evaluation.batch_scores(matrices, counts)
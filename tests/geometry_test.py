@@ -41,6 +41,49 @@ def test_mask_grid_by_intersection():
 
     assert not mg.mask.any()
 
+def _brute_force_meets(geo, mg, area):
+    out = np.empty((mg.yextent, mg.xextent), dtype=bool)
+    for y in range(mg.yextent):
+        for x in range(mg.xextent):
+            xx, yy = mg.xoffset + x * mg.xsize, mg.yoffset + y * mg.ysize
+            poly = shapely.geometry.Polygon([[xx, yy], [xx + mg.xsize, yy],
+                [xx + mg.xsize, yy + mg.ysize], [xx, yy + mg.ysize]])
+            if area:
+                out[y, x] = poly.intersection(geo).area > 0
+            else:
+                out[y, x] = poly.intersects(geo)
+    return out
+
+def _random_polygons():
+    state = np.random.RandomState(21)
+    for _ in range(10):
+        angles = np.sort(state.random_sample(30)) * 2 * np.pi
+        radii = 20 + state.random_sample(30) * 30
+        outer = np.asarray([np.cos(angles) * radii, np.sin(angles) * radii]).T
+        hole = [[-5,-5], [-5,5], [5,5], [5,-5]]
+        yield shapely.geometry.Polygon(outer, [hole])
+    # Vertices and edges on grid lines
+    yield shapely.geometry.Polygon([[0,0],[20,0],[20,10],[10,10],[10,20],[0,20]])
+    yield shapely.geometry.MultiPolygon([
+        shapely.geometry.Polygon([[0,0],[10,0],[10,10],[0,10]]),
+        shapely.geometry.Polygon([[20,20],[35,20],[35,21],[20,21]]),
+        shapely.geometry.Polygon([[10,10],[11,11],[10,12]])])
+
+def test_mask_grid_by_intersection_matches_brute_force():
+    grid = open_cp.data.Grid(xsize=5, ysize=5, xoffset=0, yoffset=0)
+    for geo in _random_polygons():
+        mg = geometry.mask_grid_by_intersection(geo, grid)
+        np.testing.assert_array_equal(~mg.mask, _brute_force_meets(geo, mg, False))
+
+def test_grid_intersection_matches_brute_force():
+    grid = open_cp.data.Grid(xsize=5, ysize=5, xoffset=0, yoffset=0)
+    for geo in _random_polygons():
+        mg = geometry.mask_grid_by_intersection(geo, grid)
+        expected = _brute_force_meets(geo, mg, True)
+        xstart, ystart = mg.xoffset // 5, mg.yoffset // 5
+        expected = [(x + xstart, y + ystart) for y, x in zip(*np.nonzero(expected))]
+        assert geometry.grid_intersection(geo, grid) == expected
+
 @pytest.fixture
 def points1():
     t = [datetime.datetime.now() for _ in range(5)]
@@ -75,6 +118,18 @@ def test_mask_grid_by_points_intersection(points1):
         for y in range(4):
             assert mg.is_valid(x, y) == ((x,y) in expected)
 
+def test_mask_grid_by_points_intersection_on_boundaries():
+    t = [datetime.datetime.now() for _ in range(4)]
+    x = [0, 10, 25, 30]
+    y = [0, 5, 10, 20]
+    points = open_cp.data.TimedPoints.from_coords(t,x,y)
+    mg = geometry.mask_grid_by_points_intersection(points, open_cp.data.Grid(10, 10, 0, 0))
+    assert (mg.xextent, mg.yextent) == (4, 3)
+    expected = {(0,0), (1,0), (2,0), (2,1), (3,1), (2,2), (3,2)}
+    for x in range(4):
+        for y in range(3):
+            assert mg.is_valid(x, y) == ((x,y) in expected)
+
 @pytest.fixture
 def unit_square():
     return shapely.geometry.Polygon([[0,0], [1,0], [1,1], [0,1]])
@@ -285,6 +340,29 @@ def test_full_intersect_line_grid():
     assert ints[0][2] == pytest.approx(0)
     assert ints[0][3] == pytest.approx(1)
     
+def test_intersect_lines_grid():
+    grid = open_cp.data.Grid(xsize=10, ysize=4, xoffset=1, yoffset=1.5)
+    np.random.seed(3)
+    starts = np.random.random((50, 2)) * 100
+    ends = np.random.random((50, 2)) * 100
+    lines, gx, gy, t1, t2 = geometry.intersect_lines_grid(starts, ends, grid)
+    for i, (s, e) in enumerate(zip(starts, ends)):
+        _, intervals = geometry.full_intersect_line_grid((tuple(s), tuple(e)), grid)
+        m = lines == i
+        assert list(zip(gx[m], gy[m])) == [(x, y) for x, y, _, _ in intervals]
+        np.testing.assert_allclose(t1[m], [a for _, _, a, _ in intervals])
+        np.testing.assert_allclose(t2[m], [b for _, _, _, b in intervals])
+
+def test_intersect_lines_grid_aligned():
+    grid = open_cp.data.Grid(xsize=1, ysize=1, xoffset=0, yoffset=0)
+    lines, gx, gy, t1, t2 = geometry.intersect_lines_grid(
+        [(3, 8), (0.5, 0.5), (1, 1), (4, 2.5)], [(3, 11), (0.5, 0.5), (3, 3), (2, 2.5)], grid)
+    np.testing.assert_array_equal(lines, [0, 0, 0, 1, 2, 2, 3, 3])
+    np.testing.assert_array_equal(gx, [3, 3, 3, 0, 1, 2, 3, 2])
+    np.testing.assert_array_equal(gy, [8, 9, 10, 0, 1, 2, 2, 2])
+    np.testing.assert_allclose(t1, [0, 1/3, 2/3, 0, 0, 0.5, 0, 0.5])
+    np.testing.assert_allclose(t2, [1/3, 2/3, 1, 1, 0.5, 1, 0.5, 1])
+
 def test_voroni_perp():
     points = np.asarray([[1,2], [2,3], [3,4]])
     x, y = geometry.Voroni.perp_direction(points, 0, 1, [0,0])
@@ -147,4 +147,34 @@ def test_GaussianFixedBandwidthProvider():
     ker1.covariance_matrix = 1
     
     assert ker(3) == pytest.approx(ker1(3))
-    
\ No newline at end of file
+    
+@pytest.mark.parametrize("time_kernel,tolerance", [(kde.ConstantTimeKernel(), None),
+        (kde.ExponentialTimeKernel(3), None), (kde.ExponentialTimeKernel(5), 1e-6)])
+def test_KDEIncremental(time_kernel, tolerance):
+    region = open_cp.RectangularRegion(xmin=0, xmax=300, ymin=100, ymax=300)
+    rng = np.random.RandomState(42)
+    times = np.datetime64("2017-01-01") + np.sort(rng.randint(0, 60*24*60, size=150)) * np.timedelta64(1, "m")
+    predictor = kde.KDE(region, 20)
+    predictor.data = open_cp.data.TimedPoints.from_coords(times,
+        rng.random_sample(150) * 300, rng.random_sample(150) * 200 + 100)
+    predictor.time_kernel = time_kernel
+    predictor.space_kernel = kde.GaussianFixedBandwidthProvider(25, tolerance)
+    inc = kde.KDEIncremental(predictor, samples=-3)
+
+    day = np.timedelta64(1, "D")
+    for end_day in [10, 12, 13, 20, 40, 15, 16, 60]:
+        end = np.datetime64("2017-01-01") + end_day * day
+        got = inc.predict(end - 10 * day, end)
+        expected = predictor.predict(end - 10 * day, end, samples=-3)
+        assert got.intensity_matrix.shape == (10, 15)
+        np.testing.assert_allclose(got.intensity_matrix, expected.intensity_matrix, rtol=1e-8, atol=1e-15)
+
+def test_KDEIncremental_unsupported():
+    region = open_cp.RectangularRegion(xmin=0, xmax=300, ymin=100, ymax=300)
+    predictor = kde.KDE(region, 20)
+    with pytest.raises(ValueError):
+        kde.KDEIncremental(predictor, samples=None)
+    inc = kde.KDEIncremental(predictor)
+    predictor.data = open_cp.data.TimedPoints.from_coords([np.datetime64("2017-01-01")], [10], [110])
+    with pytest.raises(ValueError):
+        inc.predict(None, np.datetime64("2017-01-02"))
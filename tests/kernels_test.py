@@ -294,6 +294,59 @@ def test_GaussianBase_large_eval_3d():
 
     np.testing.assert_allclose(gb([[1,4], [2,2], [3,1]]), [x,y])
 
+def test_GaussianBase_chunked_eval():
+    pts = np.random.random((2,50))
+    gb = testmod.GaussianBase(pts)
+    gb.covariance_matrix = [[2, 0.5], [0.5, 1]]
+    gb.weights = np.random.random(50)
+    eval_pts = np.random.random((2,30)) * 2 - 0.5
+    expected = gb(eval_pts)
+    gb._max_pairs = 70
+    np.testing.assert_allclose(gb(eval_pts), expected)
+
+def slow_gaussian(pts, cov, bandwidth, weights, eval_pts):
+    cov_inv = np.linalg.inv(cov)
+    out = []
+    for pt in eval_pts.T:
+        x = pts - pt[:,None]
+        q = np.sum(x * np.dot(cov_inv, x), axis=0)
+        out.append(np.sum(weights * np.exp(-q / (2 * bandwidth**2)) / bandwidth**2))
+    norm = np.sum(weights) * np.sqrt(np.linalg.det(cov)) * 2 * np.pi
+    return np.asarray(out) / norm
+
+@pytest.mark.parametrize("variable", [False, True])
+def test_GaussianBase_tolerance(variable):
+    pts = np.random.random((2,500)) * [[100], [50]]
+    gb = testmod.GaussianBase(pts)
+    cov = [[20, 5], [5, 10]]
+    gb.covariance_matrix = cov
+    weights = np.random.random(500) + 0.1
+    gb.weights = weights
+    if variable:
+        bandwidth = np.exp(np.random.random(500) * 2 - 2)
+    else:
+        bandwidth = 0.3
+    gb.bandwidth = bandwidth
+    eval_pts = np.random.random((2,200)) * [[120], [70]] - 10
+    expected = slow_gaussian(pts, np.asarray(cov), np.broadcast_to(bandwidth, (500,)), weights, eval_pts)
+    np.testing.assert_allclose(gb(eval_pts), expected)
+
+    tolerance = 1e-6
+    gb.tolerance = tolerance
+    got = gb(eval_pts)
+    bound = tolerance * np.sum(weights / np.broadcast_to(bandwidth, (500,))**2)
+    bound /= np.sum(weights) * np.sqrt(np.linalg.det(cov)) * 2 * np.pi
+    assert np.all(np.abs(got - expected) <= bound)
+    assert np.all(got <= expected * (1 + 1e-12))
+
+    gb.tolerance = None
+    np.testing.assert_allclose(gb(eval_pts), expected)
+
+def test_GaussianBase_tolerance_invalid():
+    gb = testmod.GaussianBase([1,2,3,4])
+    with pytest.raises(ValueError):
+        gb.tolerance = 2
+
 def test_GaussianBase_eval_with_cov():
     gb = testmod.GaussianBase([1,2,3,4])
     assert gb.covariance_matrix[0,0] == pytest.approx(20/12)
@@ -108,4 +108,73 @@ def test_calculate_three(data3):
         
     for i in range(3):
         for j in range(2):
-            assert(result.distribution(i,j).shape == (999,))
\ No newline at end of file
+            assert(result.distribution(i,j).shape == (999,))
+
+def test_distances_slices():
+    pts = np.random.random(size=(20, 2))
+    expected = distance.pdist(pts)
+    got = np.concatenate([knox.distances(pts, 0, 7), knox.distances(pts, 7, 8),
+        knox.distances(pts, 8, None)])
+    np.testing.assert_allclose(got, expected)
+    assert knox.distances(pts, 19, 20).shape == (0,)
+    np.testing.assert_allclose(knox.distances(pts, 0, 1), expected[:19])
+
+@pytest.fixture
+def random_knox():
+    k = knox.Knox()
+    times = np.datetime64("2017-01-01") + np.sort(np.random.randint(0, 10000, size=100)) * np.timedelta64(1, "m")
+    k.data = data.TimedPoints.from_coords(times, np.random.random(100) * 10,
+        np.random.random(100) * 10)
+    k.space_bins = [[0, 1], [1, 2], [0.5, 3]]
+    k.set_time_bins([(0, 10), (10, 50), (0, 100)], "hours")
+    return k
+
+def slow_statistic(k, times):
+    dists = distance.pdist(k.data.coords.T)
+    time_dists = distance.pdist(times[:,None])
+    cells = np.empty((len(k.space_bins), len(k.time_bins)))
+    for j, (start, end) in enumerate(k.time_bins):
+        start, end = start / np.timedelta64(1, "ms"), end / np.timedelta64(1, "ms")
+        for i, (smin, smax) in enumerate(k.space_bins):
+            cells[i][j] = np.sum((dists >= smin) & (dists <= smax) &
+                (time_dists >= start) & (time_dists <= end))
+    return cells
+
+def test_calculate_matches_slow(random_knox):
+    times = (random_knox.data.timestamps - random_knox.data.timestamps[0]) / np.timedelta64(1, "ms")
+    expected = slow_statistic(random_knox, times)
+    random_knox._chunk_size = 7
+    random_knox._batch_bytes = 1
+    np.random.seed(5)
+    result = random_knox.calculate(iterations=20)
+    for i in range(3):
+        for j in range(3):
+            assert result.statistic(i, j) == expected[i][j]
+            assert result.distribution(i, j).shape == (20,)
+
+    # Same random permutations as each Monte Carlo iteration
+    np.random.seed(5)
+    seeds = [np.random.randint(2**31) for _ in range(20)]
+    for index, seed in enumerate(seeds[:3]):
+        perm = np.random.RandomState(seed).permutation(len(times))
+        mc = slow_statistic(random_knox, times[perm])
+        assert result.distribution(0, 0)[index] == mc[0][0]
+        assert result.distribution(2, 1)[index] == mc[2][1]
+
+def test_calculate_chunking_and_processes(random_knox):
+    np.random.seed(7)
+    expected = random_knox.calculate(iterations=50)
+    random_knox._chunk_size = 13
+    random_knox._batch_bytes = 20000
+    np.random.seed(7)
+    chunked = random_knox.calculate(iterations=50)
+    np.random.seed(7)
+    parallel = random_knox.calculate(iterations=50, processes=2)
+    for result in [chunked, parallel]:
+        for i in range(3):
+            for j in range(3):
+                assert result.statistic(i, j) == expected.statistic(i, j)
+    for i in range(3):
+        for j in range(3):
+            np.testing.assert_array_equal(parallel.distribution(i, j), chunked.distribution(i, j))
+            assert parallel.pvalue(i, j) == chunked.pvalue(i, j)
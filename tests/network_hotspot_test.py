@@ -176,6 +176,60 @@ def test_Predictor_with_time_kernel(graph, netpoints):
     assert result.risks[0] == pytest.approx(1 * np.exp(-1/24))
     assert result.risks[1] == pytest.approx(1)
 
+def lattice_graph(shift=0.1):
+    builder = open_cp.network.PlanarGraphBuilder()
+    keys = [[builder.add_vertex(x + shift * (y % 2), y) for y in range(6)] for x in range(6)]
+    for x in range(6):
+        for y in range(6):
+            if x < 5:
+                builder.add_edge(keys[x][y], keys[x+1][y])
+            if y < 5:
+                builder.add_edge(keys[x][y], keys[x][y+1])
+    return builder.build()
+
+@pytest.fixture
+def lattice_prediction():
+    graph = lattice_graph()
+    np.random.seed(7)
+    edges = np.random.randint(graph.number_edges, size=50)
+    edges[-5:] = edges[0]
+    dists = np.random.random(50)
+    dists[-5:] = dists[0]
+    locations = []
+    for e, d in zip(edges, dists):
+        k1, k2 = graph.edges[e]
+        locations.append(((k2, k1), 1 - d) if e % 2 else ((k1, k2), d))
+    times = [datetime.datetime(2017,8,7) + datetime.timedelta(hours=i) for i in range(50)]
+    tnp = open_cp.network.TimedNetworkPoints(times, locations)
+    pred = network_hotspot.Predictor(tnp, graph)
+    pred.kernel = network_hotspot.TriangleKernel(2.5)
+    pred.time_kernel = network_hotspot.ExponentialTimeKernel(1)
+    return pred
+
+def individual_risks(pred, data, predict_time):
+    risks = np.zeros(pred.graph.number_edges)
+    time_weights = pred.time_kernel((predict_time - data.timestamps) / np.timedelta64(1, "D"))
+    for tw, key1, key2, dist in zip(time_weights, data.start_keys, data.end_keys, data.distances):
+        edge_index, orient = pred.graph.find_edge(key1, key2)
+        pred.add_edge(risks, edge_index, dist if orient == 1 else 1 - dist, tw)
+    return risks / pred.graph.lengths
+
+def test_Predictor_vectorised_matches_individual(lattice_prediction):
+    pred = lattice_prediction
+    predict_time = np.datetime64("2017-08-08T16:00")
+    expected = individual_risks(pred, pred.network_timed_points[:40], predict_time)
+    result = pred.predict(predict_time=predict_time)
+    np.testing.assert_allclose(result.risks, expected)
+    pred._max_pairs = 7
+    result = pred.predict(predict_time=predict_time)
+    np.testing.assert_allclose(result.risks, expected)
+
+    pred.kernel = network_hotspot.TriangleKernel(1.5)
+    expected = individual_risks(pred, pred.network_timed_points[20:40], predict_time)
+    cutoff_time = pred.network_timed_points.timestamps[20]
+    result = pred.predict(cutoff_time=cutoff_time, predict_time=predict_time)
+    np.testing.assert_allclose(result.risks, expected)
+
 def test_FastPredictor(graph, netpoints):
     pred = network_hotspot.Predictor(netpoints, graph)
     pred.kernel = network_hotspot.TriangleKernel(0.2)
@@ -285,3 +339,100 @@ def test_ApproxPredictorCaching2(graph2):
     risks = np.asarray([0]*9, dtype=np.float)
     pred.add_edge(risks, 0, None, 1)
     np.testing.assert_allclose(risks, [1, sq2/2, 1/4, sq2/4, sq2/2, 1/4, sq2/4, 2/4, 1/8])
+
+def test_ApproxPredictorCaching_distance_table(graph2):
+    sq2 = np.sqrt(2)
+    pred = network_hotspot.Predictor(None, graph2)
+    pred.kernel = mock.Mock()
+    pred.kernel.return_value = 1.0
+    table = open_cp.network.BoundedDistances.build(graph2, 100)
+    pred = network_hotspot.ApproxPredictorCaching(pred, table)
+    
+    risks = np.asarray([0]*9, dtype=np.float)
+    pred.add_edge(risks, 0, None, 1)
+    np.testing.assert_allclose(risks, [1, sq2/2, 1/4, sq2/4, sq2/2, 1/4, sq2/4, 2/4, 1/8])
+
+def test_ArrayCache_eviction():
+    cache = network_hotspot.ArrayCache(max_bytes=200)
+    cache[(1,)] = (np.arange(10), np.zeros(5))
+    cache[(2,)] = (np.arange(5),)
+    assert cache.nbytes == 160
+    assert len(cache) == 2
+    np.testing.assert_allclose(cache[(1,)][0], np.arange(10))
+    cache[(3,)] = (np.arange(8),)
+    assert (1,) in cache
+    assert (2,) not in cache
+    assert (3,) in cache
+    assert cache.nbytes == 184
+    cache[(4,)] = (np.arange(30),)
+    assert (4,) not in cache
+    assert len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_ArrayCache_save_load(tmpdir, mmap):
+    cache = network_hotspot.ArrayCache()
+    cache[(1, -1)] = (np.arange(3), np.array([1.5, 2.5, 3.5]))
+    cache[(2, 1)] = (np.arange(0), np.arange(0.0))
+    cache[(0, 1)] = (np.array([7]), np.array([0.5]))
+    filename = str(tmpdir.join("cache.dat"))
+    cache.save(filename, {"x" : 5})
+
+    loaded = network_hotspot.ArrayCache(max_bytes=1)
+    assert loaded.load(filename, mmap) == {"x" : 5}
+    assert len(loaded) == 3
+    assert set(loaded.keys()) == {(1, -1), (2, 1), (0, 1)}
+    assert loaded.nbytes == 0
+    for key in cache.keys():
+        for a, b in zip(cache[key], loaded[key]):
+            np.testing.assert_allclose(a, b)
+            assert a.dtype == b.dtype
+
+def test_FastPredictor_bounded_cache(lattice_prediction, tmpdir):
+    pred = lattice_prediction
+    predict_time = np.datetime64("2017-08-08T16:00")
+    expected = network_hotspot.FastPredictor(pred, 5).predict(predict_time=predict_time)
+    fast_pred = network_hotspot.FastPredictor(pred, 5, max_cache_bytes=5000)
+    result = fast_pred.predict(predict_time=predict_time)
+    np.testing.assert_allclose(result.risks, expected.risks)
+    assert 0 < fast_pred._cache.nbytes <= 5000
+    assert 0 < fast_pred._add_cache.nbytes <= 5000
+    result = fast_pred.predict(predict_time=predict_time)
+    np.testing.assert_allclose(result.risks, expected.risks)
+
+    filename = str(tmpdir.join("cache.dat"))
+    fast_pred = network_hotspot.FastPredictor(pred, 5)
+    fast_pred.predict(predict_time=predict_time)
+    fast_pred.save_cache(filename)
+    fast_pred = network_hotspot.FastPredictor(pred, 5, max_cache_bytes=0)
+    fast_pred.load_cache(filename)
+    result = fast_pred.predict(predict_time=predict_time)
+    np.testing.assert_allclose(result.risks, expected.risks)
+
+    with pytest.raises(ValueError):
+        network_hotspot.FastPredictor(pred, 4).load_cache(filename)
+    other = network_hotspot.Predictor(None, lattice_graph(0.2))
+    with pytest.raises(ValueError):
+        network_hotspot.FastPredictor(other, 5).load_cache(filename)
+
+def test_ApproxPredictorCaching_bounded_cache(lattice_prediction, tmpdir):
+    pred = lattice_prediction
+    predict_time = np.datetime64("2017-08-08T16:00")
+    expected = network_hotspot.ApproxPredictor(pred).predict(predict_time=predict_time)
+    approx = network_hotspot.ApproxPredictorCaching(pred, max_cache_bytes=3000)
+    result = approx.predict(predict_time=predict_time)
+    np.testing.assert_allclose(result.risks, expected.risks)
+    assert 0 < approx._cache.nbytes <= 3000
+
+    filename = str(tmpdir.join("cache.dat"))
+    approx.save_cache(filename)
+    approx = network_hotspot.ApproxPredictorCaching(pred, max_cache_bytes=0)
+    approx.load_cache(filename)
+    result = approx.predict(predict_time=predict_time)
+    np.testing.assert_allclose(result.risks, expected.risks)
+
+    other = network_hotspot.Predictor(None, lattice_graph(0.2))
+    with pytest.raises(ValueError):
+        network_hotspot.ApproxPredictorCaching(other).load_cache(filename)
@@ -87,6 +87,44 @@ def test_PlanarGraphNodeBuilder_tolerance():
     assert b.coord_nodes == [(0,0), (1,1), (5.1,1.2), (2,2)]
     assert b.edges == [(0,1), (1,2), (0,3)]
 
+def test_PlanarGraphNodeBuilder_merges_nearest():
+    b = network.PlanarGraphNodeBuilder()
+    b.tolerance = 0.5
+    b.add_path([(0,0), (0.9,0), (10,10)])
+    b.add_edge(0.6,0,-0.3,0)
+    assert b.coord_nodes == [(0,0), (0.9,0), (10,10)]
+    assert b.edges == [(0,1), (1,2), (1,0)]
+    b.add_edge(-0.45,0,10.2,10)
+    assert b.coord_nodes == [(0,0), (0.9,0), (10,10)]
+    b.tolerance = 0.1
+    b.add_edge(-0.45,0,10.05,10)
+    assert b.coord_nodes == [(0,0), (0.9,0), (10,10), (-0.45,0)]
+    assert b.edges == [(0,1), (1,2), (1,0), (0,2), (3,2)]
+
+def test_PlanarGraphNodeBuilder_many_nodes():
+    np.random.seed(5)
+    points = np.random.random((500, 2)) * 10
+    points = np.concatenate([points, points + np.random.random((500, 2)) * 0.01])
+    b = network.PlanarGraphNodeBuilder()
+    b.tolerance = 0.05
+    for x, y in points:
+        b.add_edge(x, y, x, y)
+    nodes = np.asarray(b.coord_nodes)
+    for (x, y), (key, _) in zip(points, b.edges):
+        distsq = np.sum((nodes - [x, y])**2, axis=1)
+        if distsq[key] > 0:
+            assert key == np.argmin(distsq)
+            assert distsq[key] < 0.05**2
+
+def test_PlanarGraphNodeBuilder_remove_duplicates():
+    b = network.PlanarGraphNodeBuilder()
+    b.add_path([(0,0), (1,1), (2,2), (1,1), (0,0)])
+    b.add_edge(2,2,2,2)
+    b.add_edge(1,1,3,3)
+    b.remove_duplicate_edges()
+    assert b.edges == [(0,1), (1,2), (1,3)]
+    assert b.build().number_edges == 3
+
 def test_PlanarGraphNodeOneShot():
     nodes = [(0,0), (1,1), (5.1,1.2), (0.1,0.01), (2,2)]
     b = network.PlanarGraphNodeOneShot(nodes, 0.2)
@@ -286,6 +324,52 @@ def test_PlanarGraph_find_edge(graph2):
     with pytest.raises(KeyError):
         graph2.find_edge(1,3)
 
+def test_PlanarGraph_find_edges(graph2):
+    keys1 = [k1 for k1, _ in graph2.edges] + [k2 for _, k2 in graph2.edges]
+    keys2 = [k2 for _, k2 in graph2.edges] + [k1 for k1, _ in graph2.edges]
+    indices, orders = graph2.find_edges(keys1, keys2)
+    expected = [graph2.find_edge(k1, k2) for k1, k2 in zip(keys1, keys2)]
+    np.testing.assert_array_equal(indices, [i for i, _ in expected])
+    np.testing.assert_array_equal(orders, [o for _, o in expected])
+    with pytest.raises(KeyError):
+        graph2.find_edges([0, 1], [1, 3])
+    with pytest.raises(KeyError):
+        graph2.find_edges([0, 1], [1, 100])
+
+def test_Graph_general_keys():
+    g = network.Graph(["c", "a", "b"], [("a", "b"), ("c", "b")], [1, 2])
+    assert g.vertices == {"a", "b", "c"}
+    assert g.edges == [("a", "b"), ("c", "b")]
+    assert g.find_edge("b", "c") == (1, -1)
+    assert g.neighbours("b") == ["a", "c"]
+    assert g.neighbourhood_edges("b") == [0, 1]
+    assert g.degree("a") == 1
+    indices, orders = g.find_edges(["b", "a"], ["c", "b"])
+    assert list(indices) == [1, 0] and list(orders) == [-1, 1]
+    with pytest.raises(KeyError):
+        g.find_edge("a", "c")
+    with pytest.raises(ValueError):
+        network.Graph(["a", "b", "a"], [])
+    with pytest.raises(ValueError):
+        network.Graph(["a", "b"], [("a", "b"), ("b", "a")])
+    with pytest.raises(KeyError):
+        network.Graph(["a", "b"], [("a", "d")])
+
+def test_PlanarGraph_array_core():
+    np.random.seed(4)
+    vertices = [(k, x, y) for k, x, y in zip([5, 3, 9, 1], *np.random.random((2, 4)))]
+    edges = np.asarray([[5, 3], [9, 3], [1, 5]])
+    g = network.PlanarGraph(vertices, edges)
+    assert g.vertices == {k : (x, y) for k, x, y in vertices}
+    assert g.edges == [(5, 3), (9, 3), (1, 5)]
+    quads = [(*g.vertices[k1], *g.vertices[k2]) for k1, k2 in g.edges]
+    np.testing.assert_allclose(g.as_quads(), quads)
+    assert g.as_lines() == [((x1, y1), (x2, y2)) for x1, y1, x2, y2 in quads]
+    xcs, ycs = [x for _, x, _ in vertices], [y for _, _, y in vertices]
+    assert g.bounds == (min(xcs), min(ycs), max(xcs), max(ycs))
+    assert g.find_edge(3, 9) == (1, -1)
+    assert g.edge_to_coords(5, 3, 0.5) == pytest.approx(np.mean([g.vertices[5], g.vertices[3]], axis=0))
+
 def test_PlanarGraph_neighbours(graph2):
     assert graph2.neighbours(0) == [1]
     assert graph2.neighbours(1) == [0,2,5]
@@ -483,6 +567,11 @@ def test_TimedNetworkPoints():
     assert tnpp.end_keys == [4]
     np.testing.assert_allclose(tnpp.distances, [0.1])
 
+    tnpp = tnp.time_window(datetime.datetime(2017,8,7,12,0), datetime.datetime(2017,8,7,13,45))
+    assert np.all(tnpp.timestamps == [np.datetime64("2017-08-07T12:30")])
+    assert tnpp.start_keys == [1]
+    np.testing.assert_allclose(tnpp.distances, [0.4])
+
     graph = mock.Mock()
     graph.edge_to_coords.return_value = (1.3, 2.4)
     tp = tnp.to_timed_points(graph)
@@ -497,8 +586,7 @@ def test_TimedNetworkPoints_from_projection():
     xcs = [1.2, 2.3]
     ycs = [4.5, 6.7]
     tp = open_cp.data.TimedPoints.from_coords(times, xcs, ycs)
-    graph = mock.Mock()
-    graph.project_point_to_graph.return_value = ((1,2), 0.3)
+    graph = network.PlanarGraph([(1, 0, 0), (2, 10, 0), (3, 10, 20)], [(1,2), (3,2)])
 
     tnp = network.TimedNetworkPoints.project_timed_points(tp, graph)
 
@@ -507,8 +595,61 @@ def test_TimedNetworkPoints_from_projection():
         (np.datetime64("2017-01-01") - tnp.timestamps) / np.timedelta64(1, "s"))
     np.testing.assert_allclose(tnp.start_keys, [1, 1])
     np.testing.assert_allclose(tnp.end_keys, [2, 2])
-    np.testing.assert_allclose(tnp.distances, [0.3, 0.3])
-    graph.project_point_to_graph.call_args_list == [mock.call(1.2, 4.5), mock.call(2.3, 6.7)]
+    np.testing.assert_allclose(tnp.distances, [0.12, 0.23])
+
+def test_project_points_to_graph():
+    np.random.seed(11)
+    b = network.PlanarGraphGeoBuilder()
+    for _ in range(30):
+        b.add_path(np.random.random((3, 2)) * 100)
+    b.add_path([(20, 20), (20, 20.001)])
+    graph = b.build()
+    xcs = np.random.random(500) * 140 - 20
+    ycs = np.random.random(500) * 140 - 20
+    xcs[:5], ycs[:5] = graph.as_quads()[:5,0], graph.as_quads()[:5,1]
+    xcs[5], ycs[5] = 1e4, -1e4
+
+    projector = network.PointProjector(graph.as_quads())
+    projector._points_per_batch = 77
+    indices, ts = projector.project_points(xcs, ycs)
+    for x, y, index, t in zip(xcs, ycs, indices, ts):
+        expected_index, expected_t = projector._project_point(x, y)
+        assert index == expected_index
+        assert t == pytest.approx(expected_t)
+
+    edges, ts2 = graph.project_points_to_graph(xcs[:20], ycs[:20])
+    np.testing.assert_array_equal(edges, indices[:20])
+    np.testing.assert_allclose(ts2, ts[:20])
+
+def test_project_far_points_to_graph():
+    b = network.PlanarGraphBuilder()
+    keys = [[b.add_vertex(x * 10, y * 10) for y in range(40)] for x in range(40)]
+    for x in range(40):
+        for y in range(40):
+            if x < 39:
+                b.add_edge(keys[x][y], keys[x+1][y])
+            if y < 39:
+                b.add_edge(keys[x][y], keys[x][y+1])
+    graph = b.build()
+    projector = network.PointProjector(graph.as_quads())
+    projector._make_grid()
+    nx, ny = projector._grid[3], projector._grid[4]
+    xcs = np.asarray([-1e6, -5000, 1e7, 195, 0, 395.5, -3e4])
+    ycs = np.asarray([-1e6, 200, 3e6, -1e5, 0, 1e8, 1e4])
+    # Rings are clipped to the grid, so far away points do not examine more
+    # cells than the grid contains
+    cx, cy = np.asarray([-1000, 0]), np.asarray([-1000, 5])
+    _, cells = projector._ring_cells(cx, cy, np.asarray([1005, 3]), nx, ny)
+    assert len(cells) <= 2 * (nx + ny)
+    assert np.all((cells >= 0) & (cells < nx * ny))
+
+    indices, ts = projector.project_points(xcs, ycs)
+    for x, y, index, t in zip(xcs, ycs, indices, ts):
+        expected_index, expected_t = projector._project_point(x, y)
+        x1, y1, x2, y2 = graph.as_quads()[index]
+        ex1, ey1, ex2, ey2 = graph.as_quads()[expected_index]
+        assert (x1 + (x2 - x1) * t, y1 + (y2 - y1) * t) == pytest.approx(
+            (ex1 + (ex2 - ex1) * expected_t, ey1 + (ey2 - ey1) * expected_t))
 
 def test_GraphBuilder():
     b = network.GraphBuilder()
@@ -659,4 +800,95 @@ def test_connected_components(graph5):
     out = {frozenset(x) for x in out}
     expected = {frozenset({0,1,2}), frozenset({4,5,3}), frozenset({6})}
     assert out == expected
-    
\ No newline at end of file
+    
+def test_shortest_paths_max_length(graph2):
+    dists, prevs = network.shortest_paths(graph2, 0, max_length=2.5)
+    assert dists == {0:0, 1:1, 2:pytest.approx(1+np.sqrt(2)),
+        3:-1, 4:-1, 5:pytest.approx(1+np.sqrt(2)), 6:-1, 7:-1}
+    assert prevs == {0:0, 1:0, 2:1, 5:1}
+
+def test_shortest_edge_paths_max_length(graph2):
+    dists, prevs = network.shortest_edge_paths(graph2, 2, max_length=2)
+    assert dists == {2:0.5, 3:0.5, 1:pytest.approx(np.sqrt(2)+0.5),
+        4:pytest.approx(np.sqrt(2)+0.5)}
+    assert prevs == {2:2,3:3,1:2,4:3}
+
+def test_shortest_edge_paths_with_degrees_max_length(graph2):
+    dists, degrees = network.shortest_edge_paths_with_degrees(graph2, 0, max_length=1.5)
+    sq2 = np.sqrt(2)
+    np.testing.assert_allclose(dists, [0, (1+sq2)/2, -1, -1, (1+sq2)/2,
+            -1, -1, -1, -1])
+    np.testing.assert_allclose(degrees, [1, 2, 1, 1, 2, 1, 1, 1, 1])
+
+def random_graph(size=30, seed=1):
+    rng = np.random.RandomState(seed)
+    b = network.PlanarGraphBuilder()
+    for _ in range(size):
+        b.add_vertex(*rng.random_sample(2))
+    edges = set()
+    for i in range(size):
+        for j in rng.choice(size, 3, replace=False):
+            if i != j and (j, i) not in edges:
+                edges.add((i, j))
+    b.edges.extend(edges)
+    return b.build()
+
+def slow_shortest_paths(graph, vertex_key):
+    lengths = {k:-1 for k in graph.vertices}
+    lengths[vertex_key] = 0
+    changed = True
+    while changed:
+        changed = False
+        for i, (k1, k2) in enumerate(graph.edges):
+            for a, b in [(k1, k2), (k2, k1)]:
+                if lengths[a] == -1:
+                    continue
+                d = lengths[a] + graph.length(i)
+                if lengths[b] == -1 or d < lengths[b] - 1e-12:
+                    lengths[b] = d
+                    changed = True
+    return lengths
+
+def test_shortest_paths_random_graph():
+    graph = random_graph()
+    for key in [0, 5, 17]:
+        dists, prevs = network.shortest_paths(graph, key)
+        expected = slow_shortest_paths(graph, key)
+        assert set(dists.keys()) == set(expected.keys())
+        for k in dists:
+            assert dists[k] == pytest.approx(expected[k])
+        for k, p in prevs.items():
+            if k != p:
+                e, _ = graph.find_edge(k, p)
+                assert dists[p] + graph.length(e) == pytest.approx(dists[k])
+
+def test_BoundedDistances(graph2, tmpdir):
+    table = network.BoundedDistances.build(graph2, 1.5)
+    assert table.number_edges == 9
+    assert table.max_length == 1.5
+    for edge_index in range(9):
+        expected = network.shortest_edge_paths_with_degrees(graph2, edge_index, max_length=1.5)
+        got = table.to_dense(edge_index)
+        np.testing.assert_allclose(got[0], expected[0])
+        np.testing.assert_allclose(got[1], expected[1])
+        edges, dists, degs = table[edge_index]
+        np.testing.assert_allclose(edges, np.flatnonzero(expected[0] > -1))
+
+    filename = str(tmpdir.join("table.dat"))
+    table.save(filename)
+    for mmap in [True, False]:
+        loaded = network.BoundedDistances.load(filename, mmap)
+        assert loaded.max_length == 1.5
+        for edge_index in range(9):
+            for a, b in zip(loaded[edge_index], table[edge_index]):
+                np.testing.assert_allclose(a, b)
+
+def test_BoundedDistances_random_graph():
+    graph = random_graph(50, 2)
+    table = network.BoundedDistances.build(graph, 0.4)
+    for edge_index in range(graph.number_edges):
+        dists, degrees = network.shortest_edge_paths_with_degrees(graph, edge_index)
+        tdists, tdegrees = table.to_dense(edge_index)
+        mask = (dists < 0.4) & (dists > -1)
+        np.testing.assert_allclose(tdists[mask], dists[mask])
+        np.testing.assert_allclose(tdegrees[mask], degrees[mask])
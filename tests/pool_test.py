@@ -63,6 +63,22 @@ def test_catches_internal_error():
         with pytest.raises(AttributeError):
             future.result(timeout=1)
 
+_worker_value = None
+
+def _set_worker_value(value):
+    global _worker_value
+    _worker_value = value
+
+class WorkerValueTask(pool.Task):
+    def __call__(self):
+        return _worker_value
+
+def test_runs_with_initializer():
+    with pool.PoolExecutor(2, _set_worker_value, ("shared",)) as executor:
+        futures = [executor.submit(WorkerValueTask(i)) for i in range(4)]
+        results = dict(pool.yield_task_results(futures))
+    assert results == {i : "shared" for i in range(4)}
+
 @pytest.fixture
 def mockPPE():
     with unittest.mock.patch("open_cp.pool._ProcessPoolExecutor") as mockPPEClass:
@@ -81,6 +97,13 @@ def test_PoolExecutor(mockPPE):
 
     mockPPE.shutdown.assert_called_once_with(False)
 
+def test_PoolExecutor_passes_pool_args():
+    with unittest.mock.patch("open_cp.pool._ProcessPoolExecutor") as mockPPEClass:
+        with pool.PoolExecutor(3, _set_worker_value, (5,)) as executor:
+            pass
+    mockPPEClass.assert_called_once_with(processes=3,
+        initializer=_set_worker_value, initargs=(5,))
+
 def test_PoolExecutor_cantSubmitBeforeEntered(mockPPE):
     executor = pool.PoolExecutor()
     with pytest.raises(RuntimeError):
@@ -178,3 +201,47 @@ def test_RestorableExecutor_savePartialResult(mock, mockPPE):
 
     got = pickle.loads(file.data)
     assert(got == {"absa": 123})
+
+@unittest.mock.patch("open_cp.pool.yield_task_results")
+def test_RestorableExecutor_savePartialResult_on_exception(mock, mockPPE):
+    file = tests.helpers.BytesIOWrapper()
+
+    class YieldOnce():
+        def __iter__(self):
+            yield ("absa", 123)
+            raise RuntimeError()
+
+    with pytest.raises(RuntimeError):
+        with unittest.mock.patch("builtins.open", tests.helpers.MockOpen(file)) as open_mock:
+            open_mock.filter = tests.helpers.ExactlyTheseFilter([2])
+            mock.return_value = YieldOnce()
+            executor = pool.RestorableExecutor("")
+            with executor:
+                fut = executor.submit(OurTask("absvs"))
+
+    got = pickle.loads(file.data)
+    assert(got == {"absa": 123})
+    mockPPE.terminate.assert_called_once_with()
+
+def test_RestorableExecutor_checkpoints(mockPPE, tmpdir):
+    filename = str(tmpdir.join("checkpoint.pic"))
+    saved = []
+    class YieldTwice():
+        def __iter__(self):
+            yield ("a", 1)
+            with open(filename, "rb") as f:
+                saved.append(pickle.load(f))
+            yield ("b", 2)
+
+    with unittest.mock.patch("open_cp.pool.yield_task_results") as mock:
+        mock.return_value = YieldTwice()
+        executor = pool.RestorableExecutor(filename,
+            checkpoint_interval=datetime.timedelta(seconds=0))
+        with executor:
+            executor.submit(OurTask("a"))
+            executor.submit(OurTask("b"))
+
+    assert saved == [{"a": 1}]
+    assert executor.results == {"a": 1, "b": 2}
+    with open(filename, "rb") as f:
+        assert pickle.load(f) == {"a": 1, "b": 2}
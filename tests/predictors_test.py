@@ -284,6 +284,37 @@ def test_ContinuousPrediction_to_matrix_from_masked_grid_regular(cp1):
                 midy = 15*y + 3 + 15/2
                 assert matrix[y,x] == pytest.approx(midx + midy)
 
+def test_ContinuousPrediction_default_chunk(cp1):
+    # Same as the old fixed chunk size, as `risk` may need a lot of memory
+    # for each point.
+    assert cp1._chunk_points() == 50
+
+@pytest.mark.parametrize("budget", [1, 2**16 * 30, 2**16 * 100])
+def test_ContinuousPrediction_chunked_sampling(cp1, budget):
+    calls = []
+    risk = cp1.risk
+    def counting_risk(x, y):
+        calls.append(len(x))
+        return risk(x, y)
+    cp1.risk = counting_risk
+    cp1.samples = -5
+    expected = cp1.to_matrix(10, 5)
+    mask = np.random.random((12, 7)) < 0.5
+    mgrid = open_cp.data.MaskedGrid(20, 15, 2, 3, mask)
+    expected_masked = cp1.to_matrix_from_masked_grid(mgrid)
+
+    calls.clear()
+    cp1.memory_budget = budget
+    np.testing.assert_allclose(cp1.to_matrix(10, 5), expected)
+    assert max(calls) <= max(1, budget // cp1.risk_point_bytes)
+    assert sum(calls) == 10 * 5 * 25
+    np.testing.assert_allclose(cp1.to_matrix_from_masked_grid(mgrid), expected_masked)
+
+    cp1.samples = 7
+    matrix = cp1.to_matrix_from_masked_grid(mgrid)
+    assert np.all(matrix[mask] == 0)
+    assert np.all(np.abs(matrix - expected_masked)[~mask] < 15)
+
 def test_grid_prediction_from_kernel_and_masked_grid():
     mask = np.random.random((12, 7)) < 0.5
     mgrid = open_cp.data.MaskedGrid(20, 15, 2, 3, mask)
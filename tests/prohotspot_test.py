@@ -169,3 +169,88 @@ def test_ProspectiveHotSpotContinuous_togrid():
     assert prediction.xoffset == 2
     assert prediction.yoffset == 3
     assert prediction.intensity_matrix.shape == (5,3)
+
+def slow_predict(p, cutoff_time, predict_time):
+    events = p.data.events_before(cutoff_time)
+    time_deltas = np.datetime64(predict_time) - events.timestamps
+    time_deltas = np.floor(time_deltas / p.time_unit)
+    width = int(np.rint((p.region.xmax - p.region.xmin) / p.grid))
+    height = int(np.rint((p.region.ymax - p.region.ymin) / p.grid))
+    matrix = np.empty((height, width))
+    for x in range(width):
+        for y in range(height):
+            matrix[y][x] = p._total_weight(time_deltas, events.coords, x, y)
+    return matrix
+
+@pytest.mark.parametrize("distance", [testmod.DistanceDiagonalsSame(),
+        testmod.DistanceDiagonalsDifferent(), testmod.DistanceCircle()])
+def test_ProspectiveHotSpot_matches_cell_by_cell(distance):
+    region = open_cp.RectangularRegion(0,500,0,400)
+    p = testmod.ProspectiveHotSpot(region, grid_size=20)
+    p.distance = distance
+    p.weight = testmod.ClassicWeight(space_bandwidth=5, time_bandwidth=3)
+    rng = np.random.RandomState(1234)
+    times = [datetime(2017,1,1) + timedelta(hours=int(h)) for h in
+        np.sort(rng.randint(0, 24*60, size=200))]
+    # Include some events outside the region
+    xcs = rng.random_sample(200) * 600 - 50
+    ycs = rng.random_sample(200) * 500 - 50
+    p.data = open_cp.TimedPoints.from_coords(times, xcs, ycs)
+    
+    prediction = p.predict(datetime(2017,2,10), datetime(2017,2,15))
+    expected = slow_predict(p, datetime(2017,2,10), datetime(2017,2,15))
+    np.testing.assert_allclose(prediction.intensity_matrix, expected)
+
+    p._max_pairs = 10
+    prediction = p.predict(datetime(2017,2,10), datetime(2017,2,15))
+    np.testing.assert_allclose(prediction.intensity_matrix, expected)
+
+def test_ProspectiveHotSpot_far_outside_event():
+    region = open_cp.RectangularRegion(0,100,0,80)
+    p = testmod.ProspectiveHotSpot(region, grid_size=10)
+    p.weight = testmod.ClassicWeight(space_bandwidth=5, time_bandwidth=3)
+    times = [datetime(2017,1,1), datetime(2017,1,2), datetime(2017,1,3)]
+    p.data = open_cp.TimedPoints.from_coords(times, [200000, 25, -15], [-200000, 35, 45])
+
+    prediction = p.predict(datetime(2017,1,5), datetime(2017,1,5))
+    expected = slow_predict(p, datetime(2017,1,5), datetime(2017,1,5))
+    np.testing.assert_allclose(prediction.intensity_matrix, expected)
+    assert expected[4][0] > 0
+
+    inc = testmod.ProspectiveHotSpotIncremental(p)
+    got = inc.predict(datetime(2017,1,5), datetime(2017,1,5))
+    np.testing.assert_allclose(got.intensity_matrix, expected)
+
+def test_ProspectiveHotSpot_no_events():
+    p = a_valid_predictor()
+    prediction = p.predict(datetime(2017,2,1), datetime(2017,2,1))
+    np.testing.assert_allclose(prediction.intensity_matrix, np.zeros((3,3)))
+
+def test_ProspectiveHotSpotIncremental():
+    region = open_cp.RectangularRegion(0,500,0,400)
+    p = testmod.ProspectiveHotSpot(region, grid_size=20)
+    p.weight = testmod.ClassicWeight(space_bandwidth=5, time_bandwidth=3)
+    rng = np.random.RandomState(4321)
+    times = [datetime(2017,1,1) + timedelta(hours=int(h)) for h in
+        np.sort(rng.randint(0, 24*60, size=300))]
+    xcs = rng.random_sample(300) * 600 - 50
+    ycs = rng.random_sample(300) * 500 - 50
+    p.data = open_cp.TimedPoints.from_coords(times, xcs, ycs)
+    inc = testmod.ProspectiveHotSpotIncremental(p)
+
+    for day in list(range(1, 70, 2)) + [30, 31, 31]:
+        cutoff = datetime(2017,1,1) + timedelta(days=day)
+        predict_time = cutoff + timedelta(hours=12)
+        got = inc.predict(cutoff, predict_time)
+        expected = p.predict(cutoff, predict_time)
+        np.testing.assert_allclose(got.intensity_matrix, expected.intensity_matrix, atol=1e-12)
+        np.testing.assert_array_equal(got.intensity_matrix == 0, expected.intensity_matrix == 0)
+        assert (got.xoffset, got.yoffset, got.xsize) == (0, 0, 20)
+
+    p.weight = testmod.ClassicWeight(space_bandwidth=3, time_bandwidth=5)
+    got = inc.predict(datetime(2017,2,1), datetime(2017,2,1))
+    expected = p.predict(datetime(2017,2,1), datetime(2017,2,1))
+    np.testing.assert_allclose(got.intensity_matrix, expected.intensity_matrix, atol=1e-12)
+
+    with pytest.raises(ValueError):
+        inc.predict(datetime(2017,2,2), datetime(2017,2,1))
@@ -1,4 +1,4 @@
-#import pytest
+import pytest
 from pytest import approx, raises
 import open_cp.retrohotspot as testmod
 
@@ -88,4 +88,71 @@ def test_RetroHotSpotGrid():
     assert(grid.grid_risk(0, 0) == 2)
     assert(grid.grid_risk(2, 5) == 1)
     assert(grid.grid_risk(4, 1) == 1)
-    assert(grid.grid_risk(5, 1) == 0)
\ No newline at end of file
+    assert(grid.grid_risk(5, 1) == 0)
+
+def slow_grid_predict(region, grid_size, weight, coords):
+    xsize, ysize = region.grid_size(grid_size)
+    matrix = np.empty((ysize, xsize))
+    for gridx in range(xsize):
+        x = gridx * grid_size + region.xmin + grid_size / 2
+        for gridy in range(ysize):
+            y = gridy * grid_size + region.ymin + grid_size / 2
+            matrix[gridy][gridx] = np.sum(weight(x - coords[0], y - coords[1]))
+    return matrix
+
+@pytest.mark.parametrize("weight", [testmod.Quartic(55), testmod.TruncatedGaussian(30, 2), TestWeight()])
+def test_RetroHotSpotGrid_matches_slow(weight):
+    region = open_cp.RectangularRegion(xmin=0, xmax=500, ymin=100, ymax=500)
+    times = [np.datetime64("2017-04-02")] * 50
+    xcs = np.random.random(50) * 600 - 50
+    ycs = np.random.random(50) * 500 + 50
+    r = testmod.RetroHotSpotGrid(region, grid_size=20)
+    r.weight = weight
+    r._max_pairs = 100
+    r.data = open_cp.TimedPoints.from_coords(times, xcs, ycs)
+    grid = r.predict()
+    expected = slow_grid_predict(region, 20, weight, [xcs, ycs])
+    np.testing.assert_allclose(grid.intensity_matrix, expected, atol=1e-12)
+
+def test_RetroHotSpotGrid_masked_grid():
+    mask = np.random.random((20, 25)) < 0.3
+    masked_grid = open_cp.data.MaskedGrid(20, 20, 0, 100, mask)
+    times = [np.datetime64("2017-04-02")] * 50
+    xcs = np.random.random(50) * 500
+    ycs = np.random.random(50) * 400 + 100
+    r = testmod.RetroHotSpotGrid(grid=masked_grid)
+    r.weight = testmod.Quartic(70)
+    r.data = open_cp.TimedPoints.from_coords(times, xcs, ycs)
+    grid = r.predict()
+    np.testing.assert_array_equal(grid.intensity_matrix.mask, mask)
+    expected = slow_grid_predict(masked_grid.region(), 20, r.weight, [xcs, ycs])
+    np.testing.assert_allclose(grid.intensity_matrix[~mask], expected[~mask])
+    
+def test_RetroHotSpotGrid_no_events():
+    region = open_cp.RectangularRegion(xmin=0, xmax=500, ymin=100, ymax=500)
+    r = testmod.RetroHotSpotGrid(region, grid_size=20)
+    r.data = open_cp.TimedPoints.from_coords([np.datetime64("2017-04-02")], [10], [110])
+    grid = r.predict(end_time=np.datetime64("2017-04-01"))
+    np.testing.assert_array_equal(grid.intensity_matrix, np.zeros((20, 25)))
+
+@pytest.mark.parametrize("weight", [testmod.Quartic(55), TestWeight()])
+def test_RetroHotSpotGridIncremental(weight):
+    mask = np.random.random((20, 25)) < 0.3
+    masked_grid = open_cp.data.MaskedGrid(20, 20, 0, 100, mask)
+    times = np.datetime64("2017-04-01") + np.sort(np.random.randint(0, 60*24*60, size=200)) * np.timedelta64(1, "m")
+    xcs = np.random.random(200) * 500
+    ycs = np.random.random(200) * 400 + 100
+    r = testmod.RetroHotSpotGrid(grid=masked_grid)
+    r.weight = weight
+    r.data = open_cp.TimedPoints.from_coords(times, xcs, ycs)
+    inc = testmod.RetroHotSpotGridIncremental(r)
+
+    day = np.timedelta64(1, "D")
+    start = np.datetime64("2017-04-01")
+    for end_day in list(range(5, 40, 3)) + [20, 50, 61, 61]:
+        end = start + end_day * day
+        got = inc.predict(end - 14 * day, end)
+        expected = r.predict(end - 14 * day, end)
+        np.testing.assert_array_equal(got.intensity_matrix.mask, mask)
+        np.testing.assert_allclose(got.intensity_matrix, expected.intensity_matrix, atol=1e-12)
+        np.testing.assert_array_equal(got.intensity_matrix == 0, expected.intensity_matrix == 0)
@@ -0,0 +1,197 @@
+import pytest
+
+import open_cp.scripted as scripted
+import open_cp.evaluation
+import open_cp.data
+import open_cp.predictors
+import numpy as np
+import datetime, pickle
+
+@pytest.fixture
+def points():
+    rng = np.random.RandomState(17)
+    times = (np.datetime64("2017-01-01") +
+        np.sort(rng.randint(0, 60 * 24 * 60, size=200)).astype("timedelta64[m]"))
+    xcs = rng.random_sample(200) * 100
+    ycs = rng.random_sample(200) * 100
+    return open_cp.data.TimedPoints.from_coords(times, xcs, ycs)
+
+class Recorder(scripted.ProcessorBase):
+    def __init__(self):
+        self.results = []
+
+    def init(self):
+        pass
+
+    def done(self):
+        pass
+
+    def process(self, predictor, evaluator, scores, time_range):
+        self.results.append((repr(predictor), list(time_range), scores))
+
+class SaveNotifier():
+    def __init__(self):
+        self.times = []
+
+    def notify(self, predictor, time, prediction):
+        self.times.append((repr(predictor), time))
+
+    def close(self):
+        pass
+
+def run(points, notifier=None, **kwargs):
+    recorder = Recorder()
+    grid = open_cp.data.MaskedGrid(20, 20, 0, 0, np.zeros((5, 5), dtype=bool))
+    with scripted.Data(lambda : points, grid=grid) as state:
+        if len(kwargs) > 0:
+            state.use_process_pool(**kwargs)
+        times = scripted.TimeRange(datetime.datetime(2017,2,1),
+            datetime.datetime(2017,3,1), datetime.timedelta(days=7))
+        state.add_prediction(open_cp.evaluation.NaiveProvider, times)
+        state.add_prediction(open_cp.evaluation.ScipyKDEProvider, times)
+        state.score(scripted.HitCountEvaluator)
+        state.process(recorder)
+        if notifier is not None:
+            state._prediction_notifiers.append(notifier)
+    return recorder.results
+
+def test_process_pool_matches_sequential(points):
+    expected = run(points)
+    got = run(points, processes=2)
+    assert len(got) == 2
+    assert [r[:2] for r in got] == [r[:2] for r in expected]
+    for (_, _, scores), (_, _, exp_scores) in zip(got, expected):
+        assert scores == exp_scores
+
+def test_process_pool_notifies_in_order(points):
+    expected, got = SaveNotifier(), SaveNotifier()
+    run(points, expected)
+    run(points, got, processes=2)
+    assert len(got.times) == 8
+    assert got.times == expected.times
+
+def test_process_pool_resumes_from_checkpoint(points, tmpdir):
+    filename = str(tmpdir.join("checkpoint.pic"))
+    expected = run(points, processes=2, checkpoint_filename=filename,
+            checkpoint_interval=datetime.timedelta(seconds=0))
+    with open(filename, "rb") as f:
+        results = pickle.load(f)
+    assert len(results) == 8
+    # Simulate a crash half way through
+    partial = {k : v for k, v in results.items() if k[0] == 0}
+    partial[(0, datetime.datetime(2017,2,1), datetime.datetime(2017,2,8))] = ([[-1]], None)
+    with open(filename, "wb") as f:
+        pickle.dump(partial, f)
+
+    got = run(points, processes=2, checkpoint_filename=filename)
+    assert got[0][2][0] == [-1]
+    assert got[0][2][1:] == expected[0][2][1:]
+    assert got[1][2] == expected[1][2]
+
+def make_grid_prediction(value, masked=True):
+    matrix = np.arange(12, dtype=float).reshape(3, 4) + value
+    if masked:
+        mask = np.zeros((3, 4), dtype=bool)
+        mask[1, 2] = True
+        matrix = np.ma.masked_array(matrix, mask)
+    return open_cp.predictors.GridPredictionArray(10, 20, matrix, 5, 7)
+
+class OurPredictor():
+    def __init__(self, points, name):
+        self.points = points
+        self.name = name
+
+    def __repr__(self):
+        return "OurPredictor({})".format(self.name)
+
+def test_Saver_Loader(points, tmpdir):
+    filename = str(tmpdir.join("preds.dat"))
+    grid = open_cp.data.Grid(10, 20, 5, 7)
+    pred1, pred2 = OurPredictor(points, "a"), OurPredictor(points, "b")
+    t1, t2 = datetime.datetime(2017,2,1), datetime.datetime(2017,2,2)
+    saver = scripted.Saver(filename, points, None, grid)
+    saver.notify(pred1, t1, make_grid_prediction(0))
+    saver.notify(pred2, t1, make_grid_prediction(1, False))
+    saver.notify(pred1, t2, {"not a" : "grid"})
+    saver.close()
+
+    loader = scripted.Loader(filename)
+    assert len(loader) == 3
+    assert loader.keys() == [("OurPredictor(a)", t1), ("OurPredictor(b)", t1),
+        ("OurPredictor(a)", t2)]
+    assert loader.geometry is None
+    assert (loader.grid.xsize, loader.grid.yoffset) == (10, 7)
+    np.testing.assert_array_equal(loader.timed_points.coords, points.coords)
+
+    loaded = loader.get("OurPredictor(a)", np.datetime64(t1))
+    assert repr(loaded.predictor_class) == "OurPredictor(a)"
+    assert loaded.predictor_class.points is loader.timed_points
+    pred = loaded.prediction
+    assert (pred.xsize, pred.ysize, pred.xoffset, pred.yoffset) == (10, 20, 5, 7)
+    expected = make_grid_prediction(0).intensity_matrix
+    np.testing.assert_array_equal(pred.intensity_matrix.mask, expected.mask)
+    np.testing.assert_array_equal(pred.intensity_matrix, expected)
+
+    loaded = loader.get("OurPredictor(b)", t1)
+    assert not np.ma.isMaskedArray(loaded.prediction.intensity_matrix)
+    np.testing.assert_array_equal(loaded.prediction.intensity_matrix,
+        make_grid_prediction(1, False).intensity_matrix)
+
+    got = list(loader)
+    assert got[2].prediction == {"not a" : "grid"}
+    assert got[2].predictor_class is got[0].predictor_class
+
+def test_Saver_append(points, tmpdir):
+    filename = str(tmpdir.join("preds.dat"))
+    grid = open_cp.data.Grid(10, 20, 5, 7)
+    t1, t2 = datetime.datetime(2017,2,1), datetime.datetime(2017,2,2)
+    saver = scripted.Saver(filename, points, None, grid)
+    saver.notify(OurPredictor(points, "a"), t1, make_grid_prediction(0))
+    other = scripted.Saver(filename, points, None, grid, append=True)
+    other.notify(OurPredictor(points, "b"), t2, make_grid_prediction(2))
+    saver.notify(OurPredictor(points, "a"), t2, make_grid_prediction(1))
+    other.close()
+    saver.close()
+
+    loader = scripted.Loader(filename)
+    assert loader.keys() == [("OurPredictor(a)", t1), ("OurPredictor(b)", t2),
+        ("OurPredictor(a)", t2)]
+    for value, loaded in zip([0, 2, 1], loader):
+        np.testing.assert_array_equal(loaded.prediction.intensity_matrix,
+            make_grid_prediction(value).intensity_matrix)
+
+def test_Saver_append_to_new_file(points, tmpdir):
+    grid = open_cp.data.Grid(10, 20, 5, 7)
+    t1, t2 = datetime.datetime(2017,2,1), datetime.datetime(2017,2,2)
+    for name in ["missing.dat", "empty.dat"]:
+        filename = str(tmpdir.join(name))
+        if name == "empty.dat":
+            open(filename, "wb").close()
+        saver = scripted.Saver(filename, points, None, grid, append=True)
+        saver.notify(OurPredictor(points, "a"), t1, make_grid_prediction(0))
+        saver.close()
+        saver = scripted.Saver(filename, points, None, grid, append=True)
+        saver.notify(OurPredictor(points, "b"), t2, make_grid_prediction(1))
+        saver.close()
+
+        loader = scripted.Loader(filename)
+        assert loader.keys() == [("OurPredictor(a)", t1), ("OurPredictor(b)", t2)]
+        assert (loader.grid.xsize, loader.grid.yoffset) == (10, 7)
+        np.testing.assert_array_equal(loader.timed_points.coords, points.coords)
+
+def test_Loader_legacy_format(points, tmpdir):
+    import lzma
+    filename = str(tmpdir.join("preds.pic.xz"))
+    t1 = datetime.datetime(2017,2,1)
+    with lzma.open(filename, "wb") as f:
+        pickle.dump(points, f)
+        pickle.dump(None, f)
+        pickle.dump(open_cp.data.Grid(10, 20, 5, 7), f)
+        pickle.dump((OurPredictor(None, "a"), t1, make_grid_prediction(0)), f)
+
+    loader = scripted.Loader(filename)
+    assert loader.keys() == [("OurPredictor(a)", t1)]
+    loaded = loader.get("OurPredictor(a)", t1)
+    np.testing.assert_array_equal(loaded.prediction.intensity_matrix,
+        make_grid_prediction(0).intensity_matrix)
+    assert len(list(loader)) == 1
@@ -5,6 +5,7 @@ import open_cp.sepp_base as sepp_base
 import open_cp.data
 import open_cp.predictors
 import numpy as np
+import scipy.sparse
 import datetime
 
 class OurModel(sepp_base.ModelBase):
@@ -69,6 +70,72 @@ def test_p_matrix_with_time_repeats():
         got = sepp_base.p_matrix(model, points)
         np.testing.assert_allclose(got, expected)
 
+def test_neighbour_pairs():
+    points = np.random.random((3,30))
+    points[0].sort()
+    for tc, sc in [(None, None), (0.2, None), (None, 0.3), (0.2, 0.3)]:
+        rows, cols = sepp_base.neighbour_pairs(points, tc, sc)
+        expected = []
+        for j in range(30):
+            for i in range(j):
+                d = points[:,j] - points[:,i]
+                if tc is not None and d[0] > tc:
+                    continue
+                if sc is not None and d[1]**2 + d[2]**2 > sc**2:
+                    continue
+                expected.append((i, j))
+        assert list(zip(rows, cols)) == expected
+
+def test_space_time_pairs_blocks():
+    points = np.random.random((3,50))
+    points[0].sort()
+    points[0][20] = points[0][19]
+    for tc in [0.1, 2]:
+        rows, cols = sepp_base._space_time_pairs(points, tc, 0.4, block_size=7)
+        expected = []
+        for j in range(50):
+            for i in range(j):
+                d = points[:,j] - points[:,i]
+                if d[0] <= tc and d[1]**2 + d[2]**2 <= 0.4**2:
+                    expected.append((i, j))
+        assert sorted(zip(rows, cols), key=lambda p : (p[1], p[0])) == expected
+
+def test_sparse_p_matrix():
+    model = OurModel1()
+    for _ in range(10):
+        points = np.random.random((3,20))
+        points[0].sort()
+        points[0][15] = points[0][14]
+        expected = slow_p_matrix(model, points)
+        got = sepp_base.sparse_p_matrix(model, points, time_cutoff=2)
+        np.testing.assert_allclose(got.toarray(), expected)
+        got = sepp_base.sparse_p_matrix(model, points, space_cutoff=2)
+        np.testing.assert_allclose(got.toarray(), expected)
+
+def test_sparse_p_matrix_cutoff():
+    model = OurModel1()
+    points = np.random.random((3,20))
+    points[0].sort()
+    got = sepp_base.sparse_p_matrix(model, points, time_cutoff=0.1, space_cutoff=0.5)
+    rows, cols = got.nonzero()
+    for i, j in zip(rows, cols):
+        d = points[:,j] - points[:,i]
+        assert d[0] <= 0.1
+        assert d[1]**2 + d[2]**2 <= 0.25
+    np.testing.assert_allclose(np.sum(got.toarray(), axis=0), 1)
+
+def test_sparse_choice():
+    p = [[1, 0.5, 0.1, 0.2], [0, 0.5, 0.6, 0.4], [0, 0, 0.3, 0.3], [0, 0, 0, 0.1]]
+    p = scipy.sparse.csc_matrix(np.asarray(p))
+    counts = np.zeros((4,4))
+    for _ in range(2000):
+        choice = sepp_base.sparse_choice(p)
+        counts[choice, np.arange(4)] += 1
+    np.testing.assert_allclose(counts / 2000, p.toarray(), atol=0.05)
+    
+    with pytest.raises(ValueError):
+        sepp_base.sparse_choice(scipy.sparse.csc_matrix(np.asarray([[1,0], [0,0]])))
+
 @pytest.fixture
 def p_matrix_mock():
     with mock.patch("open_cp.sepp_base.p_matrix") as m:
@@ -304,6 +371,31 @@ def test_Optimiser_sample():
     assert bk == [0,1]
     assert tr == [(0,2), (2,3)]
 
+def test_Optimiser_sparse(model):
+    points = np.asarray([ [1,2,3,4], [0.1,0.4,0.7,0.9], [0.8,0.6,0.4,0.2] ])
+    opt = sepp_base.Optimiser(model, points, time_cutoff=10)
+    assert scipy.sparse.issparse(opt.p)
+    expected = sepp_base.p_matrix(model, points)
+    np.testing.assert_allclose(opt.p.toarray(), expected)
+    np.testing.assert_allclose(opt.p_diag, np.diag(expected))
+    assert opt.p_upper_tri_sum == pytest.approx(np.sum(np.triu(expected, k=1)))
+    for col in range(4):
+        np.testing.assert_allclose(opt.upper_tri_col(col), expected[:col, col])
+
+def test_Optimiser_sample_sparse():
+    model = sepp_base.ModelBase()
+    model.background = lambda pts : [1]*pts.shape[-1]
+    model.trigger = lambda tp, pts : [1]*pts.shape[-1]
+
+    opt = sepp_base.Optimiser(model, np.random.random((3,4)), make_p=False)
+    p = [[1,0,0,0], [0,1,0,0], [1,0,0,0], [0,0,1,0]]
+    opt._p = scipy.sparse.csc_matrix(np.asarray(p).T)
+
+    bk, tr = opt.sample()
+
+    assert bk == [0,1]
+    assert tr == [(0,2), (2,3)]
+
 def test_Optimiser_sample_to_points():
     model = sepp_base.ModelBase()
     model.background = lambda pts : [1]*pts.shape[-1]
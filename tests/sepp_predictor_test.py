@@ -2,6 +2,7 @@ import numpy as np
 import pytest
 import unittest.mock as mock
 import io, pickle, datetime
+import scipy.sparse
 
 import open_cp.sepp as testmod
 import open_cp.data
@@ -92,6 +93,50 @@ def test_p_matrix_fast_timecutoff():
     pf = testmod.p_matrix_fast(points, bk, tk, time_cutoff=1, space_cutoff=2)
     assert(pf[0][1] > 0.1)    
 
+def test_sparse_p_matrix():
+    def bk(pts):
+        return pts[0]**2 + 0.1
+    def tk(pts):
+        return pts[1]**2
+    points = np.random.random(size=(3,50))
+    points[0].sort()
+    for tc, sc in [(2, 2), (0.3, 2), (2, 0.3), (0.3, 0.3), (None, 0.3), (0.3, None)]:
+        pf = testmod.p_matrix_fast(points, bk, tk, time_cutoff=(2 if tc is None else tc),
+                                   space_cutoff=(2 if sc is None else sc))
+        ps = testmod.sparse_p_matrix(points, bk, tk, time_cutoff=tc, space_cutoff=sc, chunk_size=7)
+        np.testing.assert_allclose(ps.toarray(), pf)
+
+def test_initial_sparse_p_matrix():
+    points = uniform_data()
+    p = testmod.initial_sparse_p_matrix(points, time_cutoff=10, space_cutoff=100)
+    np.testing.assert_allclose(p.toarray(), expected_initial_matrix(points))
+    
+    p = testmod.initial_sparse_p_matrix(points, time_cutoff=0.15, space_cutoff=100)
+    assert p.nnz == 10 + 9
+
+def test_sample_points_sparse():
+    points = uniform_data(4)
+    p = np.zeros((4,4))
+    for j, i in enumerate([0,1,0,0]):
+        p[i, j] = 1
+    p[2,3] = 1e-20
+    backs, trigs = testmod.sample_points(points, scipy.sparse.csc_matrix(p))
+    np.testing.assert_allclose(backs, points[:,:2])
+    np.testing.assert_allclose(trigs[:,0], [0.2, 2, -2] )
+    np.testing.assert_allclose(trigs[:,1], [0.3, 3, -3] )
+
+    backs, trigs, trigger = testmod.sample_offsets(points, scipy.sparse.csc_matrix(p))
+    np.testing.assert_allclose(trigger, points[:,[0,0]])
+
+def test_sample_points_sparse_distribution():
+    points = uniform_data(3)
+    p = scipy.sparse.csc_matrix(np.asarray([[1, 0.3, 0.2], [0, 0.7, 0.5], [0, 0, 0.3]]))
+    counts = np.zeros((3,3))
+    for _ in range(2000):
+        choice, mask = testmod._make_mask_choice(points, p)
+        counts[choice, [0,1,2]] += 1
+    np.testing.assert_allclose(counts / 2000, p.toarray(), atol=0.05)
+
 def test_make_kernel():
     def bk(pts):
         return pts[1]
@@ -196,4 +241,19 @@ def test_initial_bandwidths(tp1):
     de = trainer.make_stocastic_decluster()
     assert de.initial_time_bandwidth ==  5 * 60
     assert de.initial_space_bandwidth == pytest.approx(12.5)
-    
\ No newline at end of file
+    
+def test_sparse_optimisation(tp1):
+    trainer = testmod.SEPPTrainer(k_time=10, k_space=5)
+    trainer.data = tp1
+    assert not trainer.sparse
+    trainer.sparse = True
+    trainer.space_cutoff = 0.5
+    de = trainer.make_stocastic_decluster()
+    assert de.sparse
+    p = de.initial_p_matrix()
+    assert scipy.sparse.issparse(p)
+    np.testing.assert_allclose(np.sum(p.toarray(), axis=0), 1)
+    
+    result = trainer.train(iterations=2)
+    assert scipy.sparse.issparse(result.result.p)
+    assert len(result.result.ell2_error) == 2
@@ -70,6 +70,49 @@ def test__make_cells():
     assert[cells[4,4] == [1, 2]]
     assert[cells[3,3] == []]
 
+@pytest.mark.parametrize("corrected", [False, True])
+def test_recursive_maximisation(corrected):
+    cells = some_cells(4, 7, 100)
+    cells[1, 2] = np.asarray([])
+    flat = testmod.FlatCells.from_cells(cells)
+    omega, theta = np.random.random(2)
+    mu = np.random.random((4, 7))
+    got = testmod.recursive_maximisation(flat, omega, theta, mu, 100, corrected)
+    if corrected:
+        want = testmod.maximisation_corrected(cells, omega, theta, mu, 100)
+    else:
+        want = testmod.maximisation(cells, omega, theta, mu, 100)
+    assert(got[0] == pytest.approx(want[0]))
+    assert(got[1] == pytest.approx(want[1]))
+    np.testing.assert_allclose(want[2], got[2])
+
+def test_FlatCells_from_events():
+    region = open_cp.RectangularRegion(0, 100, 0, 100)
+    events = mock.Mock()
+    events.xcoords = np.asarray([0, 25, 90, 26, 90])
+    events.ycoords = np.asarray([0, 0, 90, 1, 90])
+    times = [1, 2, 3, 4, 5]
+    cells = testmod.FlatCells.from_events(region, 20, events, times)
+    assert cells.shape == (5, 5)
+    np.testing.assert_allclose(cells.times, [1, 2, 4, 3, 5])
+    assert cells.offsets[1] == 1
+    assert cells.offsets[2] == 3
+    assert cells.offsets[-1] == 5
+    assert cells.counts[4, 4] == 2
+    assert np.sum(cells.counts) == 5
+    a, b = cells.trigger_sums(0.5)
+    np.testing.assert_allclose(a, [0, 0, np.exp(-1), 0, np.exp(-1)])
+    np.testing.assert_allclose(b, [0, 0, 2*np.exp(-1), 0, 2*np.exp(-1)])
+
+@pytest.mark.parametrize("x,y", [(25, 5), (-1, 5), (5, 25), (5, -1)])
+def test_FlatCells_from_events_outside(x, y):
+    region = open_cp.RectangularRegion(0, 20, 0, 20)
+    events = mock.Mock()
+    events.xcoords = np.asarray([5, x])
+    events.ycoords = np.asarray([5, y])
+    with pytest.raises(ValueError):
+        testmod.FlatCells.from_events(region, 10, events, [1, 2])
+
 def a_predictor():
     region = open_cp.RectangularRegion(0, 100, 0, 200)
     mu = np.random.random((10,5))
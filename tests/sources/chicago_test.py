@@ -37,3 +37,33 @@ def test_load_data_keep_in_feet(string_data_snap):
         points = chicago.load("filename", {"THEFT"}, to_meters=False)
         np.testing.assert_allclose( points.coords[:,0], [123, 456] )
         np.testing.assert_allclose( points.coords[:,1], [789, 1012] )
+
+def test_load_data_in_chunks(string_data_snap):
+    with mock.patch("builtins.open", MockOpen(string_data_snap)):
+        expected = chicago.load("filename", {"THEFT"})
+    with mock.patch("builtins.open", MockOpen(string_data_snap)):
+        points = chicago.load("filename", {"THEFT"}, chunk_size=1)
+    np.testing.assert_array_equal(points.timestamps, expected.timestamps)
+    np.testing.assert_allclose(points.coords, expected.coords)
+
+def test_load_data_stable_for_equal_times():
+    dic = chicago._FIELDS["snapshot"]
+    string_data = "\n".join([
+        ",".join([dic["_DESCRIPTION_FIELD"], dic["_X_FIELD"], dic["_Y_FIELD"],
+        dic["_TIME_FIELD"]])] + ["THEFT, {}, 5, 01/01/2017 10:30:23 PM".format(x)
+        for x in range(20)])
+    with mock.patch("builtins.open", MockOpen(string_data)):
+        points = chicago.load("filename", {"THEFT"}, to_meters=False, chunk_size=7)
+    np.testing.assert_allclose(points.coords[0], np.arange(20))
+
+def test_parse_us_times():
+    from open_cp.sources._columnar import parse_us_times
+    strings = ["01/01/2017 10:30:23 PM", "03/13/2016 02:53:30 AM",
+        "12/31/2016 12:00:00 AM", "02/29/2016 12:59:59 PM",
+        "2/3/2016 1:05:00 PM"]
+    times = parse_us_times(strings, chicago._date_from_csv)
+    expected = [np.datetime64(chicago._date_from_csv(s)) for s in strings]
+    np.testing.assert_array_equal(times, np.asarray(expected, dtype="datetime64[ms]"))
+
+    with pytest.raises(ValueError):
+        parse_us_times(["02/30/2016 12:59:59 PM"], chicago._date_from_csv)
@@ -30,3 +30,11 @@ def test_load_data():
         assert( points.timestamps[1] == np.datetime64("2017-01") )
         np.testing.assert_allclose( points.coords[:,0], np.array([123, 456]) )
         np.testing.assert_allclose( points.coords[:,1], np.array([789, 1012]) )
+
+def test_load_data_in_chunks():
+    with mock.patch("builtins.open", MockOpen(string_data)):
+        points = ukpolice.load("filename", set(), chunk_size=2)
+    assert( len(points.timestamps) == 3 )
+    assert( points.timestamps[0] == np.datetime64("2015-05") )
+    assert( points.timestamps[2] == np.datetime64("2017-01") )
+    np.testing.assert_allclose( points.coords[0], [12, 123, 789] )
@@ -212,3 +212,78 @@ def test_STScanNumpy_find():
     assert scores[0][1] == 0
     assert scores[0][2] == 1
     assert scores[0][3] == pytest.approx(0.3001045924)
+
+def test_STScanNumpy_unique_centres():
+    coords = np.array([[1,0], [0,0], [1,0], [1,1], [0,0]]).T
+    s = stscan.STScanNumpy(coords, [0,1,2,3,4])
+    np.testing.assert_array_equal(s.unique_centres(), [[1,0,1], [0,0,1]])
+
+@pytest.fixture
+def random_scanner():
+    state = np.random.RandomState(17)
+    coords = np.floor(state.random_sample((2, 300)) * 20)
+    times = np.floor(state.random_sample(300) * 40)
+    s = stscan.STScanNumpy(coords, times)
+    s.geographic_radius_limit = 5
+    return s
+
+def test_STScanNumpy_scan_all(random_scanner):
+    expected = {tuple(c) : (d, t, st) for c, d, t, st in random_scanner.faster_score_all()}
+    got = list(random_scanner.scan_all())
+    assert len(got) == len(expected)
+    for c, d, t, st in got:
+        np.testing.assert_allclose(expected[tuple(c)][0], d)
+        np.testing.assert_allclose(expected[tuple(c)][1], t)
+        np.testing.assert_allclose(expected[tuple(c)][2], st)
+
+def test_STScanNumpy_find_all_clusters_processes(random_scanner):
+    expected = list(random_scanner.find_all_clusters())
+    assert len(expected) > 0
+    got = list(random_scanner.find_all_clusters(processes=2))
+    assert len(got) == len(expected)
+    for c1, c2 in zip(got, expected):
+        assert c1.statistic == pytest.approx(c2.statistic)
+
+def test_STScanNumpy_pvalues():
+    pvalues = stscan.STScanNumpy.pvalues([5, 2, 1], [1, 2, 3, 4])
+    np.testing.assert_allclose(pvalues, [1/5, 4/5, 1])
+
+def test_STScanNumpy_monte_carlo_simulate(random_scanner):
+    np.random.seed(10)
+    stats = random_scanner.monte_carlo_simulate(runs=5)
+    state = np.random.RandomState(np.random.RandomState(10).randint(2**31))
+    for i, stat in enumerate(np.sort([_shuffled_max_statistic(random_scanner, state) for _ in range(5)])):
+        assert stats[i] == pytest.approx(stat)
+
+def _shuffled_max_statistic(scanner, state):
+    perm = state.permutation(len(scanner.timestamps))
+    s = stscan.STScanNumpy(scanner.coords, scanner.timestamps[perm])
+    s.geographic_radius_limit = scanner.geographic_radius_limit
+    return max(np.max(stats) for _, _, _, stats in s.scan_all())
+
+def test_STScanNumpy_monte_carlo_simulate_batches(random_scanner):
+    random_scanner._batch_bytes = 1
+    np.random.seed(10)
+    stats = random_scanner.monte_carlo_simulate(runs=3)
+    np.random.seed(10)
+    states = [np.random.RandomState(np.random.randint(2**31)) for _ in range(3)]
+    expected = np.sort([_shuffled_max_statistic(random_scanner, state) for state in states])
+    np.testing.assert_allclose(stats, expected)
+
+def test_STScanNumpy_monte_carlo_simulate_bounded_memory():
+    import tracemalloc
+    state = np.random.RandomState(1)
+    coords = np.floor(state.random_sample((2, 300)) * 20)
+    s = stscan.STScanNumpy(coords, state.random_sample(300) * 100)
+    s.geographic_radius_limit = 5
+    s._batch_bytes = 2**18
+    # Build any lazily computed tables first
+    s.monte_carlo_simulate(runs=1)
+    tracemalloc.start()
+    try:
+        stats = s.monte_carlo_simulate(runs=40)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert len(stats) == 40
+    assert peak < 2**20
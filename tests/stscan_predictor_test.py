@@ -230,6 +230,42 @@ def test_predict():
     trainer.data = open_cp.TimedPoints.from_coords(timestamps, xcoords, ycoords)
     trainer.predict() # Test is just that it runs...
 
+def clustered_trainer():
+    state = np.random.RandomState(5)
+    timestamps = np.datetime64("2017-01-01") + (state.random_sample(size=200)
+        * np.timedelta64(100 * 24 * 60 * 60, "s"))
+    xcoords = state.random_sample(size=200) * 1000
+    ycoords = state.random_sample(size=200) * 1000
+    timestamps[:20] = np.datetime64("2017-04-10") + (state.random_sample(size=20)
+        * np.timedelta64(24 * 60 * 60, "s"))
+    xcoords[:20] = 500 + state.random_sample(size=20) * 10
+    ycoords[:20] = 500 + state.random_sample(size=20) * 10
+    order = np.argsort(timestamps)
+    trainer = testmod.STSTrainer()
+    trainer.data = open_cp.TimedPoints.from_coords(timestamps[order],
+        xcoords[order], ycoords[order])
+    trainer.geographic_radius_limit = 100
+    trainer.time_max_interval = np.timedelta64(7, "D")
+    return trainer
+
+def test_predict_monte_carlo():
+    trainer = clustered_trainer()
+    np.random.seed(7)
+    result = trainer.predict(monte_carlo_runs=19)
+    assert len(result.pvalues) == len(result.clusters)
+    assert result.pvalues[0] == pytest.approx(1 / 20)
+    assert all(p1 <= p2 for p1, p2 in zip(result.pvalues, result.pvalues[1:]))
+    assert result.clusters[0].centre[0] == pytest.approx(505, abs=10)
+
+    np.random.seed(7)
+    stats = trainer.monte_carlo_simulate(runs=19, processes=2)
+    np.random.seed(7)
+    stats1 = trainer.monte_carlo_simulate(runs=19)
+    np.testing.assert_allclose(stats, stats1)
+    assert len(stats) == 19
+    assert np.all(stats[:-1] <= stats[1:])
+    assert stats[-1] < result.statistics[0]
+
 @pytest.fixture
 def result():
     return an_STSResult()